@@ -1,35 +1,64 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.models.database import AsyncSessionLocal
 from app.models.schemas import ChatRequest, ChatResponse
 from app.services.workflow_engine import WorkflowExecutor
+from app.services.plan_cache import resolve_saved_workflow
+from app.services.batch_runner import run_batch, BATCH_MAX_CONCURRENCY
+import json
 
 # This router handles all chat and workflow execution related endpoints
 workflow_router = APIRouter()
 
+async def _prepare_runner(payload: ChatRequest) -> WorkflowExecutor:
+    """
+    Picks the execution plan for a request. A transient graph in the payload wins
+    (it may hold unsaved edits); otherwise workflow_id resolves a saved workflow
+    through the compiled plan cache.
+    """
+    try:
+        if payload.graph:
+            return WorkflowExecutor(payload.graph)
+
+        if payload.workflow_id:
+            # Short-lived session: the connection goes back to the pool before any LLM call starts
+            async with AsyncSessionLocal() as db:
+                runner = await resolve_saved_workflow(db, payload.workflow_id)
+            if runner is None:
+                raise HTTPException(status_code=404, detail="Workflow not found")
+            return runner
+    except ValueError as config_error:
+        # Invalid graphs (no query node, cycles, malformed saved JSON) are client errors
+        raise HTTPException(status_code=400, detail=str(config_error))
+
+    # Basic validation: We can't run a workflow without the node structure
+    raise HTTPException(
+        status_code=400,
+        detail="Instruction error: A workflow graph or a saved workflow_id must be provided for execution."
+    )
+
 @workflow_router.post("/execute", response_model=ChatResponse)
 async def process_workflow_chat(payload: ChatRequest):
     """
-    Receives a workflow graph and a user message, then executes the graph
-    to generate an AI response.
+    Receives a workflow graph (or the id of a saved one) and a user message,
+    then executes the graph to generate an AI response.
     """
-    
-    # Basic validation: We can't run a workflow without the node structure
-    if not payload.graph:
-        raise HTTPException(
-            status_code=400, 
-            detail="Instruction error: A workflow graph must be provided for execution."
-        )
-    
+
+    runner = await _prepare_runner(payload)
+
     try:
-        # Initialize the engine with the provided visual graph
-        runner = WorkflowExecutor(payload.graph)
-        
         # Step through the logic defined in the graph
-        ai_generated_response = await runner.execute(
+        result = await runner.execute_detailed(
             query_text=payload.message, 
             chat_history=payload.history
         )
         
-        return ChatResponse(response=ai_generated_response)
+        # Nodes whose dependency failed are reported alongside the (possibly degraded) answer
+        return ChatResponse(
+            response=result["response"],
+            trace=result["trace"] if payload.trace else None,
+            errors=result["errors"] or None
+        )
         
     except Exception as execution_error:
         # Log and return server-side errors to the client
@@ -37,3 +66,60 @@ async def process_workflow_chat(payload: ChatRequest):
             status_code=500, 
             detail=f"Workflow execution failed: {str(execution_error)}"
         )
+
+def _format_sse(event: dict) -> str:
+    """Encodes one executor event as a Server-Sent Events frame."""
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+@workflow_router.post("/execute/stream")
+async def stream_workflow_chat(payload: ChatRequest):
+    """
+    Same as /execute, but streams node progress and LLM tokens back as
+    Server-Sent Events so the UI can render the answer while it is generated.
+    """
+
+    runner = await _prepare_runner(payload)
+
+    async def event_stream():
+        try:
+            async for event in runner.execute_stream(
+                query_text=payload.message,
+                chat_history=payload.history,
+                include_trace=payload.trace
+            ):
+                yield _format_sse(event)
+        except Exception as execution_error:
+            # Headers are already sent, so failures are reported in-band
+            yield _format_sse({
+                "event": "error",
+                "detail": f"Workflow execution failed: {str(execution_error)}"
+            })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop reverse proxies (nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@workflow_router.post("/batch")
+async def batch_workflow_chat(request: Request, workflow_id: str, concurrency: int = BATCH_MAX_CONCURRENCY):
+    """
+    Runs a saved workflow over a JSONL body of questions (one {"id", "message"} object per line)
+    with bounded concurrency. Results stream back as JSONL in completion order, followed by a
+    summary line with throughput and p50/p95 latency.
+    """
+    runner = await _prepare_runner(ChatRequest(workflow_id=workflow_id, message=""))
+    # The body is read up front: once the response starts streaming, Starlette's disconnect
+    # listener owns the receive channel. Questions are small, so this stays cheap.
+    lines = (await request.body()).decode("utf-8").splitlines()
+
+    async def result_stream():
+        async for record in run_batch(runner, lines, concurrency):
+            yield json.dumps(record) + "\n"
+
+    return StreamingResponse(
+        result_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,75 +1,69 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form
 from app.services.vector_service import VectorService
-import fitz  # PyMuPDF
+from app.services.ingestion_jobs import ingestion_queue, get_job, QueueFullError, DuplicateJobError
 import os
-import shutil
+import tempfile
 
 router = APIRouter()
 
-@router.post("/")
+UPLOAD_READ_SIZE = 1024 * 1024 # Copy uploads to disk 1 MB at a time
+
+async def _save_upload(file: UploadFile) -> str:
+    """
+    Streams the upload into a private temp file (outside the working directory)
+    without holding the whole PDF in memory. Returns the temp file path.
+    """
+    with tempfile.NamedTemporaryFile(prefix="flowmind_", suffix=".pdf", delete=False) as buffer:
+        while True:
+            block = await file.read(UPLOAD_READ_SIZE)
+            if not block:
+                break
+            buffer.write(block)
+        return buffer.name
+
+@router.post("/", status_code=202)
 async def upload_file(
     file: UploadFile = File(...),
     collection_name: str = Form("knowledge_base")
 ):
+    """
+    Saves the PDF and queues it for background ingestion. Returns a job id straight away;
+    progress is available from GET /jobs/{job_id}.
+    """
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
-    
+
+    temp_filename = None
     try:
-        # Save temp file
-        temp_filename = f"temp_{file.filename}"
-        with open(temp_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # Extract text using PyMuPDF
-        doc = fitz.open(temp_filename)
-        texts = []
-        metadatas = []
-        
-        for i, page in enumerate(doc):
-            text = page.get_text()
-            if text.strip():
-                texts.append(text)
-                metadatas.append({
-                    "source": file.filename,
-                    "page": i + 1
-                })
-        
-        doc.close()
+        temp_filename = await _save_upload(file)
+        # From here on the job worker owns (and deletes) the temp file
+        job_id = await ingestion_queue.submit(temp_filename, file.filename, collection_name)
+    except QueueFullError as queue_error:
         os.remove(temp_filename)
-        
-        if not texts:
-            raise HTTPException(status_code=400, detail="Could not extract text from PDF")
-            
-        # Add to Vector DB
-        count = VectorService.add_documents(collection_name, texts, metadatas)
-        
-        # Save Metadata to PostgreSQL (Requirement #1)
-        from app.models.database import SessionLocal, DocumentMetadata
-        db = SessionLocal()
-        try:
-            db_doc = DocumentMetadata(
-                filename=file.filename,
-                collection=collection_name,
-                chunks_count=count
-            )
-            db.add(db_doc)
-            db.commit()
-        except Exception as db_err:
-            print(f"Postgres Logging Error: {db_err}")
-        finally:
-            db.close()
-        
-        return {
-            "message": f"Successfully processed {file.filename}",
-            "chunks_added": count,
-            "collection": collection_name
-        }
-        
+        raise HTTPException(status_code=503, detail=str(queue_error))
+    except DuplicateJobError as duplicate_error:
+        os.remove(temp_filename)
+        raise HTTPException(status_code=409, detail=str(duplicate_error))
     except Exception as e:
-        if os.path.exists(temp_filename):
+        if temp_filename and os.path.exists(temp_filename):
             os.remove(temp_filename)
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {
+        "message": f"Queued {file.filename} for processing",
+        "job_id": job_id,
+        "status_url": f"/api/v1/upload/jobs/{job_id}",
+        "collection": collection_name
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """Reports pages processed, chunks embedded and throughput for an ingestion job."""
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
 @router.get("/collections")
 def list_collections():
     return {"collections": VectorService.list_collections()}
@@ -1,43 +1,146 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from app.models.database import get_db, SavedWorkflow
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.database import get_async_db, SavedWorkflow
 from app.models.schemas import WorkflowGraph
+from app.services.plan_cache import plan_cache
+from app.services.node_registry import node_registry
+from typing import Literal, Optional
+from urllib.parse import urlencode
+import base64
+import datetime
+import hashlib
+import json
+import os
 import uuid
 
 router = APIRouter()
 
 @router.post("/save")
-async def save_workflow(name: str, graph: WorkflowGraph, db: Session = Depends(get_db)):
+async def save_workflow(name: str, graph: WorkflowGraph, db: AsyncSession = Depends(get_async_db)):
     """Saves or updates a workflow graph in PostgreSQL (Requirement #3)."""
     try:
-        existing = db.query(SavedWorkflow).filter(SavedWorkflow.name == name).first()
-        
+        result = await db.execute(select(SavedWorkflow).where(SavedWorkflow.name == name))
+        existing = result.scalar_one_or_none()
+
         if existing:
             existing.graph_data = graph.dict()
-            db.commit()
+            await db.commit()
+            # Drop the compiled plan so the next chat turn picks up the new graph
+            plan_cache.invalidate(existing.id)
             return {"message": "Workflow updated successfully", "id": existing.id}
-        
+
         new_workflow = SavedWorkflow(
             id=str(uuid.uuid4()),
             name=name,
             graph_data=graph.dict()
         )
         db.add(new_workflow)
-        db.commit()
+        await db.commit()
         return {"message": "Workflow saved successfully", "id": new_workflow.id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+WORKFLOW_PAGE_SIZE = int(os.getenv("WORKFLOW_PAGE_SIZE", "50"))
+WORKFLOW_MAX_PAGE_SIZE = 200
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != 2 or not all(isinstance(value, str) for value in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
 @router.get("/list")
-async def list_workflows(db: Session = Depends(get_db)):
-    """Returns all saved workflows."""
-    workflows = db.query(SavedWorkflow).all()
-    return [{"id": w.id, "name": w.name, "created_at": w.created_at} for w in workflows]
+async def list_workflows(
+    response: Response,
+    limit: int = Query(WORKFLOW_PAGE_SIZE, ge=1, le=WORKFLOW_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["name", "updated"] = "name",
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Returns saved workflows one page at a time, without their graphs, as a plain list.
+    When there are more, the X-Next-Cursor header (and a Link rel="next" header) carries the
+    cursor for the following page (keyset pagination, so deep pages cost the same as the
+    first). sort=updated lists the most recently edited first.
+    """
+    # Only the listed columns are read; the graph JSON never leaves the database
+    query = select(SavedWorkflow.id, SavedWorkflow.name, SavedWorkflow.created_at, SavedWorkflow.updated_at)
+    if sort == "name":
+        query = query.order_by(SavedWorkflow.name)
+        if cursor:
+            query = query.where(SavedWorkflow.name > _decode_cursor(cursor)[0])
+    else:
+        query = query.order_by(SavedWorkflow.updated_at.desc(), SavedWorkflow.id.desc())
+        if cursor:
+            updated_at, workflow_id = _decode_cursor(cursor)
+            try:
+                updated_at = datetime.datetime.fromisoformat(updated_at)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = query.where(or_(
+                SavedWorkflow.updated_at < updated_at,
+                and_(SavedWorkflow.updated_at == updated_at, SavedWorkflow.id < workflow_id)
+            ))
+
+    # One extra row tells us whether there is a next page
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    page = rows[:limit]
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = _encode_cursor([last.name, last.id] if sort == "name" else [last.updated_at.isoformat(), last.id])
+        # The body stays the list it always was; the cursor travels in headers
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<?{urlencode({"limit": limit, "sort": sort, "cursor": next_cursor})}>; rel="next"'
+
+    return [
+        {"id": w.id, "name": w.name, "created_at": w.created_at, "updated_at": w.updated_at}
+        for w in page
+    ]
+
+@router.get("/node-types")
+async def list_node_types():
+    """Registered node types with their resource class and settings schema (for the canvas)."""
+    return [node_type.describe() for node_type in node_registry.types()]
+
+def _workflow_etag(workflow_id: str, updated_at: Optional[datetime.datetime]) -> str:
+    """Every save bumps updated_at, so (id, updated_at) identifies one version of a graph."""
+    version = updated_at.isoformat() if updated_at else ""
+    return '"' + hashlib.sha256(f"{workflow_id}\x00{version}".encode("utf-8")).hexdigest()[:32] + '"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
 
 @router.get("/{name}")
-async def get_workflow(name: str, db: Session = Depends(get_db)):
-    """Retrieves a specific workflow by name."""
-    workflow = db.query(SavedWorkflow).filter(SavedWorkflow.name == name).first()
-    if not workflow:
+async def get_workflow(name: str, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    """
+    Retrieves a specific workflow by name. Supports If-None-Match: when the editor already
+    holds the current version, a 304 is returned without reading the graph JSON.
+    """
+    # 1. Version check reads only the key columns
+    result = await db.execute(
+        select(SavedWorkflow.id, SavedWorkflow.updated_at).where(SavedWorkflow.name == name)
+    )
+    version = result.first()
+    if version is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
-    return workflow.graph_data
+
+    etag = _workflow_etag(version.id, version.updated_at)
+    # Clients may cache the graph but must revalidate before using it
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # 2. The graph itself, returned as stored (it was validated when it was saved)
+    result = await db.execute(select(SavedWorkflow.graph_data).where(SavedWorkflow.id == version.id))
+    return JSONResponse(content=result.scalar_one(), headers=headers)
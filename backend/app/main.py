@@ -1,6 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
+import logging
 import os
 
 # Load environment variables from .env file immediately upon startup
@@ -11,10 +15,80 @@ if key:
     print(f"INFO: GEMINI_API_KEY loaded successfully (starts with {key[:5]}...)")
 else:
     print("WARNING: GEMINI_API_KEY is not set in the environment!")
+
+logger = logging.getLogger(__name__)
+
+# Readiness of the dependencies warmed up in the background after startup
+dependency_status = {"database": "pending", "vector_store": "pending", "llm_providers": "pending"}
+# A failed warm-up is retried with exponential backoff, so readiness recovers with the dependency
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", "2"))
+WARM_UP_MAX_BACKOFF_SECONDS = float(os.getenv("WARM_UP_MAX_BACKOFF_SECONDS", "60"))
+
+async def _warm_up(name: str, func) -> bool:
+    """Runs a blocking initialiser off the event loop and records the outcome for /readyz."""
+    try:
+        await asyncio.to_thread(func)
+        dependency_status[name] = "ready"
+        return True
+    except Exception as e:
+        logger.error(f"Failed to initialise {name}: {e}")
+        dependency_status[name] = f"failed: {e}"
+        return False
+
+async def _warm_up_until_ready(name: str, func):
+    """Retries _warm_up until it succeeds. Every initialiser is safe to call again."""
+    delay = WARM_UP_RETRY_SECONDS
+    while not await _warm_up(name, func):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARM_UP_MAX_BACKOFF_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Dependencies are initialised here rather than at import time. The database is set up
+    before serving (routes need it); Chroma and the LLM SDK are warmed up in the background
+    so a slow or unreachable Chroma only delays readiness, never liveness.
+    """
+    from app.models.database import init_database
+    from app.services.llm_provider import provider_registry
+    from app.services.vector_service import get_vector_backend
+    from app.services.ingestion_jobs import ingestion_queue
+
+    # 1. Database engines, session factories and schema (retried in the background if it fails)
+    warm_up_tasks = []
+    if not await _warm_up("database", init_database):
+        warm_up_tasks.append(asyncio.create_task(_warm_up_until_ready("database", init_database)))
+    # 2. Background workers that process uploaded PDFs
+    await ingestion_queue.start()
+    # 3. Vector store client and LLM providers, without blocking startup
+    warm_up_tasks += [
+        asyncio.create_task(_warm_up_until_ready("vector_store", lambda: get_vector_backend().warm_up())),
+        asyncio.create_task(_warm_up_until_ready("llm_providers", provider_registry.initialize)),
+    ]
+
+    yield
+
+    # Close pooled outbound connections and worker threads when the server stops
+    from app.services.search_service import close_http_client
+    from app.services.vector_service import chroma_executor
+    from app.services.node_registry import cpu_executor
+    from app.services.ingestion_service import shutdown_process_pool
+    from app.models import database
+    for task in warm_up_tasks:
+        task.cancel()
+    await ingestion_queue.stop()
+    await close_http_client()
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+    chroma_executor.shutdown(wait=False)
+    cpu_executor.shutdown(wait=False)
+    shutdown_process_pool()
+
 flowmind_app = FastAPI(
     title="FlowMind API", 
     version="1.0.0",
-    description="Backend API for the FlowMind No-Code AI Workflow Builder"
+    description="Backend API for the FlowMind No-Code AI Workflow Builder",
+    lifespan=lifespan
 )
 
 # Middleware configuration for Cross-Origin Resource Sharing (CORS)
@@ -25,6 +99,8 @@ flowmind_app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination and conditional GET headers the canvas may read
+    expose_headers=["X-Next-Cursor", "Link", "ETag"],
 )
 
 @flowmind_app.get("/")
@@ -36,6 +112,26 @@ def health_check():
         "version": "1.0.0"
     }
 
+@flowmind_app.get("/healthz")
+def liveness():
+    """Liveness probe: the process is up and serving. Does not touch any dependency."""
+    return {"status": "ok"}
+
+@flowmind_app.get("/readyz")
+def readiness():
+    """Readiness probe: 200 once every dependency has been warmed up, 503 until then (failed ones are retried)."""
+    ready = all(state == "ready" for state in dependency_status.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "dependencies": dependency_status}
+    )
+
+@flowmind_app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: node latencies, LLM tokens and queue wait, cache hit rates."""
+    from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Import and register API route modules
 from app.api import chat
 from app.api import upload
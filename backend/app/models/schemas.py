@@ -1,11 +1,16 @@
-from pydantic import BaseModel
-from typing import List, Optional, Any, Dict
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Literal, Optional, Any, Dict
 
 class NodeData(BaseModel):
+    # Node-type specific settings (e.g. a search node's engine) are kept as extra fields;
+    # each node type validates its own settings with its config model below
+    model_config = ConfigDict(extra="allow")
+
     label: str
     files: Optional[List[str]] = None
     model: Optional[str] = None
     provider: Optional[str] = None
+    collection: Optional[str] = None
 
 class Node(BaseModel):
     id: str
@@ -22,6 +27,29 @@ class WorkflowGraph(BaseModel):
     nodes: List[Node]
     edges: List[Edge]
 
+# Typed per-node configuration, validated when a workflow is compiled (see node_registry).
+# None values sent by the canvas fall back to the defaults.
+class NodeConfig(BaseModel):
+    label: str = ""
+
+class KnowledgeNodeConfig(NodeConfig):
+    collection: str = "knowledge_base"
+    top_k: int = Field(3, ge=1, le=50)
+
+class SearchNodeConfig(NodeConfig):
+    engine: str = "serpapi"
+    max_results: int = Field(3, ge=1, le=10)
+
+class RerankNodeConfig(NodeConfig):
+    scorer: Literal["lexical", "model"] = "lexical"
+    candidates: int = Field(20, ge=1, le=200) # chunks upstream knowledge nodes retrieve for reranking
+    top_n: int = Field(3, ge=1, le=50) # chunks passed on to the LLM
+    min_score: float = 0.0
+
+class LLMNodeConfig(NodeConfig):
+    provider: str = "gemini"
+    model: str = "gemini-2.0-flash"
+
 class WorkflowCreate(BaseModel):
     name: str
     graph: WorkflowGraph
@@ -31,11 +59,14 @@ class ChatMessage(BaseModel):
     content: str
 
 class ChatRequest(BaseModel):
-    workflow_id: Optional[str]
-    graph: Optional[WorkflowGraph] # Execute transient graph
+    workflow_id: Optional[str] = None # Execute a saved workflow (uses the compiled plan cache)
+    graph: Optional[WorkflowGraph] = None # Execute transient graph
     message: str
     history: List[ChatMessage] = []
+    trace: bool = False # Return per-node timings (and token counts) with the answer
 
 class ChatResponse(BaseModel):
     response: str
     sources: Optional[List[str]] = None
+    trace: Optional[Dict[str, Any]] = None
+    errors: Optional[List[Dict[str, Any]]] = None # Nodes that failed or ran degraded
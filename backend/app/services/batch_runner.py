@@ -0,0 +1,171 @@
+"""
+Batch execution of one workflow over many questions (offline evaluation runs).
+
+Used by POST /api/v1/chat/batch and runnable directly against the configured database:
+    python -m app.services.batch_runner --workflow-id support-bot --input questions.jsonl --output results.jsonl
+
+Input is JSONL, one question per line: {"id": "q1", "message": "...", "history": [...]}
+("id" and "history" are optional; a bare JSON string is also accepted).
+"""
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Union
+from app.models.schemas import ChatMessage
+from app.services.llm_provider import is_error_response
+from app.services.workflow_engine import WorkflowExecutor
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+def parse_line(line: str, index: int) -> Dict[str, Any]:
+    """Turns one JSONL line into {"id", "message", "history"}; raises ValueError if it is unusable."""
+    item = json.loads(line)
+    if isinstance(item, str):
+        item = {"message": item}
+    if not isinstance(item, dict) or not isinstance(item.get("message"), str):
+        raise ValueError("each line must be a JSON string or an object with a 'message' field")
+    return {
+        "id": item.get("id", index),
+        "message": item["message"],
+        "history": [ChatMessage(**turn) for turn in item.get("history", [])]
+    }
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+async def run_batch(
+    runner: WorkflowExecutor,
+    lines: Union[AsyncIterator[str], Iterable[str]],
+    concurrency: int = BATCH_MAX_CONCURRENCY
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs every question through the same compiled plan with at most `concurrency` in flight
+    and yields one result per question as it finishes, then a final {"summary": ...} record.
+
+    Lines are read lazily, so memory stays bounded however long the input is. Because the
+    questions run concurrently, their knowledge-base lookups are coalesced by the retrieval
+    batcher into shared Chroma calls.
+    """
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    inputs: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    results: asyncio.Queue = asyncio.Queue()
+    latencies: List[float] = []
+    failed = 0
+
+    async def feed():
+        index = 0
+        if hasattr(lines, "__aiter__"):
+            async for line in lines:
+                if line.strip():
+                    await inputs.put((index, line))
+                    index += 1
+        else:
+            for line in lines:
+                if line.strip():
+                    await inputs.put((index, line))
+                    index += 1
+        for _ in range(concurrency):
+            await inputs.put(None)
+
+    async def worker():
+        while True:
+            job = await inputs.get()
+            if job is None:
+                return
+            index, line = job
+            started = time.perf_counter()
+            record = {"index": index, "id": index}
+            try:
+                item = parse_line(line, index)
+                record["id"] = item["id"]
+                result = await runner.execute_detailed(query_text=item["message"], chat_history=item["history"])
+                record["response"] = result["response"]
+                # A failed LLM node answers with its error message; count it as a failed question.
+                # Degraded context nodes (e.g. search down) still produce a usable answer.
+                failures = [error["message"] for error in result["errors"] if error["status"] == "failed"]
+                if failures:
+                    record["error"] = "; ".join(failures)
+                elif is_error_response(record["response"]):
+                    record["error"] = record["response"]
+                else:
+                    record["error"] = None
+            except Exception as e:
+                record["response"] = None
+                record["error"] = str(e)
+            record["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            await results.put(record)
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(feed())] + [asyncio.create_task(worker()) for _ in range(concurrency)]
+    workers_done = asyncio.gather(*tasks)
+    workers_done.add_done_callback(lambda _: results.put_nowait(None))
+
+    try:
+        while True:
+            record = await results.get()
+            if record is None:
+                break
+            if record["error"]:
+                failed += 1
+            else:
+                latencies.append(record["latency_ms"])
+            yield record
+        # Surfaces errors from reading the input
+        await workers_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    total = len(latencies) + failed
+    yield {"summary": {
+        "total": total,
+        "succeeded": len(latencies),
+        "failed": failed,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(total / elapsed, 2) if elapsed else None,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95)
+    }}
+
+async def _main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workflow-id", required=True)
+    parser.add_argument("--input", required=True, help="JSONL file of questions ('-' for stdin)")
+    parser.add_argument("--output", default="-", help="JSONL file for results ('-' for stdout)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    from app.models.database import init_database, AsyncSessionLocal
+    from app.services.llm_provider import provider_registry
+    from app.services.plan_cache import resolve_saved_workflow
+
+    await asyncio.to_thread(init_database)
+    provider_registry.initialize()
+    async with AsyncSessionLocal() as db:
+        runner = await resolve_saved_workflow(db, args.workflow_id)
+    if runner is None:
+        sys.exit(f"Workflow {args.workflow_id} not found")
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        async for record in run_batch(runner, source, args.concurrency):
+            sink.write(json.dumps(record) + "\n")
+            if "summary" in record:
+                print(json.dumps(record["summary"]), file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,309 @@
+"""
+Explicit embedding pipeline for chunks and queries.
+
+Every vector backend embeds through the shared embedding_service:
+  1. texts already embedded by this model come from the cache (memory LRU, then the
+     optional embedding_cache table);
+  2. the rest are queued for a single model thread, which coalesces requests from
+     concurrent uploads and chats into one forward pass per micro-batch.
+Large requests are split into micro-batches, so a chat query waits behind at most one
+batch of an upload instead of the whole document.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+from app.services.response_cache import fingerprint
+from app.services import telemetry
+from app.services.resilience import remaining_time
+import datetime
+import os
+import queue
+import threading
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "default" is Chroma's bundled ONNX all-MiniLM-L6-v2 (the model existing collections were
+# embedded with); any other value is loaded with sentence-transformers (optional dependency).
+# Changing the model requires re-uploading documents.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "default")
+# How long the model thread waits for more requests before a forward pass. 0 adds no latency
+# and still coalesces every request that queued up while the previous pass was running.
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "0"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+# Longest a caller waits for one micro-batch (also capped by the request deadline), so a hung
+# model fails uploads and chats instead of blocking their worker threads forever
+EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "60"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000")) # ~1.5 KB per 384-dim entry
+# Persistent tier (embedding_cache table): shared by workers and kept across restarts, so
+# re-uploading a document skips the model for its unchanged chunks. Off by default.
+EMBEDDING_CACHE_PERSISTENT = os.getenv("EMBEDDING_CACHE_PERSISTENT", "false").lower() == "true"
+EMBEDDING_CACHE_PERSISTENT_MAX = int(os.getenv("EMBEDDING_CACHE_PERSISTENT_MAX", "500000"))
+# The table is trimmed back to its bound at most this often, not on every write
+EMBEDDING_CACHE_TRIM_SECONDS = float(os.getenv("EMBEDDING_CACHE_TRIM_SECONDS", "300"))
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+def load_encoder(model_name: str) -> Encoder:
+    """Loads a local CPU embedding model and returns a texts -> float32 matrix function."""
+    logger.info(f"Loading embedding model: {model_name}")
+    if model_name == "default":
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        embedding_function = DefaultEmbeddingFunction()
+        return lambda texts: np.asarray(embedding_function(texts), dtype=np.float32)
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device="cpu")
+    return lambda texts: np.asarray(
+        model.encode(texts, batch_size=len(texts), convert_to_numpy=True), dtype=np.float32
+    )
+
+class _Request:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+class EmbeddingService:
+    """
+    Micro-batching, caching front of one embedding model. embed() is blocking and thread
+    safe; call it from worker threads (the vector store pool), not from the event loop.
+    """
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        encoder: Optional[Encoder] = None,
+        window_seconds: float = EMBEDDING_BATCH_WINDOW_MS / 1000,
+        max_batch: int = EMBEDDING_MAX_BATCH,
+        cache_size: int = EMBEDDING_CACHE_SIZE,
+        persistent: bool = EMBEDDING_CACHE_PERSISTENT
+    ):
+        self.model_name = model_name
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self.persistent = persistent
+        self._encoder = encoder
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._last_trim = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.embedded = 0
+
+    def key_for(self, text: str) -> str:
+        return fingerprint(self.model_name, text)
+
+    def warm_up(self):
+        """Loads the model so the first upload or query does not pay for it."""
+        self.embed(["warm up"], use_cache=False)
+
+    def embed(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """Embeddings for texts, one row per text, in order."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # 1. Each distinct text is embedded once
+        keys = [self.key_for(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        if use_cache:
+            vectors.update(self._get_memory(set(keys)))
+            if self.persistent and len(vectors) < len(set(keys)):
+                stored = self._get_persistent([key for key in set(keys) if key not in vectors])
+                self._put_memory(stored)
+                vectors.update(stored)
+        missing = list({key: text for key, text in zip(keys, texts) if key not in vectors}.items())
+        if use_cache:
+            with self._stats_lock:
+                self.hits += len(set(keys)) - len(missing)
+                self.misses += len(missing)
+            telemetry.CACHE_REQUESTS.labels("embedding", "hit").inc(len(set(keys)) - len(missing))
+            telemetry.CACHE_REQUESTS.labels("embedding", "miss").inc(len(missing))
+
+        # 2. The rest goes through the model thread, at most max_batch texts per request
+        if missing:
+            pieces = [missing[start:start + self.max_batch] for start in range(0, len(missing), self.max_batch)]
+            requests = [(piece, self._submit([text for _, text in piece])) for piece in pieces]
+            computed = {}
+            for piece, request in requests:
+                computed.update(zip((key for key, _ in piece), self._wait(request)))
+            vectors.update(computed)
+            if use_cache:
+                self._put_memory(computed)
+                if self.persistent:
+                    self._put_persistent(computed)
+
+        return np.vstack([vectors[key] for key in keys])
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._cache),
+            "max_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "batches": self.batches,
+            "embedded": self.embedded,
+            "queued": self._queue.qsize()
+        }
+
+    # --- Micro-batching ---
+
+    def _submit(self, texts: List[str]) -> _Request:
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding", daemon=True)
+                    self._worker.start()
+        request = _Request(texts)
+        self._queue.put(request)
+        return request
+
+    def _wait(self, request: _Request) -> np.ndarray:
+        remaining = remaining_time()
+        timeout = EMBEDDING_TIMEOUT_SECONDS if remaining is None else max(0.0, min(EMBEDDING_TIMEOUT_SECONDS, remaining))
+        try:
+            return request.future.result(timeout=timeout)
+        except TimeoutError:
+            # Skipped by the model thread if it has not started on it yet
+            request.future.cancel()
+            raise TimeoutError(f"Embedding {len(request.texts)} texts timed out after {timeout:.1f}s")
+
+    def _run(self):
+        batch: List[_Request] = []
+        try:
+            while True:
+                batch = self._next_batch()
+                self._encode(batch)
+                batch = []
+        finally:
+            # Only reached if the thread dies; callers must not wait for it
+            logger.error("Embedding model thread stopped; failing its pending requests")
+            with self._worker_lock:
+                self._worker = None
+            error = RuntimeError("Embedding model thread stopped")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(error)
+            while True:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request.future.set_running_or_notify_cancel():
+                    request.future.set_exception(error)
+
+    def _next_batch(self) -> List[_Request]:
+        """Waits for work, then collects whatever else arrives within the window."""
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.window_seconds
+            while size < self.max_batch:
+                try:
+                    remaining = deadline - time.monotonic()
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            # Requests whose callers timed out and cancelled them are dropped
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if batch:
+                return batch
+
+    def _encode(self, batch: List[_Request]):
+        size = sum(len(request.texts) for request in batch)
+        try:
+            if self._encoder is None:
+                self._encoder = load_encoder(self.model_name)
+            matrix = self._encoder([text for request in batch for text in request.texts])
+        except Exception as e:
+            logger.error(f"Embedding batch of {size} texts failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.embedded += size
+        telemetry.EMBEDDING_BATCH_SIZE.observe(size)
+        offset = 0
+        for request in batch:
+            request.future.set_result(matrix[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+    # --- Cache tiers ---
+
+    def _get_memory(self, keys) -> Dict[str, np.ndarray]:
+        with self._cache_lock:
+            found = {}
+            for key in keys:
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = vector
+            return found
+
+    def _put_memory(self, vectors: Dict[str, np.ndarray]):
+        with self._cache_lock:
+            for key, vector in vectors.items():
+                self._cache[key] = vector
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _get_persistent(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        from app.models.database import SessionLocal, CachedEmbedding
+        try:
+            db = SessionLocal()
+            try:
+                rows = db.query(CachedEmbedding.key, CachedEmbedding.embedding).filter(CachedEmbedding.key.in_(keys)).all()
+                return {row.key: np.frombuffer(row.embedding, dtype=np.float32) for row in rows}
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return {}
+
+    def _put_persistent(self, vectors: Dict[str, np.ndarray]):
+        from app.models.database import SessionLocal, CachedEmbedding
+        try:
+            db = SessionLocal()
+            try:
+                now = datetime.datetime.utcnow()
+                for key, vector in vectors.items():
+                    db.merge(CachedEmbedding(
+                        key=key,
+                        model=self.model_name,
+                        embedding=np.asarray(vector, dtype=np.float32).tobytes(),
+                        created_at=now
+                    ))
+                db.commit()
+
+                # Oldest rows go first once the table is over its bound; checked periodically,
+                # since counting the table on every write is a full scan
+                if time.monotonic() - self._last_trim >= EMBEDDING_CACHE_TRIM_SECONDS:
+                    self._last_trim = time.monotonic()
+                    cutoff = (
+                        db.query(CachedEmbedding.created_at)
+                        .order_by(CachedEmbedding.created_at.desc())
+                        .offset(EMBEDDING_CACHE_PERSISTENT_MAX - 1).limit(1).scalar()
+                    )
+                    if cutoff is not None:
+                        # Rows written together share a timestamp; the batch at the cutoff is kept whole
+                        db.query(CachedEmbedding).filter(CachedEmbedding.created_at < cutoff).delete(synchronize_session=False)
+                        db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+# Shared by the vector backends of this worker
+embedding_service = EmbeddingService()
@@ -0,0 +1,290 @@
+from typing import Dict, Any, Optional, List
+from sqlalchemy import func, select, update
+from app.models.database import AsyncSessionLocal, IngestionJob, DocumentMetadata
+from app.services.ingestion_service import ingest_pdf, file_sha256
+from app.services.vector_service import VectorService
+import asyncio
+import datetime
+import os
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+# Each process refreshes heartbeat_at of its queued and running jobs this often. Jobs not
+# refreshed for INGEST_STALE_SECONDS belonged to a process that stopped and are marked failed.
+INGEST_HEARTBEAT_SECONDS = float(os.getenv("INGEST_HEARTBEAT_SECONDS", "30"))
+INGEST_STALE_SECONDS = float(os.getenv("INGEST_STALE_SECONDS", "300"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+class QueueFullError(Exception):
+    """Raised when the ingestion backlog is at capacity."""
+
+class DuplicateJobError(Exception):
+    """Raised when the same file is already being ingested into the same collection."""
+
+async def _update_job(job_id: str, **fields) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(**fields))
+        await db.commit()
+
+async def _create_job(job_id: str, filename: str, collection_name: str) -> None:
+    async with AsyncSessionLocal() as db:
+        db.add(IngestionJob(
+            id=job_id, filename=filename, collection=collection_name, status="queued",
+            heartbeat_at=datetime.datetime.utcnow()
+        ))
+        await db.commit()
+
+def _last_seen():
+    return func.coalesce(IngestionJob.heartbeat_at, IngestionJob.started_at, IngestionJob.created_at)
+
+async def _active_job(filename: str, collection_name: str, exclude_id: Optional[str] = None) -> Optional[str]:
+    """Id of a live queued or running job for this file and collection, if any."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=INGEST_STALE_SECONDS)
+    query = select(IngestionJob.id).where(
+        IngestionJob.filename == filename,
+        IngestionJob.collection == collection_name,
+        IngestionJob.status.in_(ACTIVE_STATUSES),
+        _last_seen() >= cutoff
+    )
+    if exclude_id:
+        query = query.where(IngestionJob.id != exclude_id)
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(query.limit(1))).scalar_one_or_none()
+
+async def _touch_jobs(job_ids: List[str]) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(IngestionJob).where(IngestionJob.id.in_(job_ids)).values(heartbeat_at=datetime.datetime.utcnow())
+        )
+        await db.commit()
+
+async def reconcile_jobs() -> int:
+    """
+    Marks jobs failed that were left queued or running by a process that stopped (no
+    heartbeat for INGEST_STALE_SECONDS). Their temp files went with the process's queue,
+    so they cannot be resumed. Returns the number of jobs marked failed.
+    """
+    now = datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(seconds=INGEST_STALE_SECONDS)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.status.in_(ACTIVE_STATUSES), _last_seen() < cutoff)
+            .values(status="failed", error="Interrupted: the server stopped before the job finished", finished_at=now)
+        )
+        await db.commit()
+        return result.rowcount or 0
+
+async def _previous_document(filename: str, collection_name: str) -> Optional[Dict[str, Any]]:
+    """The most recent indexed version of this file in this collection, if any."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(DocumentMetadata)
+            .where(DocumentMetadata.filename == filename, DocumentMetadata.collection == collection_name)
+            .order_by(DocumentMetadata.id.desc())
+            .limit(1)
+        )
+        doc = result.scalar_one_or_none()
+        if doc is None:
+            return None
+        return {"id": doc.id, "content_hash": doc.content_hash, "manifest": doc.manifest or []}
+
+async def _complete_job(
+    job_id: str,
+    filename: str,
+    collection_name: str,
+    content_hash: str,
+    manifest: List[str],
+    previous_id: Optional[int],
+    **job_fields
+) -> None:
+    """
+    Records the document (Requirement #1) with its chunk manifest and links it to the
+    finished job in one transaction. A re-upload updates the existing document row.
+    """
+    async with AsyncSessionLocal() as db:
+        db_doc = await db.get(DocumentMetadata, previous_id) if previous_id else None
+        if db_doc is None:
+            db_doc = DocumentMetadata(filename=filename, collection=collection_name)
+            db.add(db_doc)
+        db_doc.chunks_count = len(manifest)
+        db_doc.content_hash = content_hash
+        db_doc.manifest = manifest
+        db_doc.upload_date = datetime.datetime.utcnow()
+        await db.flush()
+
+        await db.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(
+            status="completed",
+            document_id=db_doc.id,
+            finished_at=datetime.datetime.utcnow(),
+            **job_fields
+        ))
+        await db.commit()
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the job's progress and throughput, or None if the id is unknown."""
+    async with AsyncSessionLocal() as db:
+        job = await db.get(IngestionJob, job_id)
+        if job is None:
+            return None
+
+        elapsed = None
+        if job.started_at:
+            end = job.finished_at or datetime.datetime.utcnow()
+            elapsed = max((end - job.started_at).total_seconds(), 1e-6)
+
+        return {
+            "job_id": job.id,
+            "filename": job.filename,
+            "collection": job.collection,
+            "status": job.status,
+            "pages_total": job.pages_total,
+            "pages_processed": job.pages_processed,
+            "chunks_embedded": job.chunks_embedded,
+            "chunks_reused": job.chunks_reused,
+            "chunks_deleted": job.chunks_deleted,
+            "pages_per_second": round(job.pages_processed / elapsed, 2) if elapsed else None,
+            "chunks_per_second": round(job.chunks_embedded / elapsed, 2) if elapsed else None,
+            "elapsed_seconds": round(elapsed, 2) if elapsed else None,
+            "document_id": job.document_id,
+            "error": job.error,
+            "created_at": job.created_at,
+            "finished_at": job.finished_at
+        }
+
+class IngestionJobQueue:
+    """
+    In-process ingestion backlog served by a fixed number of asyncio workers.
+    Uploads return as soon as the job is queued; the heavy lifting (extraction on the
+    process pool, batched embedding) happens here, and progress is written to the
+    ingestion_jobs table so any API worker can report it.
+    """
+    def __init__(self, workers: int = INGEST_WORKERS, max_size: int = INGEST_QUEUE_SIZE):
+        self.workers = workers
+        self.max_size = max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Queued and running jobs of this process, kept alive by the heartbeat
+        self._jobs: set = set()
+        self._submit_lock = asyncio.Lock()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, pdf_path: str, filename: str, collection_name: str) -> str:
+        """Registers a job for an already-saved upload and queues it. Returns the job id."""
+        if self._queue is None:
+            await self.start()
+        if self._queue.full():
+            raise QueueFullError("The ingestion queue is full, please retry later.")
+
+        job_id = str(uuid.uuid4())
+        # Two jobs for one document would diff against the same manifest and delete each
+        # other's chunks; the lock makes check-and-create atomic within this process
+        async with self._submit_lock:
+            active_id = await _active_job(filename, collection_name)
+            if active_id:
+                raise DuplicateJobError(f"{filename} is already being ingested into {collection_name} (job {active_id}).")
+            await _create_job(job_id, filename, collection_name)
+        try:
+            self._queue.put_nowait((job_id, pdf_path, filename, collection_name))
+        except asyncio.QueueFull:
+            # Another upload took the last slot while the job row was being written
+            await _update_job(job_id, status="failed", error="Ingestion queue full", finished_at=datetime.datetime.utcnow())
+            raise QueueFullError("The ingestion queue is full, please retry later.")
+        self._jobs.add(job_id)
+        return job_id
+
+    async def _heartbeat(self):
+        """Keeps this process's jobs alive and fails the jobs of processes that stopped."""
+        while True:
+            try:
+                if self._jobs:
+                    await _touch_jobs(list(self._jobs))
+                interrupted = await reconcile_jobs()
+                if interrupted:
+                    logger.warning(f"Marked {interrupted} interrupted ingestion jobs as failed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Ingestion job heartbeat failed: {e}")
+            await asyncio.sleep(INGEST_HEARTBEAT_SECONDS)
+
+    async def _worker(self, worker_index: int):
+        while True:
+            job_id, pdf_path, filename, collection_name = await self._queue.get()
+            try:
+                await self._run(job_id, pdf_path, filename, collection_name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. the database was unreachable while recording progress; keep serving the queue
+                logger.error(f"Ingestion worker {worker_index} could not finish job {job_id}: {e}")
+            finally:
+                self._jobs.discard(job_id)
+                if os.path.exists(pdf_path):
+                    os.remove(pdf_path)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, pdf_path: str, filename: str, collection_name: str):
+        logger.info(f"Starting ingestion job {job_id} ({filename})")
+        await _update_job(job_id, status="running", started_at=datetime.datetime.utcnow())
+
+        async def report(pages_processed: int, pages_total: int, chunks_added: int):
+            await _update_job(
+                job_id, pages_processed=pages_processed, pages_total=pages_total, chunks_embedded=chunks_added
+            )
+
+        try:
+            # Submitted by another worker process at the same moment as this one
+            other_id = await _active_job(filename, collection_name, exclude_id=job_id)
+            if other_id and other_id < job_id:
+                raise DuplicateJobError(f"{filename} is already being ingested into {collection_name} (job {other_id}).")
+            content_hash = await asyncio.to_thread(file_sha256, pdf_path)
+            previous = await _previous_document(filename, collection_name)
+            previous_id = previous["id"] if previous else None
+
+            # Identical file already indexed: nothing to extract or embed
+            if previous and previous["content_hash"] == content_hash:
+                logger.info(f"Ingestion job {job_id}: {filename} is unchanged, skipping")
+                await _complete_job(
+                    job_id, filename, collection_name, content_hash, previous["manifest"], previous_id,
+                    chunks_embedded=0, chunks_reused=len(previous["manifest"]), chunks_deleted=0
+                )
+                return
+
+            # Only chunks that are not in the previous manifest are embedded
+            old_ids = set(previous["manifest"]) if previous else set()
+            result = await ingest_pdf(pdf_path, filename, collection_name, on_progress=report, known_ids=old_ids)
+            if not result["chunk_ids"]:
+                raise ValueError("Could not extract text from PDF")
+
+            # Drop chunks that no longer exist in the new version of the document
+            stale_ids = list(old_ids - set(result["chunk_ids"]))
+            deleted = await VectorService.delete_documents_async(collection_name, stale_ids)
+
+            await _complete_job(
+                job_id, filename, collection_name, content_hash, result["chunk_ids"], previous_id,
+                chunks_embedded=result["chunks_added"], chunks_reused=result["chunks_reused"], chunks_deleted=deleted
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            await _update_job(job_id, status="failed", error=str(e), finished_at=datetime.datetime.utcnow())
+
+# Shared queue, started with the application
+ingestion_queue = IngestionJobQueue()
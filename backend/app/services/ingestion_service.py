@@ -0,0 +1,160 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional, Callable, Awaitable, Set, Dict, Any
+from app.services.vector_service import VectorService, chunk_id
+import asyncio
+import hashlib
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tunables for the ingestion pipeline
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", "2"))
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64")) # chunks per embedding + collection.add call
+# The default Chroma embedding model (all-MiniLM-L6-v2) truncates input at 256 word pieces,
+# so chunks are kept comfortably below that.
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+# Words and individual punctuation marks: a close, dependency-free proxy for word-piece counts
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """PDF parsing is CPU-bound, so it runs in worker processes instead of on the event loop."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=INGEST_PROCESSES)
+    return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+def file_sha256(path: str) -> str:
+    """Hashes a file in 1 MB blocks; used to skip re-uploads of an identical PDF."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def count_pages(pdf_path: str) -> int:
+    import fitz  # PyMuPDF
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+def extract_pages(pdf_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """
+    Runs in a worker process. Extracts pages [start, stop) and returns (page number, text)
+    pairs, skipping pages without text. Only this slice of the document is held in memory.
+    """
+    import fitz  # PyMuPDF
+    pages = []
+    with fitz.open(pdf_path) as doc:
+        for index in range(start, min(stop, doc.page_count)):
+            text = doc.load_page(index).get_text()
+            if text.strip():
+                pages.append((index + 1, text))
+    return pages
+
+def chunk_text(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Splits text into windows of at most chunk_tokens tokens, each overlapping the previous
+    one by overlap_tokens so sentences on a boundary are retrievable from either side.
+    Chunks are slices of the original text, so whitespace and formatting are preserved.
+    """
+    spans = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+    if not spans:
+        return []
+
+    step = max(1, chunk_tokens - overlap_tokens)
+    chunks = []
+    for start in range(0, len(spans), step):
+        window = spans[start:start + chunk_tokens]
+        chunks.append(text[window[0][0]:window[-1][1]])
+        if start + chunk_tokens >= len(spans):
+            break
+    return chunks
+
+async def ingest_pdf(
+    pdf_path: str,
+    source_name: str,
+    collection_name: str,
+    on_progress: Optional[Callable[[int, int, int], Awaitable[None]]] = None,
+    known_ids: Optional[Set[str]] = None
+) -> Dict[str, Any]:
+    """
+    Streams a PDF into a collection: pages are extracted in slices on the process pool,
+    chunked, and embedded + upserted in bounded batches. At most one extracted slice and
+    one batch of chunks are in memory at a time, regardless of the document size.
+
+    Chunk ids are content hashes, so chunks listed in known_ids (the manifest of a previous
+    upload) or repeated within the document are not embedded again.
+
+    await on_progress(pages_processed, total_pages, chunks_added) is called after each slice.
+    Returns {"chunk_ids": manifest of this upload, "chunks_added": newly embedded, "chunks_reused": skipped}.
+    """
+    known_ids = known_ids or set()
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    total_pages = await loop.run_in_executor(pool, count_pages, pdf_path)
+
+    slices = [(start, start + INGEST_PAGES_PER_TASK) for start in range(0, total_pages, INGEST_PAGES_PER_TASK)]
+    manifest: List[str] = []
+    seen_ids: Set[str] = set()
+    chunks_added = 0
+    chunks_reused = 0
+    pending_texts: List[str] = []
+    pending_metadatas: List[dict] = []
+    pending_ids: List[str] = []
+
+    async def flush():
+        nonlocal chunks_added, pending_texts, pending_metadatas, pending_ids
+        if pending_texts:
+            chunks_added += await VectorService.add_documents_async(
+                collection_name, pending_texts, pending_metadatas, pending_ids
+            )
+            pending_texts, pending_metadatas, pending_ids = [], [], []
+
+    # Prefetch the next slice while the current one is chunked and embedded
+    next_slice = loop.run_in_executor(pool, extract_pages, pdf_path, *slices[0]) if slices else None
+    for position, (start, stop) in enumerate(slices):
+        pages = await next_slice
+        if position + 1 < len(slices):
+            next_slice = loop.run_in_executor(pool, extract_pages, pdf_path, *slices[position + 1])
+
+        for page_number, page_text in pages:
+            for chunk_index, chunk in enumerate(chunk_text(page_text)):
+                chunk_key = chunk_id(source_name, chunk)
+                if chunk_key in seen_ids:
+                    continue
+                seen_ids.add(chunk_key)
+                manifest.append(chunk_key)
+
+                if chunk_key in known_ids:
+                    chunks_reused += 1
+                    continue
+
+                pending_texts.append(chunk)
+                pending_metadatas.append({"source": source_name, "page": page_number, "chunk": chunk_index})
+                pending_ids.append(chunk_key)
+                if len(pending_texts) >= INGEST_BATCH_SIZE:
+                    await flush()
+
+        if on_progress:
+            await on_progress(min(stop, total_pages), total_pages, chunks_added)
+
+    await flush()
+    if on_progress:
+        await on_progress(total_pages, total_pages, chunks_added)
+    logger.info(
+        f"Ingested {source_name}: {total_pages} pages, {chunks_added} new and "
+        f"{chunks_reused} unchanged chunks in {collection_name}"
+    )
+    return {"chunk_ids": manifest, "chunks_added": chunks_added, "chunks_reused": chunks_reused}
@@ -0,0 +1,329 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import json
+import logging
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+from app.services import segment_files
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "./lexical_index")
+# Tiered merging: this many segments of a similar size are merged into one
+LEXICAL_MERGE_FACTOR = int(os.getenv("LEXICAL_MERGE_FACTOR", "8"))
+LEXICAL_MERGE_FLOOR = int(os.getenv("LEXICAL_MERGE_FLOOR", "1024")) # chunks; smaller segments share the lowest tier
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Words plus codes joined by - . / (e.g. "E-1042", "PN-88.310"), which embeddings tend to miss.
+# Joined codes are indexed whole and by part, so "E-1042" also matches a search for "1042".
+WORD_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in WORD_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            # Single letters ("e" in "e-1042") would match almost every chunk
+            tokens.extend(part for part in re.split(r"[-./]", token) if len(part) > 1)
+    return tokens
+
+def merge_candidates(sizes: List[int], factor: int = LEXICAL_MERGE_FACTOR, floor: int = LEXICAL_MERGE_FLOOR) -> List[int]:
+    """
+    Tiered merge policy. Segments are grouped by size (tier t holds up to floor * factor**t
+    chunks); once a tier has factor segments, those are merged into one segment of the next
+    tier. Returns the positions of the segments to merge, or [] when nothing needs merging.
+    Every chunk is rewritten about once per tier, so building an index of N chunks costs
+    O(N log N) instead of rewriting the whole collection every few batches.
+    """
+    tiers: Dict[int, List[int]] = {}
+    for position, size in enumerate(sizes):
+        tier = 0 if size <= floor else math.ceil(math.log(size / floor, factor))
+        tiers.setdefault(tier, []).append(position)
+    for tier in sorted(tiers):
+        if len(tiers[tier]) >= factor:
+            return tiers[tier][:factor]
+    return []
+
+def _collection_dir(collection_name: str) -> str:
+    # Collection names are user supplied; keep them inside the index directory
+    safe_name = re.sub(r"[^\w.-]", "_", collection_name)
+    return os.path.join(LEXICAL_INDEX_DIR, safe_name)
+
+class Segment:
+    """
+    One immutable, on-disk slice of a collection's inverted index.
+
+    Postings are stored term-sorted in two flat .npy arrays (doc number, term frequency)
+    that are memory-mapped, so opening a segment costs a small JSON read for the term
+    dictionary and queries only page in the postings of the terms they touch.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "terms.json"), encoding="utf-8") as handle:
+            self.terms: Dict[str, List[int]] = json.load(handle)
+        with open(os.path.join(path, "ids.json"), encoding="utf-8") as handle:
+            self.ids: List[str] = json.load(handle)
+        self.id_set = frozenset(self.ids)
+        self.postings_doc = np.load(os.path.join(path, "postings_doc.npy"), mmap_mode="r")
+        self.postings_tf = np.load(os.path.join(path, "postings_tf.npy"), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(path, "doc_lengths.npy"), mmap_mode="r")
+        self.doc_offsets = np.load(os.path.join(path, "doc_offsets.npy"), mmap_mode="r")
+        self.total_length = int(self.doc_lengths.sum()) if len(self.doc_lengths) else 0
+
+    @staticmethod
+    def write(path: str, ids: List[str], documents: List[str], metadatas: List[dict]):
+        """Builds a segment for the given chunks and moves it into place atomically."""
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = []
+        for doc_number, document in enumerate(documents):
+            tokens = tokenize(document)
+            doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_number, frequency))
+
+        terms = {}
+        postings_doc = []
+        postings_tf = []
+        for term in sorted(postings):
+            start = len(postings_doc)
+            for doc_number, frequency in postings[term]:
+                postings_doc.append(doc_number)
+                postings_tf.append(frequency)
+            terms[term] = [start, len(postings_doc)]
+
+        temp_path = segment_files.temp_path_for(path)
+        os.makedirs(temp_path)
+        # Chunk text and metadata, one JSON line per chunk, addressed by byte offset
+        offsets = []
+        with open(os.path.join(temp_path, "docs.jsonl"), "wb") as handle:
+            for document, metadata in zip(documents, metadatas):
+                offsets.append(handle.tell())
+                handle.write(json.dumps({"content": document, "metadata": metadata or {}}).encode("utf-8") + b"\n")
+
+        np.save(os.path.join(temp_path, "postings_doc.npy"), np.asarray(postings_doc, dtype=np.int32))
+        np.save(os.path.join(temp_path, "postings_tf.npy"), np.asarray(postings_tf, dtype=np.float32))
+        np.save(os.path.join(temp_path, "doc_lengths.npy"), np.asarray(doc_lengths, dtype=np.float32))
+        np.save(os.path.join(temp_path, "doc_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        segment_files.write_json(os.path.join(temp_path, "terms.json"), terms)
+        segment_files.write_json(os.path.join(temp_path, "ids.json"), ids)
+        segment_files.replace_dir(temp_path, path)
+
+    def read_documents(self, doc_numbers: Iterable[int]) -> List[dict]:
+        documents = []
+        with open(os.path.join(self.path, "docs.jsonl"), "rb") as handle:
+            for doc_number in doc_numbers:
+                handle.seek(int(self.doc_offsets[doc_number]))
+                documents.append(json.loads(handle.readline()))
+        return documents
+
+class LexicalIndex:
+    """
+    BM25 index for one collection, built incrementally alongside the vector store.
+
+    Every add_documents call appends a new segment; deletes are recorded as tombstones in the
+    manifest. Segments of a similar size are merged in tiers (see merge_candidates), so the
+    number of segments a query visits grows only logarithmically, and all segments are
+    merged (dropping deleted chunks) once most chunks are tombstones.
+    The manifest is re-read when another process has changed it; writers in different
+    processes are serialised by a file lock (see segment_files).
+    """
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        self.path = _collection_dir(collection_name)
+        self.manifest_path = os.path.join(self.path, "manifest.json")
+        self._write_lock = threading.Lock()
+        self._manifest_key = None
+        # Replaced as a whole on every change, so readers always see a consistent snapshot
+        self._state: Tuple[List[Segment], frozenset] = ([], frozenset())
+        self._next_segment = 0
+        # Merged-away segments awaiting deletion: name -> time retired
+        self._retired: Dict[str, float] = {}
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def _refresh(self):
+        """Picks up writes made by other workers since the manifest was last read."""
+        if segment_files.manifest_key(self.manifest_path) != self._manifest_key:
+            self._load()
+
+    def _load(self):
+        """Reads the manifest. Writers call this with the collection lock held."""
+        key = segment_files.manifest_key(self.manifest_path)
+        if key is None:
+            return
+        with open(self.manifest_path, encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        current = {segment.name: segment for segment in self._state[0]}
+        segments = [
+            current.get(name) or Segment(os.path.join(self.path, name))
+            for name in manifest["segments"]
+        ]
+        self._state = (segments, frozenset(manifest["deleted"]))
+        self._next_segment = manifest["next_segment"]
+        self._retired = manifest.get("retired", {})
+        self._manifest_key = key
+
+    def _save(self, segments: List[Segment], deleted: Set[str]):
+        """Writes the manifest. Call with the collection lock held."""
+        self._retired = segment_files.collect(self.path, self._retired)
+        segment_files.write_json(self.manifest_path, {
+            "segments": [segment.name for segment in segments],
+            "deleted": sorted(deleted),
+            "next_segment": self._next_segment,
+            "retired": self._retired
+        })
+        self._state = (segments, frozenset(deleted))
+        self._manifest_key = segment_files.manifest_key(self.manifest_path)
+
+    def _new_segment(self, ids: List[str], documents: List[str], metadatas: List[dict]) -> Segment:
+        name = f"segment-{self._next_segment:06d}"
+        self._next_segment += 1
+        Segment.write(os.path.join(self.path, name), ids, documents, metadatas)
+        return Segment(os.path.join(self.path, name))
+
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[dict]] = None):
+        """Indexes new chunks. Ids already indexed are skipped (ids are content-addressed)."""
+        metadatas = metadatas or [{} for _ in documents]
+        with self._write_lock, segment_files.collection_lock(self.path):
+            self._load()
+            segments, deleted = self._state
+            deleted = set(deleted)
+
+            new = [i for i, doc_id in enumerate(ids) if not any(doc_id in segment.id_set for segment in segments)]
+            # A re-added chunk that was deleted earlier is still on disk; just revive it
+            revived = deleted.intersection(ids)
+            if not new and not revived:
+                return
+
+            segments = list(segments)
+            if new:
+                segments.append(self._new_segment(
+                    [ids[i] for i in new], [documents[i] for i in new], [metadatas[i] for i in new]
+                ))
+            deleted -= revived
+            # Merge everything once most indexed chunks are tombstones, else merge by tier
+            if len(deleted) > sum(len(segment.ids) for segment in segments) / 2:
+                segments, deleted = self._merge(segments, list(range(len(segments))), deleted)
+            while True:
+                positions = merge_candidates([len(segment.ids) for segment in segments])
+                if not positions:
+                    break
+                segments, deleted = self._merge(segments, positions, deleted)
+            self._save(segments, deleted)
+
+    def delete(self, ids: List[str]):
+        if not self.exists():
+            return
+        with self._write_lock, segment_files.collection_lock(self.path):
+            self._load()
+            segments, deleted = self._state
+            removed = {doc_id for doc_id in ids if any(doc_id in segment.id_set for segment in segments)} - deleted
+            if not removed:
+                return
+            self._save(segments, set(deleted) | removed)
+
+    def live_ids(self) -> Set[str]:
+        """Ids of every chunk currently indexed."""
+        self._refresh()
+        segments, deleted = self._state
+        return {doc_id for segment in segments for doc_id in segment.ids} - deleted
+
+    def _merge(self, segments: List[Segment], positions: List[int], deleted: Set[str]) -> Tuple[List[Segment], Set[str]]:
+        """
+        Rewrites the live chunks of the segments at positions into one segment, which takes
+        the place of the first of them. Returns the new segment list and remaining tombstones.
+        """
+        merging = [segments[position] for position in positions]
+        ids, documents, metadatas = [], [], []
+        for segment in merging:
+            live = [n for n, doc_id in enumerate(segment.ids) if doc_id not in deleted]
+            for doc_number, stored in zip(live, segment.read_documents(live)):
+                ids.append(segment.ids[doc_number])
+                documents.append(stored["content"])
+                metadatas.append(stored["metadata"])
+        merged = self._new_segment(ids, documents, metadatas)
+        logger.info(f"Merged {len(merging)} lexical index segments of {self.collection_name} ({len(ids)} chunks)")
+        # Other workers may still be searching them; deleted by a later write
+        self._retired = segment_files.retire(self._retired, [segment.name for segment in merging])
+        # Tombstones of the merged segments are gone; their chunks were not copied
+        remaining = {doc_id for doc_id in deleted if not any(doc_id in segment.id_set for segment in merging)}
+        kept = [segment for position, segment in enumerate(segments) if position not in positions]
+        kept.insert(positions[0], merged)
+        return kept, remaining
+
+    def search(self, query_text: str, n_results: int = 10) -> List[dict]:
+        """BM25 top-n over all segments. Returns matches shaped like VectorService results."""
+        self._refresh()
+        segments, deleted = self._state
+        terms = set(tokenize(query_text))
+        if not segments or not terms:
+            return []
+
+        doc_count = sum(len(segment.ids) for segment in segments)
+        live_count = max(1, doc_count - len(deleted))
+        average_length = sum(segment.total_length for segment in segments) / max(1, doc_count)
+        document_frequency = {
+            term: sum(segment.terms[term][1] - segment.terms[term][0] for segment in segments if term in segment.terms)
+            for term in terms
+        }
+        idf = {
+            term: math.log(1 + (live_count - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items() if df
+        }
+
+        candidates = []
+        for segment in segments:
+            scores = np.zeros(len(segment.ids), dtype=np.float32)
+            for term, weight in idf.items():
+                span = segment.terms.get(term)
+                if span is None:
+                    continue
+                doc_numbers = segment.postings_doc[span[0]:span[1]]
+                frequencies = segment.postings_tf[span[0]:span[1]]
+                lengths = segment.doc_lengths[doc_numbers]
+                # Doc numbers are unique within one term's postings, so plain fancy-index += is safe
+                scores[doc_numbers] += weight * frequencies * (BM25_K1 + 1) / (
+                    frequencies + BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)
+                )
+
+            hits = np.flatnonzero(scores)
+            # Over-fetch a little so tombstoned chunks do not leave the result short
+            limit = min(len(hits), n_results + len(deleted))
+            if limit == 0:
+                continue
+            top = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+            candidates.extend(
+                (float(scores[n]), segment, int(n)) for n in top if segment.ids[n] not in deleted
+            )
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        matches = []
+        for score, segment, doc_number in candidates[:n_results]:
+            stored = segment.read_documents([doc_number])[0]
+            matches.append({
+                "id": segment.ids[doc_number],
+                "content": stored["content"],
+                "metadata": stored["metadata"],
+                "bm25_score": score
+            })
+        return matches
+
+# One index object per collection, shared by all requests of this process
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_lexical_index(collection_name: str) -> LexicalIndex:
+    index = _indexes.get(collection_name)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(collection_name, LexicalIndex(collection_name))
+    return index
@@ -1,65 +1,227 @@
 import os
-import google.generativeai as genai
-from typing import Optional
+import asyncio
+import hashlib
+import time
+import logging
+from typing import Optional, AsyncIterator, Any, Dict, Tuple
 from dotenv import load_dotenv
+from app.services import resilience, telemetry
+from app.services.resilience import ExternalCallError
 
 # Load env vars to ensure API key is available
 load_dotenv()
 
-async def generate_text(provider: str, model: str, query: str, context: Optional[str] = "") -> str:
+logger = logging.getLogger(__name__)
+
+def build_prompt(query: str, context: Optional[str] = "", history: Optional[str] = "") -> str:
     """
-    Unified interface to call Google Gemini.
-    It structures the prompt to include any retrieved context for RAG.
+    We build a standard prompt that instructs the AI how to use the provided context.
+    Shared by the blocking and streaming paths so both see identical prompts.
     """
-    
-    # Ensure Gemini is configured
-    api_key = os.getenv("GEMINI_API_KEY")
-    if api_key:
-        print(f"DEBUG: Configuring GenAI with key starting with: {api_key[:10]}...")
-        genai.configure(api_key=api_key)
-    else:
-        return "AI Service Error: GEMINI_API_KEY not found in environment."
-    
-    # We build a standard prompt that instructs the AI how to use the provided context
-    prompt_template = f"""
+    return f"""
     Use the following background information to help answer the user query accurately.
-    
+
     Background Context:
     {context if context else "No additional context provided."}
-    
+
+    Conversation So Far:
+    {history if history else "This is the start of the conversation."}
+
     User Question: {query}
-    
+
     Answer:
     """
-    
+
+# Fingerprint of the prompt wording; cached answers are discarded automatically when it changes
+PROMPT_TEMPLATE_HASH = hashlib.sha256(build_prompt("{query}", "{context}", "{history}").encode("utf-8")).hexdigest()[:16]
+
+# generate_text reports failures as answer text; these must never be cached
+ERROR_RESPONSE_PREFIXES = ("AI Service Error", "AI Service error", "AI Error", "Developer Note")
+
+def is_error_response(text: str) -> bool:
+    return not text or text.startswith(ERROR_RESPONSE_PREFIXES)
+
+class ProviderRegistry:
+    """
+    Holds provider configuration and model handles for the lifetime of the process.
+    Gemini is configured once (at startup), GenerativeModel handles are created once per
+    (provider, model) and reused, and each model gets a semaphore that caps in-flight calls,
+    so a burst of chats queues here instead of running into provider rate limits.
+    """
+    SUPPORTED_PROVIDERS = ("gemini",)
+
+    def __init__(self):
+        self.api_key: Optional[str] = None
+        self.initialized = False
+        self.default_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        # Per-model overrides, e.g. LLM_CONCURRENCY_LIMITS="gemini-2.0-flash=16,gemini-1.5-pro=4"
+        self.concurrency_overrides = {}
+        for item in os.getenv("LLM_CONCURRENCY_LIMITS", "").split(","):
+            if "=" in item:
+                model_name, limit = item.split("=", 1)
+                self.concurrency_overrides[model_name.strip()] = int(limit)
+        self._models: Dict[Tuple[str, str], Any] = {}
+        self._limits: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+
+    def initialize(self):
+        """Reads credentials and configures the SDK. Safe to call more than once."""
+        self.api_key = os.getenv("GEMINI_API_KEY")
+        if self.api_key:
+            # The SDK (and its gRPC stack) is imported here rather than at module import
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+        self.initialized = True
+
+    def get_model(self, provider: str, model: str):
+        key = (provider, model)
+        if key not in self._models:
+            import google.generativeai as genai
+            logger.info(f"Creating {provider} model handle: {model}")
+            self._models[key] = genai.GenerativeModel(model_name=model)
+        return self._models[key]
+
+    def limit(self, provider: str, model: str) -> asyncio.Semaphore:
+        key = (provider, model)
+        if key not in self._limits:
+            self._limits[key] = asyncio.Semaphore(self.concurrency_overrides.get(model, self.default_concurrency))
+        return self._limits[key]
+
+    def check(self, provider: str) -> Optional[str]:
+        """Returns an error message if calls to this provider cannot be made, else None."""
+        if not self.initialized:
+            self.initialize()
+        if not self.api_key:
+            return "AI Service Error: GEMINI_API_KEY not found in environment."
+        if provider not in self.SUPPORTED_PROVIDERS:
+            return "Developer Note: Configuration error. Only Google Gemini is supported at this time."
+        return None
+
+# Initialised once by the startup warm-up in the application lifespan; shared by every LLM node execution
+provider_registry = ProviderRegistry()
+
+def _provider_error(api_error: Exception, target_model: str) -> ExternalCallError:
+    """Maps a failed Gemini call to a structured error whose message can be shown to the user."""
+    # Provide a more helpful message for 404s
+    if "404" in str(api_error) and not getattr(api_error, "retryable", False):
+        return ExternalCallError(
+            "gemini", "error",
+            f"AI Service error (404): The model '{target_model}' was not found. Please ensure your API key is valid."
+        )
+    if isinstance(api_error, ExternalCallError):
+        return ExternalCallError(api_error.dependency, api_error.kind, f"AI Service Error: {api_error}", api_error.retryable)
+    return ExternalCallError("gemini", "error", f"AI Service Error: {str(api_error)}")
+
+def _check_provider(provider_name: str):
+    config_error = provider_registry.check(provider_name)
+    if config_error:
+        raise ExternalCallError(provider_name, "misconfigured", config_error)
+
+async def generate_text(
+    provider: str,
+    model: str,
+    query: str,
+    context: Optional[str] = "",
+    history: Optional[str] = ""
+) -> str:
+    """
+    Unified interface to call Google Gemini.
+    It structures the prompt to include any retrieved context for RAG.
+    Calls go through the resilience layer (deadline, retries, circuit breaker); when Gemini
+    cannot answer, ExternalCallError is raised with a message suitable for the user.
+    """
+    provider_name = provider.lower()
+    _check_provider(provider_name)
+
+    # We use the model specified in the workflow node, defaulting to a comprehensive one if needed
+    target_model = model or "gemini-2.0-flash"
+    prompt = build_prompt(query, context, history)
+
+    async def attempt():
+        # Waiting for a concurrency slot counts against the attempt's timeout
+        queued_at = time.perf_counter()
+        async with provider_registry.limit(provider_name, target_model):
+            telemetry.record_queue_wait(target_model, time.perf_counter() - queued_at)
+            return await ai_model.generate_content_async(prompt)
+
+    try:
+        ai_model = provider_registry.get_model(provider_name, target_model)
+        generation = await resilience.call(provider_name, attempt)
+        telemetry.record_llm_usage(target_model, getattr(generation, "usage_metadata", None))
+
+        if generation and generation.text:
+            return generation.text
+        return "AI Error: Received an empty response from Gemini."
+
+    except Exception as api_error:
+        logger.error(f"Gemini request failed: {api_error}")
+        raise _provider_error(api_error, target_model) from api_error
+
+async def stream_text(
+    provider: str,
+    model: str,
+    query: str,
+    context: Optional[str] = "",
+    history: Optional[str] = ""
+) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of generate_text. Yields text fragments as Gemini produces them,
+    using the SDK's async streaming API. Opening the stream is retried like generate_text;
+    once text has been yielded a failure is raised as ExternalCallError instead of retried.
+    """
+    provider_name = provider.lower()
+    _check_provider(provider_name)
+
+    target_model = model or "gemini-2.0-flash"
+    prompt = build_prompt(query, context, history)
+    policy = resilience.POLICIES[provider_name]
+    produced_text = False
+
+    def time_left() -> float:
+        remaining = resilience.remaining_time()
+        return policy.timeout_seconds if remaining is None else min(policy.timeout_seconds, remaining)
+
+    # The slot is held for the whole stream, since the provider counts it as one request
+    limit = provider_registry.limit(provider_name, target_model)
+    queued_at = time.perf_counter()
     try:
-        provider_name = provider.lower()
-        
-        if provider_name == "gemini":
-            # Using Google's generative AI SDK
-            # We use the model specified in the workflow node, defaulting to a comprehensive one if needed
-            target_model = model or "gemini-2.0-flash"
-            
+        await asyncio.wait_for(limit.acquire(), max(0.0, time_left()))
+    except asyncio.TimeoutError:
+        raise ExternalCallError(provider_name, "timeout", "AI Service Error: timed out waiting for a free LLM slot")
+    telemetry.record_queue_wait(target_model, time.perf_counter() - queued_at)
+
+    try:
+        ai_model = provider_registry.get_model(provider_name, target_model)
+        generation = await resilience.call(
+            provider_name, lambda: ai_model.generate_content_async(prompt, stream=True)
+        )
+
+        usage = None
+        chunks = generation.__aiter__()
+        while True:
+            # Every chunk must arrive within the call timeout and the request deadline
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, time_left()))
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                raise ExternalCallError(provider_name, "timeout", "Gemini stopped streaming before the deadline")
+            # Token counts are cumulative; the last chunk carries the totals
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            # Chunks without text (e.g. safety metadata only) are skipped
             try:
-                print(f"DEBUG: Calling Gemini with model: {target_model}")
-                # Initialize the model with the latest standards
-                ai_model = genai.GenerativeModel(model_name=target_model)
-                generation = ai_model.generate_content(prompt_template)
-                
-                if generation and generation.text:
-                    return generation.text
-                return "AI Error: Received an empty response from Gemini."
-                
-            except Exception as e:
-                print(f"CRITICAL: Gemini Request Failed: {str(e)}")
-                # Provide a more helpful message for 404s
-                if "404" in str(e):
-                    return f"AI Service error (404): The model '{target_model}' was not found. Please ensure your API key is valid."
-                raise e
-            
-        else:
-            return f"Developer Note: Configuration error. Only Google Gemini is supported at this time."
-            
+                fragment = chunk.text
+            except ValueError:
+                continue
+            if fragment:
+                produced_text = True
+                yield fragment
+        telemetry.record_llm_usage(target_model, usage)
+
+        if not produced_text:
+            yield "AI Error: Received an empty response from Gemini."
+
     except Exception as api_error:
-        # We catch and return the error message so the user sees what went wrong
-        return f"AI Service Error: {str(api_error)}"
+        logger.error(f"Gemini streaming request failed: {api_error}")
+        raise _provider_error(api_error, target_model) from api_error
+    finally:
+        limit.release()
@@ -0,0 +1,148 @@
+"""
+Built-in node types of the canvas. Each handler receives a NodeContext and returns
+the node's output, which the executor stores on the run's blackboard.
+"""
+from typing import List, Optional, Tuple
+from app.models.schemas import KnowledgeNodeConfig, LLMNodeConfig, RerankNodeConfig, SearchNodeConfig
+from app.services.llm_provider import generate_text, stream_text, is_error_response, PROMPT_TEMPLATE_HASH
+from app.services.node_registry import node_registry, NodeContext, CPU_BOUND, INLINE, IO_BOUND, LLM_BOUND
+from app.services.prompt_builder import assemble_prompt
+from app.services.reranker import rerank
+from app.services.response_cache import response_cache
+from app.services.search_service import SearchService
+from app.services.vector_service import VectorService
+from app.services import resilience, telemetry
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+@node_registry.register("queryNode", resource=INLINE)
+async def run_query_node(context: NodeContext) -> None:
+    # Entry point - query is already in our state
+    return None
+
+@node_registry.register("knowledgeNode", KnowledgeNodeConfig, IO_BOUND, degraded_output=[])
+async def run_knowledge_node(context: NodeContext) -> List[str]:
+    # Fetch snippets from the vector database (PDFs/Docs)
+    config: KnowledgeNodeConfig = context.config
+    # A rerank node downstream wants a wider candidate set to choose from
+    n_results = max([config.top_k] + [rerank_config.candidates for rerank_config in context.downstream_configs('rerankNode')])
+    matches = await resilience.call(
+        "chroma", lambda: VectorService.hybrid_query_async(config.collection, context.query, n_results)
+    )
+    telemetry.RETRIEVAL_MATCHES.labels(context.node.type).observe(len(matches))
+    telemetry.annotate(collection=config.collection, matches=len(matches))
+
+    # Kept as separate chunks so the LLM node can rank and trim them to its token budget
+    return [
+        f"From {match['metadata'].get('source', 'Document')}:\n{match['content']}"
+        for match in matches
+    ]
+
+def _context_chunks(context: NodeContext) -> Tuple[List[str], List[str]]:
+    """
+    Knowledge chunks reaching this node, as (reranked, other). Knowledge branches that
+    already went through an upstream rerank node are represented by its output only.
+    """
+    rerank_ids = context.upstream_ids('rerankNode')
+    covered = {ancestor_id for rerank_id in rerank_ids for ancestor_id in context.upstream_ids('knowledgeNode', rerank_id)}
+    outputs = context.state['node_outputs']
+    reranked = [chunk for rerank_id in rerank_ids for chunk in outputs.get(rerank_id, [])]
+    other = [
+        chunk
+        for knowledge_id in context.upstream_ids('knowledgeNode') if knowledge_id not in covered
+        for chunk in outputs.get(knowledge_id, [])
+    ]
+    return reranked, other
+
+@node_registry.register("rerankNode", RerankNodeConfig, CPU_BOUND)
+def run_rerank_node(context: NodeContext) -> List[str]:
+    # Runs on the CPU pool: scores the whole candidate set in one NumPy batch
+    config: RerankNodeConfig = context.config
+    reranked, other = _context_chunks(context)
+    result = rerank(context.query, reranked + other, config.top_n, config.scorer, config.min_score)
+    telemetry.annotate(
+        candidates=len(reranked) + len(other),
+        kept=len(result['chunks']),
+        scores_cached=result['cached']
+    )
+    return result['chunks']
+
+@node_registry.register("searchNode", SearchNodeConfig, IO_BOUND, degraded_output="")
+async def run_search_node(context: NodeContext) -> str:
+    # Real-time search from the web
+    web_context = await SearchService.search(context.query, context.config.max_results)
+    return f"Latest Web Info:\n{web_context}"
+
+@node_registry.register("llmNode", LLMNodeConfig, LLM_BOUND)
+async def run_llm_node(context: NodeContext) -> str:
+    # The 'brain' of the workflow. We join all context gathered by upstream branches here.
+    config: LLMNodeConfig = context.config
+    emit = context.emit
+    telemetry.annotate(model=config.model)
+
+    reranked_chunks, knowledge_chunks = _context_chunks(context)
+    # A degraded search branch leaves an empty string behind
+    search_results = [result for result in context.upstream('searchNode') if result]
+
+    # Fit history and context into the model's token budget (reranked chunks keep their order)
+    prompt = assemble_prompt(
+        config.model, context.query, context.history, knowledge_chunks + search_results, reranked_chunks
+    )
+    all_context = prompt['context']
+    history_text = prompt['history']
+    telemetry.annotate(
+        prompt_tokens=prompt['prompt_tokens'],
+        chunks_used=prompt['chunks_used'],
+        chunks_dropped=prompt['chunks_dropped']
+    )
+
+    # Repeated questions over the same context (and conversation) are answered from the response cache
+    cache_args = (config.provider, config.model, PROMPT_TEMPLATE_HASH, f"{history_text}\x00{all_context}", context.query)
+    answer: Optional[str] = None
+    if response_cache:
+        answer = await asyncio.to_thread(response_cache.get, *cache_args)
+        telemetry.record_cache("response", answer is not None)
+        telemetry.annotate(cache_hit=answer is not None)
+
+    if answer is not None:
+        logger.info(f"LLM response cache hit for node {context.node_id}")
+        if emit:
+            emit({"event": "token", "node_id": context.node_id, "text": answer})
+    else:
+        if emit:
+            # Forward tokens to the stream as soon as the provider produces them
+            fragments = []
+            async for fragment in stream_text(
+                provider=config.provider,
+                model=config.model,
+                query=context.query,
+                context=all_context,
+                history=history_text
+            ):
+                fragments.append(fragment)
+                emit({"event": "token", "node_id": context.node_id, "text": fragment})
+            answer = "".join(fragments)
+        else:
+            answer = await generate_text(
+                provider=config.provider,
+                model=config.model,
+                query=context.query,
+                context=all_context,
+                history=history_text
+            )
+
+        if response_cache and not is_error_response(answer):
+            await asyncio.to_thread(response_cache.put, *cache_args, answer)
+
+    context.set_final_answer(answer)
+    return answer
+
+@node_registry.register("outputNode", resource=INLINE)
+async def run_output_node(context: NodeContext) -> None:
+    # Reached the end - return what the nearest LLM upstream produced
+    answers = context.upstream('llmNode')
+    if answers:
+        context.set_final_answer(answers[-1])
+    return None
@@ -0,0 +1,188 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, Union
+from pydantic import BaseModel, ValidationError
+from app.models.schemas import Node, NodeConfig
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Resource classes a node type declares. The scheduler caps how many nodes of each class
+# run at once (across all concurrent workflow runs of this process), so heavy CPU work
+# cannot starve the event loop and a burst of chats cannot flood the LLM provider.
+IO_BOUND = "io"    # waits on the network or the vector store
+CPU_BOUND = "cpu"  # computes in Python/NumPy; sync handlers run on the CPU pool
+LLM_BOUND = "llm"  # calls a language model
+INLINE = "inline"  # only reads or writes the run's state; runs on the loop without taking a slot
+RESOURCE_CLASSES = (IO_BOUND, CPU_BOUND, LLM_BOUND, INLINE)
+
+NODE_CPU_WORKERS = int(os.getenv("NODE_CPU_WORKERS", str(os.cpu_count() or 2)))
+RESOURCE_LIMITS = {
+    IO_BOUND: int(os.getenv("NODE_IO_CONCURRENCY", "64")),
+    CPU_BOUND: int(os.getenv("NODE_CPU_CONCURRENCY", str(NODE_CPU_WORKERS))),
+    LLM_BOUND: int(os.getenv("NODE_LLM_CONCURRENCY", "32")),
+}
+
+# NumPy and most parsers release the GIL, so a thread pool gives real parallelism here
+# without pickling node inputs to worker processes
+cpu_executor = ThreadPoolExecutor(max_workers=NODE_CPU_WORKERS, thread_name_prefix="node-cpu")
+
+class NodeContext:
+    """
+    Everything a node handler needs for one run: its validated config, the run's
+    blackboard and the compiled plan (for upstream outputs).
+    """
+    def __init__(self, node: Node, config: BaseModel, plan: Any, workflow_state: Dict[str, Any]):
+        self.node = node
+        self.node_id = node.id
+        self.config = config
+        self.plan = plan
+        self.state = workflow_state
+
+    @property
+    def query(self) -> str:
+        return self.state['query']
+
+    @property
+    def history(self) -> list:
+        return self.state['history']
+
+    @property
+    def emit(self) -> Optional[Callable[[Dict[str, Any]], None]]:
+        return self.state['emit']
+
+    def upstream(self, node_type: str) -> List[Any]:
+        """Outputs of every ancestor of this node with the given type, in topological order."""
+        return self.plan._upstream_outputs(self.node_id, self.state, node_type)
+
+    def upstream_ids(self, node_type: str, node_id: Optional[str] = None) -> List[str]:
+        """Ids of the ancestors (of this node, or of node_id) with the given type."""
+        return [
+            ancestor_id for ancestor_id in self.plan.ancestor_order[node_id or self.node_id]
+            if self.plan.node_map[ancestor_id].type == node_type
+        ]
+
+    def downstream_configs(self, node_type: str) -> List[BaseModel]:
+        """Validated configs of this node's direct children with the given type."""
+        return [
+            self.plan.node_configs[child_id] for child_id in self.plan.execution_path[self.node_id]
+            if self.plan.node_map[child_id].type == node_type
+        ]
+
+    def set_final_answer(self, answer: str):
+        self.state['final_answer'] = answer
+
+    async def run_cpu(self, func: Callable, *args, **kwargs) -> Any:
+        """Runs a CPU-heavy helper on the CPU pool from an async handler."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cpu_executor, functools.partial(func, *args, **kwargs))
+
+# Marks node types that have no degraded mode: when their dependency fails, the node fails
+NO_FALLBACK = object()
+
+Handler = Callable[[NodeContext], Union[Any, Awaitable[Any]]]
+
+class NodeType:
+    """
+    A registered kind of node. The handler receives a NodeContext and returns the node's
+    output (None for no output). Async handlers run on the event loop; sync handlers run on
+    the pool of their resource class, so they must not emit events or touch the loop.
+
+    degraded_output is what the node contributes when an external dependency fails
+    (e.g. an empty context list); NO_FALLBACK makes the failure the node's answer instead.
+    """
+    def __init__(
+        self,
+        name: str,
+        handler: Handler,
+        config_model: Type[BaseModel] = NodeConfig,
+        resource: str = IO_BOUND,
+        degraded_output: Any = NO_FALLBACK
+    ):
+        if resource not in RESOURCE_CLASSES:
+            raise ValueError(f"Unknown resource class '{resource}' for node type '{name}'")
+        if resource == INLINE and not inspect.iscoroutinefunction(handler):
+            raise ValueError(f"Inline node type '{name}' must have an async handler")
+        self.name = name
+        self.handler = handler
+        self.config_model = config_model
+        self.resource = resource
+        self.degraded_output = degraded_output
+        self.is_async = inspect.iscoroutinefunction(handler)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.name, "resource": self.resource, "config_schema": self.config_model.model_json_schema()}
+
+class NodeRegistry:
+    """
+    Maps node type names (as used on the canvas) to their handler, config schema and
+    resource class. Built-in types are registered in node_handlers; new kinds of node
+    (rerankers, parsers, ...) only need a handler and a register call.
+    """
+    def __init__(self):
+        self._types: Dict[str, NodeType] = {}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+
+    def register(
+        self,
+        name: str,
+        config_model: Type[BaseModel] = NodeConfig,
+        resource: str = IO_BOUND,
+        degraded_output: Any = NO_FALLBACK
+    ) -> Callable[[Handler], Handler]:
+        """Decorator that registers a handler for a node type."""
+        def decorator(handler: Handler) -> Handler:
+            if name in self._types:
+                logger.warning(f"Node type '{name}' registered twice; the later handler wins")
+            self._types[name] = NodeType(name, handler, config_model, resource, degraded_output)
+            return handler
+        return decorator
+
+    def get(self, name: str) -> NodeType:
+        node_type = self._types.get(name)
+        if node_type is None:
+            raise ValueError(f"Workflow configuration error: Unknown node type '{name}'.")
+        return node_type
+
+    def types(self) -> List[NodeType]:
+        return list(self._types.values())
+
+    def parse_config(self, node: Node) -> BaseModel:
+        """Validates a node's settings against its type's config model (at compile time)."""
+        node_type = self.get(node.type)
+        # Unset fields come from the canvas as null; let the model's defaults apply
+        settings = {key: value for key, value in node.data.model_dump().items() if value is not None}
+        try:
+            return node_type.config_model.model_validate(settings)
+        except ValidationError as error:
+            problems = "; ".join(
+                f"{'.'.join(str(part) for part in issue['loc'])}: {issue['msg']}" for issue in error.errors()
+            )
+            raise ValueError(f"Workflow configuration error: Invalid settings for node '{node.id}' ({node.type}): {problems}")
+
+    def slot(self, resource: str) -> asyncio.Semaphore:
+        if resource not in self._slots:
+            self._slots[resource] = asyncio.Semaphore(RESOURCE_LIMITS[resource])
+        return self._slots[resource]
+
+    async def run(self, node_type: NodeType, context: NodeContext) -> Any:
+        """Runs a node's handler within its resource class's concurrency cap."""
+        if node_type.resource == INLINE:
+            # Trivial bookkeeping must not queue behind slow knowledge or search nodes
+            return await node_type.handler(context)
+        async with self.slot(node_type.resource):
+            if node_type.is_async:
+                return await node_type.handler(context)
+            loop = asyncio.get_running_loop()
+            # IO-bound sync handlers use the loop's default thread pool
+            executor = cpu_executor if node_type.resource == CPU_BOUND else None
+            # Carry the trace span and request deadline over to the worker thread
+            run_in_context = contextvars.copy_context().run
+            return await loop.run_in_executor(executor, run_in_context, node_type.handler, context)
+
+# Shared by every compiled plan in this process
+node_registry = NodeRegistry()
@@ -0,0 +1,419 @@
+"""
+Embedded vector index: normalised float32 embeddings in memory-mapped .npy files,
+searched with NumPy. Used instead of Chroma when VECTOR_BACKEND=numpy.
+
+Layout mirrors the lexical index: every upsert appends an immutable segment, deletes and
+overwritten chunks are tombstoned in manifest.json, and segments of a similar size are
+merged in tiers (lexical_index.merge_candidates). Because segments are opened with
+mmap_mode="r", every uvicorn worker on the host shares the same pages through the OS page
+cache, and a worker picks up another worker's writes the next time the manifest changes.
+Writers in different workers are serialised by a file lock (see segment_files).
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+from app.services import segment_files
+from app.services.lexical_index import merge_candidates
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vector_index")
+# Tiered merging: this many segments of a similar size are merged into one
+VECTOR_MERGE_FACTOR = int(os.getenv("VECTOR_MERGE_FACTOR", "8"))
+VECTOR_MERGE_FLOOR = int(os.getenv("VECTOR_MERGE_FLOOR", "1024")) # rows; smaller segments share the lowest tier
+# Rows scored per matrix product; bounds the temporary score matrix for large segments
+VECTOR_SEARCH_BLOCK_ROWS = int(os.getenv("VECTOR_SEARCH_BLOCK_ROWS", "65536"))
+
+def _collection_dir(collection_name: str) -> str:
+    # Collection names are user supplied; keep them inside the index directory
+    safe_name = re.sub(r"[^\w.-]", "_", collection_name)
+    return os.path.join(VECTOR_INDEX_DIR, safe_name)
+
+def normalize(embeddings) -> np.ndarray:
+    """float32 rows scaled to unit length, so a dot product is the cosine similarity."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def matches_filter(metadata: dict, where: Optional[dict]) -> bool:
+    """The subset of Chroma's where syntax used here: equality, $eq/$ne/$in, $and/$or."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, expected in condition.items():
+                if operator == "$eq" and value != expected:
+                    return False
+                if operator == "$ne" and value == expected:
+                    return False
+                if operator == "$in" and value not in expected:
+                    return False
+                if operator not in ("$eq", "$ne", "$in"):
+                    raise ValueError(f"Unsupported filter operator {operator}")
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+class VectorSegment:
+    """One immutable, on-disk slice of a collection: embeddings, ids and chunk text."""
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "ids.json"), encoding="utf-8") as handle:
+            self.ids: List[str] = json.load(handle)
+        # Built once per segment, so finding existing ids does not scan the whole collection
+        self.rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.doc_offsets = np.load(os.path.join(path, "doc_offsets.npy"), mmap_mode="r")
+        # Segments never change, so a filter's row mask can be kept for the segment's lifetime
+        self._filter_masks: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def write(path: str, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[dict]):
+        """Builds a segment and moves it into place atomically."""
+        temp_path = segment_files.temp_path_for(path)
+        os.makedirs(temp_path)
+        offsets = []
+        with open(os.path.join(temp_path, "docs.jsonl"), "wb") as handle:
+            for document, metadata in zip(documents, metadatas):
+                offsets.append(handle.tell())
+                handle.write(json.dumps({"content": document, "metadata": metadata or {}}).encode("utf-8") + b"\n")
+        np.save(os.path.join(temp_path, "embeddings.npy"), np.ascontiguousarray(embeddings, dtype=np.float32))
+        np.save(os.path.join(temp_path, "doc_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        segment_files.write_json(os.path.join(temp_path, "ids.json"), ids)
+        segment_files.replace_dir(temp_path, path)
+
+    def read_documents(self, rows: Iterable[int]) -> List[dict]:
+        documents = []
+        with open(os.path.join(self.path, "docs.jsonl"), "rb") as handle:
+            for row in rows:
+                handle.seek(int(self.doc_offsets[row]))
+                documents.append(json.loads(handle.readline()))
+        return documents
+
+    def filter_mask(self, where: dict) -> np.ndarray:
+        """Rows whose metadata passes the filter (one sequential read of the chunk file)."""
+        key = json.dumps(where, sort_keys=True)
+        mask = self._filter_masks.get(key)
+        if mask is None:
+            with open(os.path.join(self.path, "docs.jsonl"), "rb") as handle:
+                mask = np.fromiter(
+                    (matches_filter(json.loads(line)["metadata"], where) for line in handle),
+                    dtype=bool, count=len(self.ids)
+                )
+            self._filter_masks[key] = mask
+        return mask
+
+class NumpyCollection:
+    """
+    The vectors of one collection. Readers work on an immutable snapshot of
+    (segments, tombstoned rows per segment); writers replace the snapshot as a whole.
+    """
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        self.path = _collection_dir(collection_name)
+        self.manifest_path = os.path.join(self.path, "manifest.json")
+        self._write_lock = threading.Lock()
+        self._manifest_key = None
+        self._state: Tuple[List[VectorSegment], Dict[str, np.ndarray]] = ([], {})
+        self._next_segment = 0
+        # Merged-away segments awaiting deletion: name -> time retired
+        self._retired: Dict[str, float] = {}
+        self.dimension: Optional[int] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def _refresh(self):
+        """Picks up writes made by other workers since the manifest was last read."""
+        if segment_files.manifest_key(self.manifest_path) != self._manifest_key:
+            self._load()
+
+    def _load(self):
+        """Reads the manifest. Writers call this with the collection lock held."""
+        key = segment_files.manifest_key(self.manifest_path)
+        if key is None:
+            return
+        with open(self.manifest_path, encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        current = {segment.name: segment for segment in self._state[0]}
+        segments = [
+            current.get(name) or VectorSegment(os.path.join(self.path, name))
+            for name in manifest["segments"]
+        ]
+        deleted = {name: np.unique(np.asarray(rows, dtype=np.int64)) for name, rows in manifest["deleted"].items()}
+        self._state = (segments, deleted)
+        self._next_segment = manifest["next_segment"]
+        self._retired = manifest.get("retired", {})
+        self.dimension = manifest["dimension"]
+        self._manifest_key = key
+
+    def _save(self, segments: List[VectorSegment], deleted: Dict[str, np.ndarray]):
+        """Writes the manifest. Call with the collection lock held."""
+        self._retired = segment_files.collect(self.path, self._retired)
+        segment_files.write_json(self.manifest_path, {
+            "segments": [segment.name for segment in segments],
+            "deleted": {name: rows.tolist() for name, rows in deleted.items() if len(rows)},
+            "next_segment": self._next_segment,
+            "retired": self._retired,
+            "dimension": self.dimension
+        })
+        self._state = (segments, deleted)
+        self._manifest_key = segment_files.manifest_key(self.manifest_path)
+
+    @staticmethod
+    def _locations(segments: List[VectorSegment], deleted: Dict[str, np.ndarray], ids: Iterable[str]) -> Dict[str, Tuple[str, int]]:
+        """Where each of the given ids is stored, if it is live: id -> (segment name, row)."""
+        locations = {}
+        for segment in segments:
+            # Tombstoned rows are kept sorted, so liveness is a binary search
+            dead = deleted.get(segment.name)
+            for doc_id in ids:
+                row = segment.rows.get(doc_id)
+                if row is None:
+                    continue
+                if dead is not None and len(dead):
+                    position = np.searchsorted(dead, row)
+                    if position < len(dead) and dead[position] == row:
+                        continue
+                locations[doc_id] = (segment.name, row)
+        return locations
+
+    @staticmethod
+    def _tombstone(deleted: Dict[str, np.ndarray], removed: List[Tuple[str, int]]) -> Dict[str, np.ndarray]:
+        by_segment: Dict[str, List[int]] = {}
+        for name, row in removed:
+            by_segment.setdefault(name, []).append(row)
+        updated = dict(deleted)
+        for name, rows in by_segment.items():
+            updated[name] = np.union1d(updated.get(name, np.empty(0, dtype=np.int64)), rows).astype(np.int64)
+        return updated
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: Optional[List[dict]] = None):
+        """Adds chunks; ids that already exist are overwritten (the old rows are tombstoned)."""
+        if not ids:
+            return
+        vectors = normalize(embeddings)
+        metadatas = metadatas or [{} for _ in ids]
+        with self._write_lock, segment_files.collection_lock(self.path):
+            self._load()
+            if self.dimension is None:
+                self.dimension = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match collection "
+                    f"{self.collection_name} ({self.dimension})"
+                )
+            segments, deleted = self._state
+            locations = self._locations(segments, deleted, ids)
+            deleted = self._tombstone(deleted, list(locations.values()))
+
+            name = f"segment-{self._next_segment:06d}"
+            self._next_segment += 1
+            VectorSegment.write(os.path.join(self.path, name), ids, vectors, documents, metadatas)
+            segments = list(segments) + [VectorSegment(os.path.join(self.path, name))]
+
+            # Merge everything once most stored rows are tombstones, else merge by tier
+            dead = sum(len(rows) for rows in deleted.values())
+            if dead > sum(len(segment.ids) for segment in segments) / 2:
+                segments, deleted = self._merge(segments, list(range(len(segments))), deleted)
+            while True:
+                positions = merge_candidates(
+                    [len(segment.ids) for segment in segments], VECTOR_MERGE_FACTOR, VECTOR_MERGE_FLOOR
+                )
+                if not positions:
+                    break
+                segments, deleted = self._merge(segments, positions, deleted)
+            self._save(segments, deleted)
+
+    def delete(self, ids: List[str]) -> int:
+        if not self.exists():
+            return 0
+        with self._write_lock, segment_files.collection_lock(self.path):
+            self._load()
+            segments, deleted = self._state
+            removed = list(self._locations(segments, deleted, set(ids)).values())
+            if removed:
+                self._save(segments, self._tombstone(deleted, removed))
+            return len(removed)
+
+    def _merge(self, segments: List[VectorSegment], positions: List[int], deleted: Dict[str, np.ndarray]):
+        """
+        Rewrites the live rows of the segments at positions into one segment, which takes
+        the place of the first of them. Returns the new segment list and remaining tombstones.
+        """
+        merging = [segments[position] for position in positions]
+        ids, vectors, documents, metadatas = [], [], [], []
+        for segment in merging:
+            live = np.setdiff1d(np.arange(len(segment.ids)), deleted.get(segment.name, []))
+            vectors.append(np.asarray(segment.embeddings[live]))
+            for row, stored in zip(live, segment.read_documents(live)):
+                ids.append(segment.ids[row])
+                documents.append(stored["content"])
+                metadatas.append(stored["metadata"])
+
+        name = f"segment-{self._next_segment:06d}"
+        self._next_segment += 1
+        VectorSegment.write(os.path.join(self.path, name), ids, np.concatenate(vectors), documents, metadatas)
+        merged = VectorSegment(os.path.join(self.path, name))
+        logger.info(f"Merged {len(merging)} vector segments of {self.collection_name} ({len(ids)} chunks)")
+        merged_names = {segment.name for segment in merging}
+        # Other workers may still be searching them; deleted by a later write
+        self._retired = segment_files.retire(self._retired, merged_names)
+        kept = [segment for position, segment in enumerate(segments) if position not in positions]
+        kept.insert(positions[0], merged)
+        return kept, {name: rows for name, rows in deleted.items() if name not in merged_names}
+
+    def search(self, query_embeddings, n_results: int, where: Optional[dict] = None) -> List[List[dict]]:
+        """
+        Exact cosine top-n for every query at once: one matrix product per block of rows,
+        argpartition for the block's best candidates, and a final sort per query.
+        """
+        self._refresh()
+        segments, deleted = self._state
+        queries = normalize(query_embeddings)
+        if not segments or n_results <= 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self.dimension:
+            raise ValueError(
+                f"Query embedding dimension {queries.shape[1]} does not match collection "
+                f"{self.collection_name} ({self.dimension})"
+            )
+
+        # Per query: candidate (scores, segment index, rows) arrays from every block
+        candidates: List[List[Tuple[np.ndarray, int, np.ndarray]]] = [[] for _ in range(len(queries))]
+        for segment_index, segment in enumerate(segments):
+            excluded = np.zeros(len(segment.ids), dtype=bool)
+            excluded[deleted.get(segment.name, np.empty(0, dtype=np.int64))] = True
+            if where:
+                excluded |= ~segment.filter_mask(where)
+
+            for start in range(0, len(segment.ids), VECTOR_SEARCH_BLOCK_ROWS):
+                stop = min(start + VECTOR_SEARCH_BLOCK_ROWS, len(segment.ids))
+                scores = queries @ segment.embeddings[start:stop].T # (queries, rows)
+                scores[:, excluded[start:stop]] = -np.inf
+                k = min(n_results, stop - start)
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                top_scores = np.take_along_axis(scores, top, axis=1)
+                for query_index in range(len(queries)):
+                    candidates[query_index].append((top_scores[query_index], segment_index, top[query_index] + start))
+
+        # Best n per query, skipping excluded rows
+        selected = []
+        for query_candidates in candidates:
+            scores = np.concatenate([scores for scores, _, _ in query_candidates])
+            segment_indexes = np.concatenate([np.full(len(rows), index) for _, index, rows in query_candidates])
+            rows = np.concatenate([rows for _, _, rows in query_candidates])
+            order = np.argsort(-scores, kind="stable")[:n_results]
+            order = order[np.isfinite(scores[order])]
+            selected.append([(int(segment_indexes[i]), int(rows[i]), float(scores[i])) for i in order])
+
+        # Chunk text is read once per segment for the whole batch, in file order
+        wanted: Dict[int, set] = {}
+        for matches in selected:
+            for segment_index, row, _ in matches:
+                wanted.setdefault(segment_index, set()).add(row)
+        stored: Dict[Tuple[int, int], dict] = {}
+        for segment_index, rows in wanted.items():
+            ordered_rows = sorted(rows)
+            for row, document in zip(ordered_rows, segments[segment_index].read_documents(ordered_rows)):
+                stored[(segment_index, row)] = document
+
+        return [
+            [
+                {
+                    "id": segments[segment_index].ids[row],
+                    "content": stored[(segment_index, row)]["content"],
+                    "metadata": stored[(segment_index, row)]["metadata"],
+                    # Cosine distance, 0 for identical directions
+                    "distance": 1.0 - score
+                }
+                for segment_index, row, score in matches
+            ]
+            for matches in selected
+        ]
+
+    def get_all(self) -> Dict[str, list]:
+        """Every live chunk (ids, documents, metadatas), e.g. to rebuild the lexical index."""
+        self._refresh()
+        segments, deleted = self._state
+        stored = {"ids": [], "documents": [], "metadatas": []}
+        for segment in segments:
+            live = np.setdiff1d(np.arange(len(segment.ids)), deleted.get(segment.name, []))
+            for row, document in zip(live, segment.read_documents(live)):
+                stored["ids"].append(segment.ids[row])
+                stored["documents"].append(document["content"])
+                stored["metadatas"].append(document["metadata"])
+        return stored
+
+class NumpyVectorBackend:
+    """
+    VectorService backend over NumpyCollection. Text is embedded by the shared embedding
+    service (micro-batched and cached); pass embed to use another function.
+    """
+    name = "numpy"
+
+    def __init__(self, embed: Optional[Callable[[List[str]], Any]] = None):
+        self._embed = embed
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if self._embed is None:
+            from app.services.embedding_service import embedding_service
+            self._embed = embedding_service.embed
+        return normalize(self._embed(list(texts)))
+
+    def warm_up(self):
+        """Loads the embedding model so the first query does not pay for it."""
+        self.embed(["warm up"])
+
+    def collection(self, collection_name: str) -> NumpyCollection:
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            with self._lock:
+                collection = self._collections.setdefault(collection_name, NumpyCollection(collection_name))
+        return collection
+
+    def upsert(self, collection_name: str, ids: List[str], documents: List[str], metadatas: Optional[List[dict]] = None):
+        self.collection(collection_name).upsert(ids, self.embed(documents), documents, metadatas)
+
+    def query(self, collection_name: str, query_texts: List[str], n_results: int, where: Optional[dict] = None) -> List[List[dict]]:
+        collection = self.collection(collection_name)
+        if not collection.exists():
+            return [[] for _ in query_texts]
+        return collection.search(self.embed(query_texts), n_results, where)
+
+    def delete(self, collection_name: str, ids: List[str]):
+        self.collection(collection_name).delete(ids)
+
+    def get_all(self, collection_name: str) -> Dict[str, list]:
+        return self.collection(collection_name).get_all()
+
+    def list_collections(self) -> List[str]:
+        if not os.path.isdir(VECTOR_INDEX_DIR):
+            return []
+        # Directory names are the sanitised collection names
+        return sorted(
+            name for name in os.listdir(VECTOR_INDEX_DIR)
+            if os.path.exists(os.path.join(VECTOR_INDEX_DIR, name, "manifest.json"))
+        )
+
+    def forget(self, collection_name: str):
+        with self._lock:
+            self._collections.pop(collection_name, None)
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.database import SavedWorkflow
+from app.models.schemas import WorkflowGraph
+from app.services.workflow_engine import WorkflowExecutor
+from app.services import telemetry
+import datetime
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+
+class ExecutionPlanCache:
+    """
+    In-process LRU cache of compiled WorkflowExecutor plans for saved workflows.
+
+    Entries are keyed by (workflow id, updated_at), so an edit saved by any worker
+    produces a new key and a stale plan can never be served. The save route also
+    invalidates explicitly to free the old entry right away.
+    """
+    def __init__(self, max_size: int = PLAN_CACHE_SIZE):
+        self.max_size = max_size
+        self._plans: "OrderedDict[Tuple[str, Optional[datetime.datetime]], WorkflowExecutor]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, workflow_id: str, updated_at: Optional[datetime.datetime]) -> Optional[WorkflowExecutor]:
+        with self._lock:
+            plan = self._plans.get((workflow_id, updated_at))
+            if plan is None:
+                self.misses += 1
+                telemetry.record_cache("plan", False)
+                return None
+            self._plans.move_to_end((workflow_id, updated_at))
+            self.hits += 1
+            telemetry.record_cache("plan", True)
+            return plan
+
+    def put(self, workflow_id: str, updated_at: Optional[datetime.datetime], plan: WorkflowExecutor):
+        with self._lock:
+            # Only the latest version of a workflow is worth keeping
+            for key in [k for k in self._plans if k[0] == workflow_id]:
+                del self._plans[key]
+            self._plans[(workflow_id, updated_at)] = plan
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+    def invalidate(self, workflow_id: str):
+        with self._lock:
+            for key in [k for k in self._plans if k[0] == workflow_id]:
+                del self._plans[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._plans), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+# Shared by all requests handled by this worker process
+plan_cache = ExecutionPlanCache()
+
+async def resolve_saved_workflow(db: AsyncSession, workflow_id: str) -> Optional[WorkflowExecutor]:
+    """
+    Returns the compiled plan for a saved workflow, or None if it does not exist.
+    Only the updated_at column is read on a cache hit; the graph JSON is loaded,
+    validated and compiled only when the plan is missing or out of date.
+    """
+    result = await db.execute(select(SavedWorkflow.updated_at).where(SavedWorkflow.id == workflow_id))
+    version = result.first()
+    if version is None:
+        return None
+
+    plan = plan_cache.get(workflow_id, version.updated_at)
+    if plan is not None:
+        return plan
+
+    result = await db.execute(select(SavedWorkflow).where(SavedWorkflow.id == workflow_id))
+    workflow = result.scalar_one_or_none()
+    if workflow is None:
+        return None
+
+    logger.info(f"Compiling execution plan for workflow {workflow_id}")
+    plan = WorkflowExecutor(WorkflowGraph(**workflow.graph_data))
+    plan_cache.put(workflow_id, workflow.updated_at, plan)
+    return plan
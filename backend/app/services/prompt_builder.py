@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+from app.models.schemas import ChatMessage
+from app.services.ingestion_service import TOKEN_PATTERN
+from app.services.llm_provider import build_prompt
+import hashlib
+import math
+import os
+import re
+import threading
+
+# Token budget for the whole prompt, per model,
+# e.g. PROMPT_TOKEN_BUDGETS="gemini-2.0-flash=8000,gemini-1.5-pro=16000"
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_TOKEN_BUDGETS: Dict[str, int] = {}
+for item in os.getenv("PROMPT_TOKEN_BUDGETS", "").split(","):
+    if "=" in item:
+        model_name, budget = item.split("=", 1)
+        PROMPT_TOKEN_BUDGETS[model_name.strip()] = int(budget)
+
+HISTORY_WINDOW_MESSAGES = int(os.getenv("HISTORY_WINDOW_MESSAGES", "6")) # recent turns kept verbatim
+HISTORY_TOKEN_SHARE = float(os.getenv("HISTORY_TOKEN_SHARE", "0.25")) # share of the budget for history
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300")) # cap for the older-turns summary
+SUMMARY_LINE_TOKENS = 40 # each older turn is reduced to its opening words
+MIN_CHUNK_TOKENS = 32 # a truncated chunk shorter than this is not worth sending
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "4096"))
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+# Tokens taken by the template itself, so the budget covers the complete prompt
+TEMPLATE_TOKENS = len(TOKEN_PATTERN.findall(build_prompt("", "", "")))
+
+def count_tokens(text: str) -> int:
+    """Same word/punctuation approximation used when chunking documents."""
+    return len(TOKEN_PATTERN.findall(text or ""))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text after max_tokens tokens, keeping the original formatting."""
+    if max_tokens <= 0:
+        return ""
+    for index, match in enumerate(TOKEN_PATTERN.finditer(text)):
+        if index == max_tokens - 1:
+            return text[:match.end()]
+    return text
+
+def token_budget(model: str) -> int:
+    return PROMPT_TOKEN_BUDGETS.get(model, PROMPT_TOKEN_BUDGET)
+
+class HistorySummarizer:
+    """
+    Condenses turns that fall out of the history window into one short line each
+    (the first sentence, capped at SUMMARY_LINE_TOKENS). Lines are cached per message,
+    so as a conversation grows only the turn that just left the window is processed.
+    """
+    def __init__(self, max_entries: int = SUMMARY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lines: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _line(self, message: ChatMessage) -> str:
+        key = hashlib.sha256(f"{message.role}\x00{message.content}".encode("utf-8")).hexdigest()
+        with self._lock:
+            line = self._lines.get(key)
+            if line is not None:
+                self._lines.move_to_end(key)
+                return line
+
+        first_sentence = SENTENCE_END.split(message.content.strip(), 1)[0]
+        short = truncate_tokens(first_sentence, SUMMARY_LINE_TOKENS)
+        line = f"- {message.role}: {short}{'' if short == message.content.strip() else ' ...'}"
+        with self._lock:
+            self._lines[key] = line
+            while len(self._lines) > self.max_entries:
+                self._lines.popitem(last=False)
+        return line
+
+    def summarize(self, messages: List[ChatMessage], max_tokens: int) -> str:
+        """Summary of the given (older) turns, newest kept first when the cap is reached."""
+        lines = []
+        used = 0
+        for message in reversed(messages):
+            line = self._line(message)
+            cost = count_tokens(line)
+            if used + cost > max_tokens:
+                break
+            lines.append(line)
+            used += cost
+        return "\n".join(reversed(lines))
+
+history_summarizer = HistorySummarizer()
+
+def _format_turn(message: ChatMessage) -> str:
+    return f"{message.role}: {message.content}"
+
+def build_history(history: List[ChatMessage], max_tokens: int) -> str:
+    """
+    Recent turns verbatim (newest first until the window or budget is used up),
+    preceded by a summary of everything older.
+    """
+    if not history or max_tokens <= 0:
+        return ""
+
+    # 1. Sliding window of recent turns
+    recent = []
+    used = 0
+    for message in reversed(history[-HISTORY_WINDOW_MESSAGES:]):
+        cost = count_tokens(_format_turn(message))
+        if used + cost > max_tokens:
+            break
+        recent.append(_format_turn(message))
+        used += cost
+    recent.reverse()
+
+    # 2. Everything that did not fit is summarised into what is left
+    older = history[:len(history) - len(recent)]
+    summary = history_summarizer.summarize(older, min(HISTORY_SUMMARY_TOKENS, max_tokens - used)) if older else ""
+
+    parts = []
+    if summary:
+        parts.append(f"Earlier in the conversation:\n{summary}")
+    parts.extend(recent)
+    return "\n".join(parts)
+
+def _query_terms(text: str) -> set:
+    return {token.lower() for token in TOKEN_PATTERN.findall(text) if len(token) > 2}
+
+def rank_chunks(query: str, chunks: List[str]) -> List[str]:
+    """
+    Orders context chunks by how many query terms they contain, normalised by length.
+    Ties keep retrieval order, which already reflects vector similarity.
+    """
+    terms = _query_terms(query)
+    if not terms:
+        return list(chunks)
+
+    def score(chunk: str) -> float:
+        tokens = [token.lower() for token in TOKEN_PATTERN.findall(chunk)]
+        if not tokens:
+            return 0.0
+        return len(terms.intersection(tokens)) / math.sqrt(len(tokens))
+
+    return sorted(chunks, key=score, reverse=True)
+
+def fit_chunks(chunks: List[str], max_tokens: int) -> Tuple[List[str], int]:
+    """Keeps whole chunks while they fit; the next one is truncated if enough room is left."""
+    kept = []
+    used = 0
+    for chunk in chunks:
+        cost = count_tokens(chunk)
+        if used + cost <= max_tokens:
+            kept.append(chunk)
+            used += cost
+            continue
+        if max_tokens - used >= MIN_CHUNK_TOKENS:
+            # The trailing " ..." counts as three tokens
+            kept.append(truncate_tokens(chunk, max_tokens - used - 3) + " ...")
+        break
+    return kept, len(chunks) - len(kept)
+
+def assemble_prompt(
+    model: str,
+    query: str,
+    history: List[ChatMessage],
+    chunks: List[str],
+    ranked_chunks: Sequence[str] = ()
+) -> Dict[str, object]:
+    """
+    Splits the model's token budget between conversation history and retrieved context.
+    History gets at most HISTORY_TOKEN_SHARE of what the template and question leave over;
+    context gets the rest (including whatever history did not use), best chunks first.
+    ranked_chunks (e.g. from a rerank node) keep their order and go before the other chunks.
+    """
+    available = token_budget(model) - TEMPLATE_TOKENS - count_tokens(query)
+
+    # 1. Conversation history
+    history_text = build_history(history, int(available * HISTORY_TOKEN_SHARE))
+    history_tokens = count_tokens(history_text)
+
+    # 2. Retrieved context
+    kept, dropped = fit_chunks(list(ranked_chunks) + rank_chunks(query, chunks), available - history_tokens)
+    context = "\n\n".join(kept)
+
+    return {
+        "context": context,
+        "history": history_text,
+        "prompt_tokens": TEMPLATE_TOKENS + count_tokens(query) + history_tokens + count_tokens(context),
+        "chunks_used": len(kept),
+        "chunks_dropped": dropped
+    }
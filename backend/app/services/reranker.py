@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.services.lexical_index import tokenize
+from app.services.response_cache import normalize_query
+import hashlib
+import os
+import threading
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000")) # (query, chunk) entries
+# Length (in tokens) at which the lexical scorer stops favouring shorter chunks;
+# matches the ingestion chunk size
+RERANK_REFERENCE_LENGTH = float(os.getenv("CHUNK_TOKENS", "200"))
+RERANK_K1 = 1.2
+RERANK_B = 0.5
+
+def chunk_key(chunk: str) -> str:
+    """Feature cache key for a chunk's text. Not the stored chunk id (vector_service.chunk_id), which also hashes the source."""
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+class FeatureCache:
+    """
+    LRU of per-(query, chunk) features. A follow-up turn or a retry that retrieves an
+    overlapping candidate set only scores the chunks it has not seen for that query.
+    """
+    def __init__(self, max_entries: int = RERANK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, scorer: str, query: str, keys: List[str]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            found = []
+            for key in keys:
+                features = self._entries.get((scorer, query, key))
+                if features is not None:
+                    self._entries.move_to_end((scorer, query, key))
+                found.append(features)
+            return found
+
+    def put_many(self, scorer: str, query: str, keys: List[str], rows: List[np.ndarray]):
+        with self._lock:
+            for key, row in zip(keys, rows):
+                self._entries[(scorer, query, key)] = row
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+feature_cache = FeatureCache()
+
+class LexicalOverlapScorer:
+    """
+    Query-term overlap scored like BM25 over the candidate set. Per chunk, only the
+    frequencies of the query's terms and the chunk length are extracted (and cached);
+    document frequencies, saturation and length normalisation are then computed for all
+    candidates at once as a (candidates x query terms) matrix.
+    """
+    name = "lexical"
+
+    def features(self, query: str, chunks: List[str]) -> List[np.ndarray]:
+        terms = self._query_terms(query)
+        position = {term: i for i, term in enumerate(terms)}
+        rows = []
+        for chunk in chunks:
+            tokens = tokenize(chunk)
+            indices = [position[token] for token in tokens if token in position]
+            row = np.zeros(len(terms) + 1, dtype=np.float32)
+            row[:len(terms)] = np.bincount(np.asarray(indices, dtype=np.int64), minlength=len(terms))
+            row[-1] = len(tokens) # last column: chunk length
+            rows.append(row)
+        return rows
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        frequencies, lengths = features[:, :-1], features[:, -1:]
+        if frequencies.shape[1] == 0:
+            return np.zeros(len(features), dtype=np.float32)
+        candidates = len(features)
+        document_frequency = (frequencies > 0).sum(axis=0)
+        # Terms found in every candidate still count a little, so full coverage wins ties
+        idf = np.log(1 + (candidates - document_frequency + 0.5) / (document_frequency + 0.5))
+        saturated = frequencies * (RERANK_K1 + 1) / (
+            frequencies + RERANK_K1 * (1 - RERANK_B + RERANK_B * lengths / RERANK_REFERENCE_LENGTH)
+        )
+        coverage = (frequencies > 0).mean(axis=1)
+        return (saturated @ idf) * (0.5 + 0.5 * coverage)
+
+    @staticmethod
+    def _query_terms(query: str) -> List[str]:
+        # Very short words ("a", "of") carry no signal; keep the query's order for stable columns
+        return list(dict.fromkeys(term for term in tokenize(query) if len(term) > 2))
+
+class CrossEncoderScorer:
+    """
+    Local cross-encoder (sentence-transformers) that reads query and chunk together.
+    sentence-transformers is an optional dependency; without it, reranking falls back
+    to the lexical scorer.
+    """
+    name = "model"
+
+    def __init__(self, model_name: str = RERANK_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._available: Optional[bool] = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        if self._available is None:
+            try:
+                import sentence_transformers  # noqa: F401
+                self._available = True
+            except ImportError:
+                self._available = False
+        return self._available
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                logger.info(f"Loading rerank model: {self.model_name}")
+                self._model = CrossEncoder(self.model_name)
+            return self._model
+
+    def features(self, query: str, chunks: List[str]) -> List[np.ndarray]:
+        scores = self._get_model().predict([(query, chunk) for chunk in chunks], batch_size=RERANK_BATCH_SIZE)
+        return [np.asarray([value], dtype=np.float32) for value in scores]
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        return features[:, 0]
+
+lexical_scorer = LexicalOverlapScorer()
+model_scorer = CrossEncoderScorer()
+_warned_missing_model = False
+
+def get_scorer(name: str):
+    global _warned_missing_model
+    if name == "model":
+        if model_scorer.available():
+            return model_scorer
+        if not _warned_missing_model:
+            logger.warning("sentence-transformers is not installed; reranking with the lexical scorer instead")
+            _warned_missing_model = True
+    return lexical_scorer
+
+def rerank(query: str, chunks: List[str], top_n: int, scorer_name: str = "lexical", min_score: float = 0.0) -> Dict[str, object]:
+    """
+    Scores every candidate in one batch (features of chunks already seen for this query come
+    from the cache) and returns the best top_n, best first, plus their scores.
+    Blocking and CPU-bound: run it on the node CPU pool.
+    """
+    # 1. Drop duplicates (the same chunk can come from several knowledge branches)
+    chunks = list(dict.fromkeys(chunks))
+    if not chunks:
+        return {"chunks": [], "scores": [], "cached": 0}
+
+    scorer = get_scorer(scorer_name)
+    cache_query = normalize_query(query)
+    keys = [chunk_key(chunk) for chunk in chunks]
+
+    # 2. Features for unseen chunks, computed as one batch
+    rows = feature_cache.get_many(scorer.name, cache_query, keys)
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if missing:
+        computed = scorer.features(query, [chunks[i] for i in missing])
+        feature_cache.put_many(scorer.name, cache_query, [keys[i] for i in missing], computed)
+        for i, row in zip(missing, computed):
+            rows[i] = row
+
+    # 3. Score all candidates together and keep the best
+    scores = scorer.score(np.vstack(rows))
+    # Stable sort keeps retrieval order for equal scores
+    order = np.argsort(-scores, kind="stable")
+    kept = [int(i) for i in order if scores[i] >= min_score][:top_n]
+    return {
+        "chunks": [chunks[i] for i in kept],
+        "scores": [round(float(scores[i]), 4) for i in kept],
+        "cached": len(chunks) - len(missing)
+    }
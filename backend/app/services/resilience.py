@@ -0,0 +1,251 @@
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+from prometheus_client import Counter
+import asyncio
+import httpx
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Total time one chat request may spend; every external call gets what is left of it
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# HTTP-style status codes worth retrying (rate limits and transient server errors)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+EXTERNAL_CALLS = Counter(
+    "flowmind_external_calls_total",
+    "Attempts made to external dependencies, by outcome",
+    ["dependency", "outcome"] # ok | retried | timeout | error | circuit_open | hedged
+)
+
+class ExternalCallError(Exception):
+    """
+    A call to an external dependency failed for good (after retries, on deadline, with an
+    error that is not worth retrying, or because its circuit is open). kind is one of:
+    timeout, unavailable, error, misconfigured. The original error, if any, is __cause__.
+    """
+    def __init__(self, dependency: str, kind: str, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.dependency = dependency
+        self.kind = kind
+        self.retryable = retryable
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"dependency": self.dependency, "kind": self.kind, "message": str(self)}
+
+# Absolute deadline (time.monotonic) of the request the current task is working for
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+def start_deadline(budget_seconds: float = REQUEST_TIMEOUT_SECONDS):
+    """Sets the request-level deadline for the current task and the tasks it creates."""
+    current_deadline.set(time.monotonic() + budget_seconds)
+
+def remaining_time() -> Optional[float]:
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection problems and 408/429/5xx responses; client errors are not retried."""
+    # httpx.TransportError covers connect/read/write failures and httpx's own timeouts
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    # Chroma's HttpClient uses requests, whose connection errors and timeouts are not builtin ones
+    if type(error).__module__.startswith("requests") and type(error).__name__ in ("ConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout"):
+        return True
+    # httpx.HTTPStatusError carries the response; google.api_core errors carry the status as .code
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "code", None)
+    return isinstance(status, int) and status in RETRYABLE_STATUS_CODES
+
+def describe_error(error: BaseException) -> str:
+    """Short message for an attempt's failure. HTTP errors keep only the status, because their
+    text includes the request URL (and with it any API key passed as a query parameter)."""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return f"returned HTTP {status}"
+    return str(error) or type(error).__name__
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and then rejects calls immediately
+    for reset_seconds. After that a single trial call is let through (half-open): success
+    closes the circuit, failure opens it again.
+    """
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_progress:
+            self._trial_in_progress = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+
+    def release_trial(self):
+        """The half-open trial ended without an outcome (e.g. it was cancelled); allow another."""
+        self._trial_in_progress = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_progress or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_progress:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+        self._trial_in_progress = False
+
+class CallPolicy:
+    """Timeout per attempt, retry budget with jittered exponential backoff, and optional hedging."""
+    def __init__(
+        self,
+        timeout_seconds: float,
+        retries: int = 2,
+        backoff_seconds: float = 0.2,
+        max_backoff_seconds: float = 2.0,
+        hedge_after_seconds: Optional[float] = None
+    ):
+        self.timeout_seconds = timeout_seconds
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+# Per-dependency policies; hedging is off unless a delay is configured
+POLICIES: Dict[str, CallPolicy] = {
+    "gemini": CallPolicy(
+        timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+        retries=int(os.getenv("LLM_RETRIES", "2")),
+        hedge_after_seconds=_env_float("LLM_HEDGE_AFTER_SECONDS")
+    ),
+    "serpapi": CallPolicy(
+        timeout_seconds=float(os.getenv("SEARCH_TIMEOUT_SECONDS", "10")),
+        retries=int(os.getenv("SEARCH_RETRIES", "2")),
+        hedge_after_seconds=_env_float("SEARCH_HEDGE_AFTER_SECONDS")
+    ),
+    "chroma": CallPolicy(
+        timeout_seconds=float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "10")),
+        retries=int(os.getenv("RETRIEVAL_RETRIES", "1"))
+    ),
+}
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(dependency: str) -> CircuitBreaker:
+    if dependency not in _breakers:
+        _breakers[dependency] = CircuitBreaker(dependency)
+    return _breakers[dependency]
+
+async def _attempt(func: Callable[[], Awaitable[Any]], timeout: float, hedge_after: Optional[float], dependency: str):
+    """One logical attempt; with hedging, a second identical call races the first if it is slow."""
+    first = asyncio.ensure_future(func())
+    if hedge_after is None or hedge_after >= timeout:
+        return await asyncio.wait_for(first, timeout)
+
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if not done:
+            EXTERNAL_CALLS.labels(dependency, "hedged").inc()
+            pending.add(asyncio.ensure_future(func()))
+        give_up_at = time.monotonic() + timeout - hedge_after
+        last_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, give_up_at - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise asyncio.TimeoutError()
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def call(dependency: str, func: Callable[[], Awaitable[Any]], policy: Optional[CallPolicy] = None) -> Any:
+    """
+    Runs func (a zero-argument coroutine factory) against a dependency with its policy:
+    each attempt is capped by the policy timeout and the request deadline, retryable errors
+    are retried with full-jitter backoff, and an open circuit fails fast.
+    Raises ExternalCallError whenever the call cannot succeed, so callers can degrade on it;
+    errors that are not worth retrying (a 400, a bad embedding dimension) have kind "error".
+    """
+    policy = policy or POLICIES[dependency]
+    breaker = get_breaker(dependency)
+
+    for attempt in range(policy.retries + 1):
+        # Whether this attempt is the half-open trial call (no await between here and allow())
+        trial = breaker.state == "half_open"
+        if not breaker.allow():
+            EXTERNAL_CALLS.labels(dependency, "circuit_open").inc()
+            raise ExternalCallError(dependency, "unavailable", f"{dependency} is unavailable (circuit open)")
+
+        remaining = remaining_time()
+        timeout = policy.timeout_seconds if remaining is None else min(policy.timeout_seconds, remaining)
+        if timeout <= 0:
+            EXTERNAL_CALLS.labels(dependency, "timeout").inc()
+            raise ExternalCallError(dependency, "timeout", f"{dependency} call skipped: request deadline exceeded")
+
+        try:
+            result = await _attempt(func, timeout, policy.hedge_after_seconds, dependency)
+            breaker.record_success()
+            EXTERNAL_CALLS.labels(dependency, "ok").inc()
+            return result
+        except asyncio.CancelledError:
+            # A disconnected client or a failed sibling node; says nothing about the dependency
+            if trial:
+                breaker.release_trial()
+            raise
+        except Exception as error:
+            if not is_retryable(error):
+                # The dependency answered (e.g. 400/404); that says nothing about its health.
+                # A half-open trial stays inconclusive, so a bad request cannot close a circuit
+                # that opened on a real outage
+                if trial:
+                    breaker.release_trial()
+                else:
+                    breaker.record_success()
+                EXTERNAL_CALLS.labels(dependency, "error").inc()
+                raise ExternalCallError(dependency, "error", f"{dependency} {describe_error(error)}") from error
+            breaker.record_failure()
+            timed_out = isinstance(error, asyncio.TimeoutError)
+            EXTERNAL_CALLS.labels(dependency, "timeout" if timed_out else "retried").inc()
+            logger.warning(f"{dependency} attempt {attempt + 1} failed: {describe_error(error)}")
+
+            backoff = random.uniform(0, min(policy.max_backoff_seconds, policy.backoff_seconds * 2 ** attempt))
+            remaining = remaining_time()
+            if attempt == policy.retries or (remaining is not None and remaining <= backoff):
+                kind = "timeout" if timed_out else "unavailable"
+                detail = f"timed out after {timeout:.1f}s" if timed_out else describe_error(error)
+                raise ExternalCallError(dependency, kind, f"{dependency} {detail}", retryable=True) from error
+            await asyncio.sleep(backoff)
@@ -0,0 +1,262 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import datetime
+import hashlib
+import os
+import threading
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Configuration (all optional). The semantic tier is off unless a threshold is set.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory") # "memory" or "sql"
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = os.getenv("RESPONSE_CACHE_SIMILARITY_THRESHOLD") # e.g. "0.95"
+# The sql store is trimmed back to max_entries at most this often, not on every insert
+RESPONSE_CACHE_TRIM_SECONDS = float(os.getenv("RESPONSE_CACHE_TRIM_SECONDS", "60"))
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace differences should not defeat the exact-match tier."""
+    return " ".join(query.lower().split())
+
+def fingerprint(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class MemoryResponseStore:
+    """Process-local LRU store. Each entry: key -> (scope, embedding, response, created_at)."""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, Optional[np.ndarray], str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[2], entry[3]
+
+    def candidates(self, scope: str) -> List[Tuple[str, np.ndarray]]:
+        with self._lock:
+            return [(key, entry[1]) for key, entry in self._entries.items() if entry[0] == scope and entry[1] is not None]
+
+    def put(self, key: str, scope: str, query: str, embedding: Optional[np.ndarray], response: str):
+        with self._lock:
+            self._entries[key] = (scope, embedding, response, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class SqlResponseStore:
+    """
+    Stores entries in the application database (response_cache table) so the cache
+    is shared by all workers and survives restarts. Eviction drops the least recently used
+    rows, every RESPONSE_CACHE_TRIM_SECONDS.
+    """
+    def __init__(self, max_entries: int, trim_seconds: float = RESPONSE_CACHE_TRIM_SECONDS):
+        self.max_entries = max_entries
+        self.trim_seconds = trim_seconds
+        self._last_trim = 0.0
+
+    def _session(self):
+        from app.models.database import SessionLocal
+        return SessionLocal()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        from app.models.database import CachedResponse
+        db = self._session()
+        try:
+            row = db.query(CachedResponse).filter(CachedResponse.key == key).first()
+            if row is None:
+                return None
+            row.last_used_at = datetime.datetime.utcnow()
+            db.commit()
+            return row.response, row.created_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+        finally:
+            db.close()
+
+    def candidates(self, scope: str) -> List[Tuple[str, np.ndarray]]:
+        from app.models.database import CachedResponse
+        db = self._session()
+        try:
+            rows = (
+                db.query(CachedResponse.key, CachedResponse.embedding)
+                .filter(CachedResponse.scope == scope, CachedResponse.embedding.isnot(None))
+                .all()
+            )
+            return [(row.key, np.asarray(row.embedding, dtype=np.float32)) for row in rows]
+        finally:
+            db.close()
+
+    def put(self, key: str, scope: str, query: str, embedding: Optional[np.ndarray], response: str):
+        from app.models.database import CachedResponse
+        db = self._session()
+        try:
+            now = datetime.datetime.utcnow()
+            db.merge(CachedResponse(
+                key=key,
+                scope=scope,
+                query=query,
+                embedding=embedding.tolist() if embedding is not None else None,
+                response=response,
+                created_at=now,
+                last_used_at=now
+            ))
+            db.commit()
+
+            # Counting the table on every insert is a full scan; trim periodically instead
+            if time.monotonic() - self._last_trim >= self.trim_seconds:
+                self._last_trim = time.monotonic()
+                cutoff = (
+                    db.query(CachedResponse.last_used_at)
+                    .order_by(CachedResponse.last_used_at.desc())
+                    .offset(self.max_entries - 1).limit(1).scalar()
+                )
+                if cutoff is not None:
+                    db.query(CachedResponse).filter(CachedResponse.last_used_at < cutoff).delete(synchronize_session=False)
+                    db.commit()
+        finally:
+            db.close()
+
+    def delete(self, key: str):
+        from app.models.database import CachedResponse
+        db = self._session()
+        try:
+            db.query(CachedResponse).filter(CachedResponse.key == key).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def size(self) -> int:
+        from app.models.database import CachedResponse
+        db = self._session()
+        try:
+            return db.query(CachedResponse).count()
+        finally:
+            db.close()
+
+def _default_embedder() -> Callable[[str], np.ndarray]:
+    """The shared embedding service: the knowledge base's model, micro-batched and cached."""
+    from app.services.embedding_service import embedding_service
+    return lambda text: embedding_service.embed([text])[0]
+
+class ResponseCache:
+    """
+    Cache in front of the LLM node.
+
+    Exact tier: key = sha256(provider, model, prompt-template hash, context fingerprint, normalised query).
+    Semantic tier (optional): among entries with the same provider/model/template/context "scope",
+    return the answer whose query embedding has cosine similarity >= threshold.
+    Entries expire after the TTL and the store is size-bounded with LRU eviction.
+
+    All methods are blocking (SQL access, embedding); call them via asyncio.to_thread.
+    """
+    def __init__(
+        self,
+        store=None,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        similarity_threshold: Optional[float] = None,
+        embedder: Optional[Callable[[str], np.ndarray]] = None
+    ):
+        self.store = store or MemoryResponseStore(RESPONSE_CACHE_MAX_ENTRIES)
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._embedder = embedder
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def scope_for(provider: str, model: str, template_hash: str, context: str) -> str:
+        return fingerprint(provider.lower(), model, template_hash, fingerprint(context or ""))
+
+    @staticmethod
+    def key_for(scope: str, query: str) -> str:
+        return fingerprint(scope, normalize_query(query))
+
+    def _embed(self, query: str) -> np.ndarray:
+        if self._embedder is None:
+            self._embedder = _default_embedder()
+        vector = np.asarray(self._embedder(normalize_query(query)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _fresh(self, key: str) -> Optional[str]:
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        response, created_at = entry
+        if time.time() - created_at > self.ttl_seconds:
+            self.store.delete(key)
+            return None
+        return response
+
+    def get(self, provider: str, model: str, template_hash: str, context: str, query: str) -> Optional[str]:
+        scope = self.scope_for(provider, model, template_hash, context)
+
+        # 1. Exact tier
+        response = self._fresh(self.key_for(scope, query))
+        if response is not None:
+            self.exact_hits += 1
+            return response
+
+        # 2. Semantic tier: one matrix-vector product over the scope's cached query embeddings
+        if self.similarity_threshold is not None:
+            candidates = self.store.candidates(scope)
+            if candidates:
+                keys = [key for key, _ in candidates]
+                matrix = np.stack([embedding for _, embedding in candidates])
+                scores = matrix @ self._embed(query)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    response = self._fresh(keys[best])
+                    if response is not None:
+                        self.semantic_hits += 1
+                        return response
+
+        self.misses += 1
+        return None
+
+    def put(self, provider: str, model: str, template_hash: str, context: str, query: str, response: str):
+        scope = self.scope_for(provider, model, template_hash, context)
+        embedding = self._embed(query) if self.similarity_threshold is not None else None
+        self.store.put(self.key_for(scope, query), scope, query, embedding, response)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": self.store.size(),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses
+        }
+
+def _build_default_cache() -> Optional[ResponseCache]:
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    store = (
+        SqlResponseStore(RESPONSE_CACHE_MAX_ENTRIES)
+        if RESPONSE_CACHE_BACKEND == "sql"
+        else MemoryResponseStore(RESPONSE_CACHE_MAX_ENTRIES)
+    )
+    threshold = float(RESPONSE_CACHE_SIMILARITY_THRESHOLD) if RESPONSE_CACHE_SIMILARITY_THRESHOLD else None
+    return ResponseCache(store=store, similarity_threshold=threshold)
+
+# Shared cache used by the workflow executor (None when disabled)
+response_cache = _build_default_cache()
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.services.response_cache import normalize_query
+from app.services import telemetry
+import os
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "4096"))
+# One small marker file per collection; shared by every worker on the host
+COLLECTION_VERSION_DIR = os.getenv("COLLECTION_VERSION_DIR", "./collection_versions")
+# Writes made through another host do not touch this host's markers; entries expire after
+# this long so such writes show up within a bounded time
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "300"))
+
+CollectionVersion = Tuple[int, int]
+
+class CollectionVersions:
+    """
+    Version of each collection's contents. Every write replaces the collection's marker file,
+    and the version is that file's (inode, mtime), so a write made by any worker process on
+    this host changes the version that every other worker reads on its next lookup.
+    """
+    def __init__(self, path: str = COLLECTION_VERSION_DIR):
+        self.path = path
+
+    def _marker(self, collection_name: str) -> str:
+        # Collection names are user supplied; keep them inside the version directory
+        return os.path.join(self.path, re.sub(r"[^\w.-]", "_", collection_name))
+
+    def get(self, collection_name: str) -> CollectionVersion:
+        try:
+            stat = os.stat(self._marker(collection_name))
+        except FileNotFoundError:
+            return (0, 0)
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def bump(self, collection_name: str):
+        os.makedirs(self.path, exist_ok=True)
+        marker = self._marker(collection_name)
+        # A fresh file (new inode) per write, so two writes in the same clock tick still differ
+        temp_path = f"{marker}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8"):
+            pass
+        os.replace(temp_path, marker)
+
+class RetrievalCache:
+    """
+    LRU cache of knowledge node retrievals, keyed by
+    (collection, collection version, normalised query, n_results).
+
+    add_documents and delete_documents bump the collection's version, so after a write made
+    on this host the old entries are never hit again. Writes made through other replicas
+    (sharing a Chroma server) are only picked up once entries expire after ttl_seconds.
+    A hit skips embedding the query, the vector search and the BM25 search.
+    """
+    def __init__(
+        self,
+        max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+        versions: Optional[CollectionVersions] = None,
+        ttl_seconds: float = RETRIEVAL_CACHE_TTL_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.versions = versions or CollectionVersions()
+        self.ttl_seconds = ttl_seconds
+        # key -> (expiry on time.monotonic, matches)
+        self._entries: "OrderedDict[Tuple[str, CollectionVersion, str, int], Tuple[float, List[dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, collection_name: str, query: str, n_results: int) -> Tuple[str, CollectionVersion, str, int]:
+        # The version is read before searching: a write that lands during the search
+        # bumps it again, so a result computed from old contents is never looked up
+        return (collection_name, self.versions.get(collection_name), normalize_query(query), n_results)
+
+    def get(self, key: Tuple[str, CollectionVersion, str, int]) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                telemetry.record_cache("retrieval", False)
+                return None
+            matches = entry[1]
+            self._entries.move_to_end(key)
+            self.hits += 1
+        telemetry.record_cache("retrieval", True)
+        # Callers get their own list; the match dicts are shared and treated as read-only
+        return list(matches)
+
+    def put(self, key: Tuple[str, CollectionVersion, str, int], matches: List[dict]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, list(matches))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection_name: str):
+        """Called after every write to a collection."""
+        self.versions.bump(collection_name)
+        # Entries of older versions can never be hit again; free them now
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == collection_name]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "max_size": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+# Shared by every knowledge node on this worker (None when disabled)
+retrieval_cache = RetrievalCache() if RETRIEVAL_CACHE_ENABLED else None
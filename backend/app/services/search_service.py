@@ -1,32 +1,230 @@
 import os
-import requests
-from typing import List, Dict, Any
+import httpx
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from app.services import resilience, telemetry
+from app.services.resilience import ExternalCallError
+from app.services.response_cache import normalize_query, fingerprint
+import asyncio
+import datetime
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+SERPAPI_URL = "https://serpapi.com/search.json"
+
+# Connection pool limits for outbound search traffic (shared by all requests on this worker)
+SEARCH_MAX_CONNECTIONS = int(os.getenv("SEARCH_MAX_CONNECTIONS", "20"))
+SEARCH_MAX_KEEPALIVE = int(os.getenv("SEARCH_MAX_KEEPALIVE", "10"))
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "10"))
+
+# Search result cache. The persistent tier (search_cache table) keeps results across restarts
+# and shares them between workers; it is off by default.
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "900"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+SEARCH_CACHE_PERSISTENT = os.getenv("SEARCH_CACHE_PERSISTENT", "false").lower() == "true"
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide async HTTP client, creating it on first use.
+    Reusing one client keeps TLS connections to SerpAPI alive between chats.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=SEARCH_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=SEARCH_MAX_CONNECTIONS,
+                max_keepalive_connections=SEARCH_MAX_KEEPALIVE
+            )
+        )
+    return _http_client
+
+async def close_http_client():
+    """Closes the shared HTTP client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+class SearchCache:
+    """
+    TTL + LRU cache in front of SerpAPI, keyed by normalised query and max_results.
+
+    Concurrent misses for the same key are coalesced (single flight): the first caller
+    starts the request and everyone else awaits the same task. The request runs as its
+    own task, so a caller that goes away (e.g. a closed stream) does not cancel it for the others.
+    Failed searches are never cached.
+    """
+    def __init__(
+        self,
+        ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        persistent: bool = SEARCH_CACHE_PERSISTENT
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict() # key -> (result, expires_at)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key_for(query: str, max_results: int) -> str:
+        return fingerprint(normalize_query(query), str(max_results))
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _put_memory(self, key: str, result: str, expires_at: float):
+        self._entries[key] = (result, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_persistent(self, key: str) -> Optional[Tuple[str, float]]:
+        from app.models.database import AsyncSessionLocal, CachedSearch
+        async with AsyncSessionLocal() as db:
+            row = await db.get(CachedSearch, key)
+            if row is None:
+                return None
+            expires_at = row.expires_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+            if expires_at < time.time():
+                await db.delete(row)
+                await db.commit()
+                return None
+            return row.result, expires_at
+
+    async def _put_persistent(self, key: str, query: str, result: str, expires_at: float):
+        from sqlalchemy import delete
+        from app.models.database import AsyncSessionLocal, CachedSearch
+        now = datetime.datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            await db.merge(CachedSearch(
+                key=key,
+                query=query,
+                result=result,
+                created_at=now,
+                expires_at=datetime.datetime.utcfromtimestamp(expires_at)
+            ))
+            # Expired rows are pruned on write, so the table stays bounded by traffic within one TTL
+            await db.execute(delete(CachedSearch).where(CachedSearch.expires_at < now))
+            await db.commit()
+
+    async def _load(self, key: str, query: str, fetch) -> str:
+        # 1. Persistent tier (warm after a restart or filled by another worker)
+        if self.persistent:
+            try:
+                stored = await self._get_persistent(key)
+                if stored is not None:
+                    self._put_memory(key, *stored)
+                    return stored[0]
+            except Exception as e:
+                logger.warning(f"Search cache read failed: {e}")
+
+        # 2. The actual search. Errors propagate to every waiter and are not cached.
+        result = await fetch()
+        expires_at = time.time() + self.ttl_seconds
+        self._put_memory(key, result, expires_at)
+        if self.persistent:
+            try:
+                await self._put_persistent(key, query, result, expires_at)
+            except Exception as e:
+                logger.warning(f"Search cache write failed: {e}")
+        return result
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        # Mark a failure as retrieved even if every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    async def get_or_fetch(self, query: str, max_results: int, fetch) -> str:
+        """Returns a cached result or awaits fetch() (shared with concurrent identical searches)."""
+        key = self.key_for(query, max_results)
+
+        result = self._get_memory(key)
+        if result is not None:
+            self.hits += 1
+            telemetry.record_cache("search", True)
+            return result
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            telemetry.record_cache("search", False)
+            task = asyncio.ensure_future(self._load(key, query, fetch))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda finished: self._finish(key, finished))
+        else:
+            self.coalesced += 1
+            telemetry.record_cache("search", True)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight)
+        }
+
+# Shared by every search node on this worker (None when disabled)
+search_cache = SearchCache() if SEARCH_CACHE_ENABLED else None
+
 class SearchService:
+    @staticmethod
+    async def _fetch(query: str, max_results: int, api_key: str) -> str:
+        """One SerpAPI request. httpx URL-encodes the params, so any query text is safe."""
+        response = await get_http_client().get(
+            SERPAPI_URL,
+            params={"q": query, "api_key": api_key}
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        results = data.get("organic_results", [])[:max_results]
+        formatted_results = []
+        for r in results:
+            formatted_results.append(f"Title: {r.get('title')}\nSnippet: {r.get('snippet')}\nSource: {r.get('link')}")
+
+        return "\n\n".join(formatted_results)
+
     @staticmethod
     async def search(query: str, max_results: int = 3) -> str:
+        """Formatted top results for the query. Raises ExternalCallError if SerpAPI cannot answer."""
         api_key = os.getenv("SERPAPI_KEY")
-        
+
         if not api_key:
             logger.warning("SERPAPI_KEY not found. Returning mock search results.")
             return f"Mock Search Result for '{query}': FlowMind is a visual AI workflow builder that uses nodes like User Query, LLM Engine, and Knowledge Base."
 
+        # Using SerpAPI as mentioned in README, with timeout, retries and circuit breaking
+        def fetch():
+            return resilience.call("serpapi", lambda: SearchService._fetch(query, max_results, api_key))
+
         try:
-            # Using SerpAPI as mentioned in README
-            url = f"https://serpapi.com/search.json?q={query}&api_key={api_key}"
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-            results = data.get("organic_results", [])[:max_results]
-            formatted_results = []
-            for r in results:
-                formatted_results.append(f"Title: {r.get('title')}\nSnippet: {r.get('snippet')}\nSource: {r.get('link')}")
-            
-            return "\n\n".join(formatted_results)
-        except Exception as e:
+            if search_cache:
+                return await search_cache.get_or_fetch(query, max_results, fetch)
+            return await fetch()
+        except ExternalCallError as e:
             logger.error(f"Search failed: {e}")
-            return f"Search Error: {str(e)}"
+            raise
+        except Exception as e:
+            # Raised outside the resilience layer (the search cache)
+            logger.error(f"Search failed: {resilience.describe_error(e)}")
+            raise ExternalCallError("serpapi", "error", f"Search Error: SerpAPI {resilience.describe_error(e)}") from e
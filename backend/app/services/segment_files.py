@@ -0,0 +1,87 @@
+"""
+On-disk plumbing shared by the segment-based indexes (lexical_index, numpy_vector_store).
+
+Every uvicorn worker on the host writes the same collection directories, so:
+  1. writers hold an exclusive flock on the collection's lock file for the whole
+     read-manifest, write-segments, write-manifest sequence, and re-read the manifest once
+     they hold it (segment names come from the manifest, so they never collide);
+  2. files and segment directories are built under pid/uuid-unique temp names and moved
+     into place with os.replace;
+  3. segments replaced by a merge are only retired in the manifest and deleted by a later
+     write, SEGMENT_RETIRE_SECONDS after no manifest references them, so a reader that
+     still holds the previous snapshot can finish its query. Readers therefore take no
+     lock: the segments of the manifest they just read stay on disk.
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterable
+import fcntl
+import json
+import os
+import shutil
+import time
+import uuid
+
+SEGMENT_RETIRE_SECONDS = float(os.getenv("SEGMENT_RETIRE_SECONDS", "300"))
+
+LOCK_FILE = "lock"
+
+def temp_path_for(path: str) -> str:
+    """A temp name next to path that no other process or thread uses."""
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+def write_json(path: str, data):
+    """Atomic write: readers in other processes never see a half-written file."""
+    temp_path = temp_path_for(path)
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle)
+    os.replace(temp_path, path)
+
+def replace_dir(temp_path: str, path: str):
+    """Moves a fully written segment directory into place."""
+    if os.path.exists(path):
+        # Left behind by a writer that crashed before saving the manifest; no manifest
+        # references it, because names are only handed out under the collection lock
+        shutil.rmtree(path, ignore_errors=True)
+    os.replace(temp_path, path)
+
+@contextmanager
+def collection_lock(directory: str):
+    """Exclusive flock on the collection's lock file, held by writers across processes."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+def manifest_key(manifest_path: str):
+    """Changes whenever the manifest is replaced; None when there is no manifest yet."""
+    try:
+        stat = os.stat(manifest_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def retire(retired: Dict[str, float], names: Iterable[str]) -> Dict[str, float]:
+    """Marks merged-away segments for deletion. Call with the collection lock held."""
+    updated = dict(retired)
+    now = time.time()
+    for name in names:
+        updated[name] = now
+    return updated
+
+def collect(directory: str, retired: Dict[str, float]) -> Dict[str, float]:
+    """
+    Deletes retired segments older than SEGMENT_RETIRE_SECONDS and returns the rest.
+    Call with the collection lock held, before writing the manifest.
+    """
+    cutoff = time.time() - SEGMENT_RETIRE_SECONDS
+    remaining = {}
+    for name, retired_at in retired.items():
+        if retired_at <= cutoff:
+            # Open memory maps stay valid on POSIX after the files are unlinked
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+        else:
+            remaining[name] = retired_at
+    return remaining
@@ -0,0 +1,111 @@
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from prometheus_client import Counter, Histogram
+import time
+
+# Prometheus metrics, exported by GET /metrics
+NODE_DURATION = Histogram(
+    "flowmind_node_duration_seconds",
+    "Wall time spent executing a workflow node",
+    ["node_type", "model"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+NODE_ERRORS = Counter(
+    "flowmind_node_errors_total",
+    "Workflow nodes that raised instead of completing",
+    ["node_type"]
+)
+WORKFLOW_DURATION = Histogram(
+    "flowmind_workflow_duration_seconds",
+    "Wall time of a complete workflow run",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+LLM_TOKENS = Counter(
+    "flowmind_llm_tokens_total",
+    "Tokens sent to (in) and produced by (out) LLM providers, as reported by the provider",
+    ["model", "direction"]
+)
+LLM_QUEUE_WAIT = Histogram(
+    "flowmind_llm_queue_wait_seconds",
+    "Time an LLM call waited for a concurrency slot before being sent",
+    ["model"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+RETRIEVAL_MATCHES = Histogram(
+    "flowmind_retrieval_matches",
+    "Number of chunks returned per knowledge base retrieval",
+    ["node_type"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50)
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "flowmind_embedding_batch_size",
+    "Texts embedded per model forward pass (after coalescing concurrent requests)",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+CACHE_REQUESTS = Counter(
+    "flowmind_cache_requests_total",
+    "Cache lookups by cache and outcome",
+    ["cache", "result"]
+)
+
+class Span:
+    """Timing and attributes of one node execution within a workflow run."""
+    def __init__(self, node_id: str, node_type: str, run_started: float):
+        self.node_id = node_id
+        self.node_type = node_type
+        self.run_started = run_started
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status = "ok"
+        self.attributes: Dict[str, Any] = {}
+
+    def finish(self, status: str = "ok"):
+        self.duration = time.perf_counter() - self.started
+        self.status = status
+        NODE_DURATION.labels(self.node_type, self.attributes.get("model", "")).observe(self.duration)
+        if status != "ok":
+            NODE_ERRORS.labels(self.node_type).inc()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "node_id": self.node_id,
+            "node_type": self.node_type,
+            "start_ms": round((self.started - self.run_started) * 1000, 2),
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "status": self.status,
+            **self.attributes
+        }
+
+# The span of the node running in the current task. Every node runs in its own asyncio
+# task, so concurrent branches each see their own span.
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def annotate(**attributes):
+    """Attaches attributes (model, token counts, cache hits...) to the current node's span."""
+    span = current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_llm_usage(model: str, usage: Any):
+    """Records token counts from a Gemini usage_metadata object, when the provider sent one."""
+    tokens_in = getattr(usage, "prompt_token_count", None)
+    tokens_out = getattr(usage, "candidates_token_count", None)
+    if tokens_in:
+        LLM_TOKENS.labels(model, "in").inc(tokens_in)
+    if tokens_out:
+        LLM_TOKENS.labels(model, "out").inc(tokens_out)
+    annotate(tokens_in=tokens_in, tokens_out=tokens_out)
+
+def record_queue_wait(model: str, seconds: float):
+    LLM_QUEUE_WAIT.labels(model).observe(seconds)
+    annotate(queue_wait_ms=round(seconds * 1000, 2))
+
+def build_trace(spans: List[Span], total_seconds: float) -> Dict[str, Any]:
+    """Per-request trace returned to clients that ask for it."""
+    return {
+        "total_ms": round(total_seconds * 1000, 2),
+        "nodes": [span.to_dict() for span in sorted(spans, key=lambda s: s.started)]
+    }
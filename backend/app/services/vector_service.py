@@ -1,81 +1,452 @@
-import chromadb
-from chromadb.config import Settings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+import asyncio
+import contextvars
+import functools
+import hashlib
+import json
 import logging
+import threading
+import time
+
+from app.services.embedding_service import embedding_service
+from app.services.lexical_index import get_lexical_index
+from app.services.retrieval_cache import retrieval_cache
 
 logger = logging.getLogger(__name__)
 
 import os
 
-# Initialize ChromaDB Client
+# ChromaDB client, created on first use (or by the startup warm-up) instead of at import,
+# so importing the service does not load chromadb or wait on a remote heartbeat.
 chroma_host = os.getenv("CHROMA_HOST")
 chroma_port = os.getenv("CHROMA_PORT")
+client = None
+_client_lock = threading.Lock()
 
-if chroma_host and chroma_port:
-    try:
-        logger.info(f"Connecting to ChromaDB at {chroma_host}:{chroma_port}")
-        client = chromadb.HttpClient(host=chroma_host, port=int(chroma_port))
-        # Test connection
-        client.heartbeat()
-    except Exception as e:
-        logger.error(f"Failed to connect to remote ChromaDB: {e}. Falling back to local storage.")
-        client = chromadb.PersistentClient(path="./chroma_db")
-else:
-    logger.info("Using local embedded ChromaDB")
-    client = chromadb.PersistentClient(path="./chroma_db")
+def get_client():
+    """Returns the shared Chroma client, connecting on the first call."""
+    global client
+    if client is not None:
+        return client
+    with _client_lock:
+        if client is not None:
+            return client
+        import chromadb
 
-class VectorService:
-    @staticmethod
-    def get_or_create_collection(collection_name: str):
+        if chroma_host and chroma_port:
+            try:
+                logger.info(f"Connecting to ChromaDB at {chroma_host}:{chroma_port}")
+                remote = chromadb.HttpClient(host=chroma_host, port=int(chroma_port))
+                # Test connection
+                remote.heartbeat()
+                client = remote
+            except Exception as e:
+                logger.error(f"Failed to connect to remote ChromaDB: {e}. Falling back to local storage.")
+                client = chromadb.PersistentClient(path="./chroma_db")
+        else:
+            logger.info("Using local embedded ChromaDB")
+            client = chromadb.PersistentClient(path="./chroma_db")
+        return client
+
+# Vector backend calls are blocking (the Chroma client is synchronous; the NumPy backend
+# computes in-process). Calls made from async code are offloaded to this bounded pool so
+# a slow query never blocks the event loop, and a burst of chats cannot open an unbounded
+# number of threads against the store.
+CHROMA_MAX_WORKERS = int(os.getenv("CHROMA_MAX_WORKERS", "8"))
+chroma_executor = ThreadPoolExecutor(max_workers=CHROMA_MAX_WORKERS, thread_name_prefix="chroma")
+
+async def run_in_chroma_pool(func, *args, **kwargs):
+    """Runs a blocking vector store call on the dedicated thread pool and awaits the result."""
+    loop = asyncio.get_running_loop()
+    # Carry the request deadline over, so embedding waits in the thread respect it
+    run_in_context = contextvars.copy_context().run
+    return await loop.run_in_executor(chroma_executor, run_in_context, functools.partial(func, *args, **kwargs))
+
+def chunk_id(source: str, text: str) -> str:
+    """
+    Stable, content-addressed id for a chunk. Unlike hash(), it is the same in every
+    process, so re-uploading a document maps unchanged chunks to the ids already stored.
+    """
+    return hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+
+def _is_missing_collection(error: Exception) -> bool:
+    """Chroma reports a missing collection as ValueError, InvalidCollectionException or NotFoundError, depending on the version."""
+    if type(error).__name__ in ("InvalidCollectionException", "NotFoundError"):
+        return True
+    return isinstance(error, ValueError) and "does not exist" in str(error)
+
+class ChromaBackend:
+    """
+    Vector backend over the shared Chroma client (remote HttpClient or local PersistentClient).
+    Documents and queries are embedded by the embedding service and passed to Chroma as
+    vectors; its default model is the one Chroma used to embed existing collections.
+    """
+    name = "chroma"
+
+    def __init__(self):
+        # Collection handles are reused across requests instead of being looked up on every query
+        self._handles: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        get_client()
+        embedding_service.warm_up()
+
+    def get_or_create_collection(self, collection_name: str):
+        collection = self._handles.get(collection_name)
+        if collection is None:
+            collection = get_client().get_or_create_collection(name=collection_name)
+            with self._lock:
+                self._handles[collection_name] = collection
+        return collection
+
+    def get_collection(self, collection_name: str):
+        """Cached handle to an existing collection (raises if it does not exist)."""
+        collection = self._handles.get(collection_name)
+        if collection is None:
+            collection = get_client().get_collection(name=collection_name)
+            with self._lock:
+                self._handles[collection_name] = collection
+        return collection
+
+    def forget(self, collection_name: str):
+        with self._lock:
+            self._handles.pop(collection_name, None)
+
+    def upsert(self, collection_name: str, ids: List[str], documents: List[str], metadatas: Optional[List[dict]] = None):
+        # Upsert keeps re-indexing idempotent: existing ids are overwritten, not duplicated
+        embeddings = embedding_service.embed(documents)
+        self.get_or_create_collection(collection_name).upsert(
+            documents=documents, embeddings=embeddings, metadatas=metadatas, ids=ids
+        )
+
+    def query(self, collection_name: str, query_texts: List[str], n_results: int, where: Optional[dict] = None) -> List[List[dict]]:
         try:
-            return client.get_or_create_collection(name=collection_name)
+            collection = self.get_collection(collection_name)
+            results = collection.query(
+                query_embeddings=embedding_service.embed(query_texts), n_results=n_results, where=where
+            )
         except Exception as e:
-            logger.error(f"Error creating collection {collection_name}: {e}")
-            raise e
+            # The cached handle may be stale (collection deleted or recreated)
+            self.forget(collection_name)
+            if _is_missing_collection(e):
+                logger.warning(f"Collection {collection_name} does not exist: {e}")
+                return [[] for _ in query_texts]
+            # Connection errors and timeouts go to the resilience layer (retries, circuit breaker)
+            raise
+
+        # results is a dict with 'documents', 'metadatas', etc. (one inner list per query)
+        # Flattening for easier consumption
+        batches = []
+        for query_index in range(len(query_texts)):
+            retrieved = []
+            if results['documents']:
+                for i, doc in enumerate(results['documents'][query_index]):
+                    meta = results['metadatas'][query_index][i] if results.get('metadatas') else {}
+                    retrieved.append({
+                        "id": results['ids'][query_index][i],
+                        "content": doc,
+                        "metadata": meta or {},
+                        "distance": results['distances'][query_index][i] if results.get('distances') else None
+                    })
+            batches.append(retrieved)
+        return batches
+
+    def delete(self, collection_name: str, ids: List[str]):
+        self.get_or_create_collection(collection_name).delete(ids=ids)
+
+    def get_all(self, collection_name: str) -> Dict[str, list]:
+        return self.get_collection(collection_name).get(include=["documents", "metadatas"])
+
+    def list_collections(self) -> List[str]:
+        return [c.name for c in get_client().list_collections()]
+
+# Which store holds the embeddings: "chroma" (default) or "numpy", the embedded
+# memory-mapped index in numpy_vector_store (no extra service hop; best for small and
+# medium collections). Switching backends does not migrate data; re-upload the documents.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_vector_backend():
+    """Returns the configured vector backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if VECTOR_BACKEND == "numpy":
+                    from app.services.numpy_vector_store import NumpyVectorBackend
+                    _backend = NumpyVectorBackend()
+                elif VECTOR_BACKEND == "chroma":
+                    _backend = ChromaBackend()
+                else:
+                    raise ValueError(f"Unknown VECTOR_BACKEND '{VECTOR_BACKEND}' (expected 'chroma' or 'numpy')")
+                logger.info(f"Using the {_backend.name} vector backend")
+    return _backend
+
+def set_vector_backend(backend):
+    """Replaces the backend (benchmarks and tooling)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+_collection_lock = threading.Lock()
+# Lexical indexes live on this host's disk, so writes made through other replicas sharing the
+# Chroma server never reach them. When set, a collection's lexical index is re-synced from
+# the vector store at most this often. 0 (single host) only backfills missing indexes.
+LEXICAL_RESYNC_SECONDS = float(os.getenv("LEXICAL_RESYNC_SECONDS", "0"))
+_lexical_synced: Dict[str, float] = {} # collection -> time.monotonic() of its last sync by this process
+
+# Hybrid retrieval: candidates taken from each retriever before fusion, and the RRF constant
+HYBRID_RETRIEVAL_ENABLED = os.getenv("HYBRID_RETRIEVAL_ENABLED", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], n_results: int, k: int = RRF_K) -> List[dict]:
+    """
+    Merges ranked lists by summing 1 / (k + rank) per chunk id. Rank-based, so vector
+    distances and BM25 scores never need to be put on a common scale.
+    """
+    fused: Dict[str, dict] = {}
+    scores: Dict[str, float] = {}
+    for matches in result_lists:
+        for rank, match in enumerate(matches, start=1):
+            fused.setdefault(match["id"], match)
+            scores[match["id"]] = scores.get(match["id"], 0.0) + 1.0 / (k + rank)
+    ranked = sorted(fused, key=scores.get, reverse=True)[:n_results]
+    return [{**fused[doc_id], "rrf_score": scores[doc_id]} for doc_id in ranked]
+
+class VectorService:
+    @staticmethod
+    def forget_collection(collection_name: str):
+        """Drops cached state for a collection, e.g. after it was deleted or a call on it failed."""
+        get_vector_backend().forget(collection_name)
 
     @staticmethod
     def add_documents(collection_name: str, documents: list[str], metadatas: list[dict] = None, ids: list[str] = None):
         try:
-            collection = VectorService.get_or_create_collection(collection_name)
-            
-            # If no IDs provided, generate them
+            # If no IDs provided, derive them from the source and content
             if ids is None:
-                ids = [f"doc_{str(hash(doc))}" for doc in documents]
-                
-            collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+                ids = [
+                    chunk_id((metadatas[i] or {}).get("source", "") if metadatas else "", doc)
+                    for i, doc in enumerate(documents)
+                ]
+
+            # Identical chunks in one batch would share an id; keep the first occurrence
+            seen_ids = set()
+            keep = []
+            for i, doc_id in enumerate(ids):
+                if doc_id not in seen_ids:
+                    seen_ids.add(doc_id)
+                    keep.append(i)
+            if len(keep) != len(ids):
+                documents = [documents[i] for i in keep]
+                metadatas = [metadatas[i] for i in keep] if metadatas else None
+                ids = [ids[i] for i in keep]
+
+            try:
+                get_vector_backend().upsert(collection_name, ids, documents, metadatas)
+                if HYBRID_RETRIEVAL_ENABLED:
+                    get_lexical_index(collection_name).add(ids, documents, metadatas)
+            finally:
+                # Even a partly applied write changes what retrieval returns
+                if retrieval_cache:
+                    retrieval_cache.invalidate(collection_name)
             return len(documents)
         except Exception as e:
             logger.error(f"Error adding documents to {collection_name}: {e}")
             raise e
 
     @staticmethod
-    def query(collection_name: str, query_text: str, n_results: int = 3):
+    def query(collection_name: str, query_text: str, n_results: int = 3, where: Optional[dict] = None):
+        return VectorService.query_many(collection_name, [query_text], n_results, where)[0]
+
+    @staticmethod
+    def query_many(
+        collection_name: str,
+        query_texts: List[str],
+        n_results: Union[int, List[int]] = 3,
+        where: Optional[dict] = None
+    ) -> List[List[dict]]:
+        """
+        Embeds and searches all queries in a single backend call.
+        n_results may be one value or one per query; where is a Chroma-style metadata filter
+        applied to every query in the batch. Returns one list of matches per query.
+        """
+        if not query_texts:
+            return []
+        limits = n_results if isinstance(n_results, list) else [n_results] * len(query_texts)
+        batches = get_vector_backend().query(collection_name, query_texts, max(limits), where)
+        return [matches[:limit] for matches, limit in zip(batches, limits)]
+
+    @staticmethod
+    def delete_documents(collection_name: str, ids: list[str]):
+        """Removes chunks by id, e.g. the stale chunks of a re-uploaded document."""
+        if not ids:
+            return 0
         try:
-            collection = client.get_collection(name=collection_name)
-            results = collection.query(
-                query_texts=[query_text],
-                n_results=n_results
-            )
-            
-            # results is a dict with 'documents', 'metadatas', etc.
-            # Flattening for easier consumption
-            retrieved = []
-            if results['documents']:
-                for i, doc in enumerate(results['documents'][0]):
-                    meta = results['metadatas'][0][i] if results['metadatas'] else {}
-                    retrieved.append({
-                        "content": doc,
-                        "metadata": meta
-                    })
-            return retrieved
+            get_vector_backend().delete(collection_name, ids)
+            if HYBRID_RETRIEVAL_ENABLED:
+                get_lexical_index(collection_name).delete(ids)
+        finally:
+            if retrieval_cache:
+                retrieval_cache.invalidate(collection_name)
+        return len(ids)
+
+    @staticmethod
+    async def delete_documents_async(collection_name: str, ids: list[str]):
+        return await run_in_chroma_pool(VectorService.delete_documents, collection_name, ids)
+
+    @staticmethod
+    async def add_documents_async(collection_name: str, documents: list[str], metadatas: list[dict] = None, ids: list[str] = None):
+        """Non-blocking variant of add_documents for use inside request handlers."""
+        return await run_in_chroma_pool(VectorService.add_documents, collection_name, documents, metadatas, ids)
+
+    @staticmethod
+    async def query_async(collection_name: str, query_text: str, n_results: int = 3, where: Optional[dict] = None):
+        """
+        Non-blocking variant of query for use inside the workflow executor. Concurrent calls
+        (several knowledge nodes, or many chats at once) are coalesced into one query_many call.
+        """
+        return await retrieval_batcher.query(collection_name, query_text, n_results, where)
+
+    @staticmethod
+    async def query_many_async(
+        collection_name: str,
+        query_texts: List[str],
+        n_results: Union[int, List[int]] = 3,
+        where: Optional[dict] = None
+    ) -> List[List[dict]]:
+        return await run_in_chroma_pool(VectorService.query_many, collection_name, query_texts, n_results, where)
+
+    @staticmethod
+    def lexical_query(collection_name: str, query_text: str, n_results: int = 10) -> List[dict]:
+        """BM25 search over the collection's lexical index; builds or re-syncs the index first if due."""
+        index = get_lexical_index(collection_name)
+        if not index.exists() or LEXICAL_RESYNC_SECONDS > 0:
+            VectorService.rebuild_lexical_index(collection_name)
+        return index.search(query_text, n_results)
+
+    @staticmethod
+    def rebuild_lexical_index(collection_name: str) -> int:
+        """
+        Brings the lexical index in line with the vector store: indexes chunks it is missing
+        (collections created before hybrid retrieval existed, or written through another
+        replica) and drops chunks the store no longer has. Runs once per process, or every
+        LEXICAL_RESYNC_SECONDS when that is set. Returns the number of chunks in the store.
+        """
+        with _collection_lock:
+            synced_at = _lexical_synced.get(collection_name)
+            if synced_at is not None and (LEXICAL_RESYNC_SECONDS <= 0 or time.monotonic() - synced_at < LEXICAL_RESYNC_SECONDS):
+                return 0
+            _lexical_synced[collection_name] = time.monotonic()
+        try:
+            stored = get_vector_backend().get_all(collection_name)
         except Exception as e:
-            # Collection might not exist
-            logger.warning(f"Error querying {collection_name} (might not exist): {e}")
-            return []
+            logger.warning(f"Cannot build lexical index for {collection_name}: {e}")
+            return 0
+        index = get_lexical_index(collection_name)
+        if stored["ids"]:
+            logger.info(f"Syncing lexical index for {collection_name} ({len(stored['ids'])} chunks)")
+            # Ids are content-addressed, so chunks already indexed are skipped
+            index.add(stored["ids"], stored["documents"], stored["metadatas"])
+        stale = index.live_ids() - set(stored["ids"])
+        if stale:
+            index.delete(list(stale))
+        # BM25 results may have changed
+        if retrieval_cache and synced_at is not None:
+            retrieval_cache.invalidate(collection_name)
+        return len(stored["ids"])
+
+    @staticmethod
+    async def hybrid_query_async(collection_name: str, query_text: str, n_results: int = 3) -> List[dict]:
+        """
+        Vector and BM25 retrieval run side by side and are merged with reciprocal rank fusion,
+        so exact part numbers and error codes are found even when embeddings miss them.
+        Results are cached until the collection is next written to.
+        """
+        # 1. Repeated question on an unchanged collection
+        cache_key = None
+        if retrieval_cache:
+            cache_key = retrieval_cache.key_for(collection_name, query_text, n_results)
+            cached = retrieval_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        # 2. Retrieve
+        if not HYBRID_RETRIEVAL_ENABLED:
+            matches = await VectorService.query_async(collection_name, query_text, n_results)
+        else:
+            # Each retriever contributes at least as many candidates as the caller asked for
+            candidates = max(HYBRID_CANDIDATES, n_results)
+            vector_matches, lexical_matches = await asyncio.gather(
+                VectorService.query_async(collection_name, query_text, candidates),
+                run_in_chroma_pool(VectorService.lexical_query, collection_name, query_text, candidates)
+            )
+            matches = reciprocal_rank_fusion([vector_matches, lexical_matches], n_results)
+
+        # 3. Empty results are not cached: they also come from a missing collection or a failed query
+        if cache_key is not None and matches:
+            retrieval_cache.put(cache_key, matches)
+        return matches
 
     @staticmethod
     def list_collections():
-        return [c.name for c in client.list_collections()]
+        return get_vector_backend().list_collections()
+
+# Coalescing window for concurrent retrievals. 0 still merges calls made in the same event-loop tick.
+RETRIEVAL_BATCH_WINDOW_MS = float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "2"))
+RETRIEVAL_MAX_BATCH = int(os.getenv("RETRIEVAL_MAX_BATCH", "32"))
+
+class RetrievalBatcher:
+    """
+    Micro-batcher in front of VectorService.query_many. Queries against the same collection
+    and filter that arrive within a short window share one embedding pass and one backend call.
+    """
+    def __init__(self, window_seconds: float, max_batch: int):
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._pending: Dict[Tuple[str, Optional[str]], list] = {}
+        # Window timer of each pending batch, cancelled when the batch fills up first
+        self._timers: Dict[Tuple[str, Optional[str]], asyncio.TimerHandle] = {}
+
+    async def query(self, collection_name: str, query_text: str, n_results: int, where: Optional[dict]):
+        loop = asyncio.get_running_loop()
+        key = (collection_name, json.dumps(where, sort_keys=True) if where else None)
+        future = loop.create_future()
+
+        batch = self._pending.setdefault(key, [])
+        batch.append((query_text, n_results, future))
+        if len(batch) >= self.max_batch:
+            self._flush(key, where)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window_seconds, self._flush, key, where)
+
+        return await future
+
+    def _flush(self, key: Tuple[str, Optional[str]], where: Optional[dict]):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            asyncio.ensure_future(self._run(key[0], where, batch))
+
+    async def _run(self, collection_name: str, where: Optional[dict], batch: list):
+        try:
+            results = await VectorService.query_many_async(
+                collection_name,
+                [query_text for query_text, _, _ in batch],
+                [n_results for _, n_results, _ in batch],
+                where
+            )
+            for (_, _, future), matches in zip(batch, results):
+                if not future.done():
+                    future.set_result(matches)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+retrieval_batcher = RetrievalBatcher(RETRIEVAL_BATCH_WINDOW_MS / 1000, RETRIEVAL_MAX_BATCH)
@@ -1,8 +1,12 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set, Optional, Callable, AsyncIterator
 from app.models.schemas import WorkflowGraph, ChatMessage
-from app.services.llm_provider import generate_text
-from app.services.vector_service import VectorService
-from app.services.search_service import SearchService
+from app.services.node_registry import node_registry, NodeContext, NO_FALLBACK
+from app.services import node_handlers # registers the built-in node types
+from app.services import resilience, telemetry
+from app.services.resilience import ExternalCallError
+import asyncio
+import copy
+import time
 import logging
 
 # We use logging to track the execution flow for debugging
@@ -11,13 +15,38 @@ logger = logging.getLogger(__name__)
 class WorkflowExecutor:
     """
     Handles the execution of a visual workflow graph.
-    It traverses the nodes starting from the user query and processes each step.
+    The graph is treated as a DAG: starting from the user query, every node whose
+    inputs are ready is run concurrently, and fan-in nodes wait for all their parents.
+
+    All graph analysis happens once in the constructor, so an instance is a validated,
+    precompiled execution plan. It holds no per-run state and can be cached and shared
+    by concurrent requests.
     """
     def __init__(self, workflow_graph: WorkflowGraph):
         # Store nodes by ID for quick O(1) lookup during traversal
         self.node_map = {node.id: node for node in workflow_graph.nodes}
         self.edges = workflow_graph.edges
         self.execution_path = self._map_connections()
+        self.upstream_path = self._map_dependencies()
+
+        # 1. Identify where we start (the Query Node)
+        entry_node = next((n for n in self.node_map.values() if n.type == 'queryNode'), None)
+        if not entry_node:
+            raise ValueError("Workflow configuration error: No 'User Query' node found.")
+        self.entry_node_id = entry_node.id
+
+        # 2. Only nodes connected to the query take part in a run
+        self.active_nodes = self._reachable_from(self.entry_node_id)
+        self.execution_order = self._topological_order(self.active_nodes)
+        self.parent_counts = {
+            node_id: sum(1 for parent in self.upstream_path[node_id] if parent in self.active_nodes)
+            for node_id in self.active_nodes
+        }
+        self.ancestor_order = self._map_ancestors()
+
+        # 3. Every active node must be of a known type with valid settings
+        self.node_types = {node_id: node_registry.get(self.node_map[node_id].type) for node_id in self.active_nodes}
+        self.node_configs = {node_id: node_registry.parse_config(self.node_map[node_id]) for node_id in self.active_nodes}
 
     def _map_connections(self) -> Dict[str, List[str]]:
         """
@@ -25,84 +54,248 @@ class WorkflowExecutor:
         """
         connections = {node_id: [] for node_id in self.node_map}
         for edge in self.edges:
-            if edge.source in connections:
+            if edge.source in connections and edge.target in self.node_map:
                 connections[edge.source].append(edge.target)
         return connections
 
+    def _map_dependencies(self) -> Dict[str, List[str]]:
+        """
+        Reverse adjacency list: for every node, the nodes feeding into it.
+        """
+        dependencies = {node_id: [] for node_id in self.node_map}
+        for source_id, targets in self.execution_path.items():
+            for target_id in targets:
+                dependencies[target_id].append(source_id)
+        return dependencies
+
+    def _reachable_from(self, start_id: str) -> Set[str]:
+        """Returns every node that can be reached by following arrows from start_id."""
+        seen = {start_id}
+        stack = [start_id]
+        while stack:
+            for child_id in self.execution_path[stack.pop()]:
+                if child_id not in seen:
+                    seen.add(child_id)
+                    stack.append(child_id)
+        return seen
+
+    def _topological_order(self, node_ids: Set[str]) -> List[str]:
+        """
+        Kahn's algorithm over the given sub-graph. Raises if the arrows form a cycle,
+        since a cyclic workflow would never finish.
+        """
+        in_degree = {
+            node_id: sum(1 for parent in self.upstream_path[node_id] if parent in node_ids)
+            for node_id in node_ids
+        }
+        # Keep canvas order for nodes that become ready together (deterministic output)
+        queue = [node_id for node_id in self.node_map if node_id in node_ids and in_degree[node_id] == 0]
+        ordered = []
+        while queue:
+            node_id = queue.pop(0)
+            ordered.append(node_id)
+            for child_id in self.execution_path[node_id]:
+                in_degree[child_id] -= 1
+                if in_degree[child_id] == 0:
+                    queue.append(child_id)
+
+        if len(ordered) != len(node_ids):
+            raise ValueError("Workflow configuration error: The graph contains a cycle.")
+        return ordered
+
+    def _map_ancestors(self) -> Dict[str, List[str]]:
+        """
+        For every active node, all of its (transitive) ancestors in topological order.
+        Fan-in nodes use this to join upstream results deterministically.
+        """
+        position = {node_id: index for index, node_id in enumerate(self.execution_order)}
+        ancestor_order = {}
+        for node_id in self.execution_order:
+            ancestors = set()
+            for parent_id in self.upstream_path[node_id]:
+                if parent_id in position:
+                    ancestors.add(parent_id)
+                    ancestors.update(ancestor_order[parent_id])
+            ancestor_order[node_id] = sorted(ancestors, key=position.get)
+        return ancestor_order
+
+    def _upstream_outputs(self, node_id: str, workflow_state: Dict[str, Any], node_type: str) -> List[Any]:
+        """
+        Collects the outputs of every ancestor of node_id with the given type,
+        in topological order, so fan-in joins are deterministic.
+        """
+        outputs = workflow_state["node_outputs"]
+        return [
+            outputs[ancestor_id]
+            for ancestor_id in self.ancestor_order[node_id]
+            if self.node_map[ancestor_id].type == node_type and ancestor_id in outputs
+        ]
+
     async def execute(self, query_text: str, chat_history: List[ChatMessage]) -> str:
         """
         Main entry point to run the workflow. It manages the conversation state
-        and walks through the graph nodes.
+        and schedules every node as soon as all of its inputs are available.
         """
-        # 1. Identify where we start (the Query Node)
-        entry_node = next((n for n in self.node_map.values() if n.type == 'queryNode'), None)
-        
-        if not entry_node:
-            raise ValueError("Workflow configuration error: No 'User Query' node found.")
+        workflow_state = await self._run_graph(query_text, chat_history)
+        return workflow_state['final_answer']
 
-        # This state object acts as a shared 'blackboard' for data between nodes
+    async def execute_detailed(self, query_text: str, chat_history: List[ChatMessage]) -> Dict[str, Any]:
+        """
+        Same as execute, but also returns the per-node timing trace and the structured
+        errors of nodes that failed or ran degraded: {"response", "trace", "errors"}.
+        """
+        workflow_state = await self._run_graph(query_text, chat_history)
+        return {
+            "response": workflow_state['final_answer'],
+            "trace": workflow_state['trace'],
+            "errors": workflow_state['node_errors']
+        }
+
+    async def execute_stream(
+        self,
+        query_text: str,
+        chat_history: List[ChatMessage],
+        include_trace: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of execute. Yields progress events while the graph runs:
+        'node_started' / 'node_completed' per node, 'token' for each LLM text fragment,
+        an 'error' event for a node that failed without a degraded output, and a final
+        'done' event carrying the complete answer (and the trace, if asked for).
+        """
+        events: asyncio.Queue = asyncio.Queue()
+        run = asyncio.create_task(self._run_graph(query_text, chat_history, emit=events.put_nowait))
+        # A sentinel wakes the consumer up once the run finishes (successfully or not)
+        run.add_done_callback(lambda _: events.put_nowait(None))
+
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+
+            # Surfaces any node failure to the caller
+            workflow_state = run.result()
+            done = {"event": "done", "response": workflow_state['final_answer']}
+            if workflow_state['node_errors']:
+                done["errors"] = workflow_state['node_errors']
+            if include_trace:
+                done["trace"] = workflow_state['trace']
+            yield done
+        finally:
+            # The client may disconnect mid-stream; stop the graph instead of finishing it for nobody
+            run.cancel()
+
+    async def _run_graph(
+        self,
+        query_text: str,
+        chat_history: List[ChatMessage],
+        emit: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Runs the whole DAG and returns the final blackboard. When emit is given,
+        progress events and LLM tokens are pushed to it as they happen.
+        """
+        # This state object acts as a shared 'blackboard' for data between nodes.
+        # Each node writes its result under its own id, so concurrent branches never clash.
         workflow_state = {
             "query": query_text,
             "history": chat_history,
-            "knowledge_context": "",
-            "search_results": "",
-            "final_answer": ""
+            "node_outputs": {},
+            "final_answer": "",
+            "emit": emit,
+            "started": time.perf_counter(),
+            "spans": [],
+            "node_errors": []
         }
+        # Every external call made by the nodes of this run shares one deadline
+        resilience.start_deadline()
 
-        active_node_id = entry_node.id
-        
-        # Traverse the graph. Currently supports linear flows (one path at a time).
-        while active_node_id:
-            node = self.node_map[active_node_id]
-            logger.info(f"Processing node activity: {node.type} ({node.id})")
-
-            # Execute logic based on what the node is supposed to do
-            if node.type == 'queryNode':
-                # Entry point - query is already in our state
-                pass
-            
-            elif node.type == 'knowledgeNode':
-                # Fetch snippets from the vector database (PDFs/Docs)
-                db_collection = node.data.collection or "knowledge_base"
-                matches = VectorService.query(db_collection, workflow_state['query'])
-                
-                # Append found content to our running context
-                workflow_state['knowledge_context'] += "\n\n".join([
-                    f"From {match['metadata'].get('source', 'Document')}:\n{match['content']}" 
-                    for match in matches
-                ])
-
-            elif node.type == 'searchNode':
-                # Real-time search from the web
-                web_context = await SearchService.search(workflow_state['query'])
-                workflow_state['search_results'] += f"\n\nLatest Web Info:\n{web_context}"
-
-            elif node.type == 'llmNode':
-                # The 'brain' of the workflow. We pack all gathered context here.
-                ai_model = node.data.model or "gemini-2.0-flash"
-                ai_provider = node.data.provider or "gemini"
-                
-                all_context = (workflow_state.get('knowledge_context', "") + 
-                              "\n" + 
-                              workflow_state.get('search_results', "")).strip()
-                
-                workflow_state['final_answer'] = await generate_text(
-                    provider=ai_provider,
-                    model=ai_model,
-                    query=workflow_state['query'],
-                    context=all_context
-                )
-
-            elif node.type == 'outputNode':
-                # Reached the end - return what the LLM produced
-                return workflow_state['final_answer']
-
-            # Move to the next connected node
-            connections_out = self.execution_path.get(active_node_id, [])
-            if not connections_out:
-                break
-            
-            # Simple assumption: Follow the first outgoing connection
-            active_node_id = connections_out[0]
-        
-        return workflow_state['final_answer']
+        # Run the DAG: launch every ready node, and release children when their last parent finishes
+        waiting_on = dict(self.parent_counts)
+        running: Dict[asyncio.Task, str] = {}
+        ready = [self.entry_node_id]
+
+        try:
+            while ready or running:
+                for node_id in ready:
+                    task = asyncio.create_task(self._execute_node(node_id, workflow_state))
+                    running[task] = node_id
+                ready = []
+
+                finished, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    node_id = running.pop(task)
+                    # Re-raise node failures so the API layer can report them
+                    task.result()
+                    for child_id in self.execution_path[node_id]:
+                        waiting_on[child_id] -= 1
+                        if waiting_on[child_id] == 0:
+                            ready.append(child_id)
+        finally:
+            # If one branch failed, don't leave its siblings running in the background
+            for task in running:
+                task.cancel()
+
+        elapsed = time.perf_counter() - workflow_state['started']
+        telemetry.WORKFLOW_DURATION.observe(elapsed)
+        workflow_state['trace'] = telemetry.build_trace(workflow_state['spans'], elapsed)
+        return workflow_state
+
+    async def _execute_node(self, node_id: str, workflow_state: Dict[str, Any]) -> None:
+        """
+        Runs a single node inside a trace span, so its wall time and attributes
+        (model, tokens, cache hits, retrieval matches) end up in the metrics and the trace.
+        """
+        node = self.node_map[node_id]
+        emit = workflow_state['emit']
+        logger.info(f"Processing node activity: {node.type} ({node.id})")
+        if emit:
+            emit({"event": "node_started", "node_id": node_id, "node_type": node.type})
+
+        span = telemetry.Span(node_id, node.type, workflow_state['started'])
+        workflow_state['spans'].append(span)
+        telemetry.current_span.set(span)
+        node_type = self.node_types[node_id]
+        context = NodeContext(node, self.node_configs[node_id], self, workflow_state)
+        try:
+            # The registry routes the handler to its resource class's pool and concurrency cap
+            output = await node_registry.run(node_type, context)
+            if output is not None:
+                workflow_state['node_outputs'][node_id] = output
+        except ExternalCallError as error:
+            # A dependency is down or too slow: degrade instead of failing the whole run
+            span.finish(status=self._handle_node_failure(node_id, workflow_state, error))
+        except BaseException:
+            # Cancellation (a failed sibling or a dropped stream) counts as an error too
+            span.finish(status="error")
+            raise
+        else:
+            span.finish()
+
+        if emit:
+            emit({"event": "node_completed", "node_id": node_id, "node_type": node.type})
+
+    def _handle_node_failure(self, node_id: str, workflow_state: Dict[str, Any], error: ExternalCallError) -> str:
+        """
+        Records a structured error for the node and decides how the run continues:
+        node types with a degraded output (knowledge, search) contribute that and the LLM
+        answers without them; for the others the error message becomes the answer.
+        Returns the node status.
+        """
+        node = self.node_map[node_id]
+        node_type = self.node_types[node_id]
+        status = "failed" if node_type.degraded_output is NO_FALLBACK else "degraded"
+        logger.warning(f"Node {node_id} ({node.type}) {status}: {error}")
+        workflow_state['node_errors'].append({"node_id": node_id, "node_type": node.type, "status": status, **error.to_dict()})
+
+        if status == "degraded":
+            workflow_state['node_outputs'][node_id] = copy.copy(node_type.degraded_output)
+        else:
+            workflow_state['node_outputs'][node_id] = str(error)
+            workflow_state['final_answer'] = str(error)
+            if workflow_state['emit']:
+                # Its own event, so clients never glue the message onto partially streamed tokens
+                workflow_state['emit']({"event": "error", "node_id": node_id, "node_type": node.type, "status": status, **error.to_dict()})
+        return status
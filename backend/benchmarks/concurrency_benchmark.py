@@ -0,0 +1,117 @@
+"""
+Concurrency benchmark for the async I/O layer of the workflow executor.
+
+Runs a RAG + web-search fan-out workflow many times at increasing numbers of
+in-flight requests. External services are replaced with latency stand-ins so the
+numbers only reflect how well the engine overlaps I/O:
+  - SerpAPI is served by an httpx MockTransport that sleeps asynchronously.
+  - Chroma's query is a blocking call that sleeps on the calling thread, exactly
+    like the real synchronous client, so it must be offloaded to avoid stalling the loop.
+  - Gemini is an async sleep.
+
+If the event loop were blocked, throughput would stay flat as concurrency grows.
+
+Usage (from the backend directory):
+    python -m benchmarks.concurrency_benchmark --requests 64 --levels 1 2 4 8 16 32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.schemas import WorkflowGraph
+from app.services import node_handlers, search_service, vector_service, workflow_engine
+from app.services.vector_service import VectorService
+
+SEARCH_LATENCY = 0.15
+CHROMA_LATENCY = 0.05
+LLM_LATENCY = 0.10
+
+def build_fan_out_graph() -> WorkflowGraph:
+    """query -> (knowledge, search) -> llm -> output"""
+    def node(node_id, node_type):
+        return {"id": node_id, "type": node_type, "position": {"x": 0, "y": 0}, "data": {"label": node_id}}
+
+    return WorkflowGraph(
+        nodes=[
+            node("query", "queryNode"),
+            node("knowledge", "knowledgeNode"),
+            node("search", "searchNode"),
+            node("llm", "llmNode"),
+            node("output", "outputNode"),
+        ],
+        edges=[
+            {"id": "e1", "source": "query", "target": "knowledge"},
+            {"id": "e2", "source": "query", "target": "search"},
+            {"id": "e3", "source": "knowledge", "target": "llm"},
+            {"id": "e4", "source": "search", "target": "llm"},
+            {"id": "e5", "source": "llm", "target": "output"},
+        ],
+    )
+
+def install_stand_ins():
+    async def serpapi_handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(SEARCH_LATENCY)
+        return httpx.Response(200, json={"organic_results": [
+            {"title": "Result", "snippet": f"About {request.url.params.get('q')}", "link": "https://example.com"}
+        ]})
+
+    def blocking_chroma_query(collection_name, query_texts, n_results=3, where=None):
+        time.sleep(CHROMA_LATENCY)
+        return [[{"content": "Chunk text", "metadata": {"source": "manual.pdf"}}] for _ in query_texts]
+
+    async def fake_generate_text(provider, model, query, context="", history=""):
+        await asyncio.sleep(LLM_LATENCY)
+        return f"Answer to {query}"
+
+    os.environ["SERPAPI_KEY"] = "benchmark"
+    search_service._http_client = httpx.AsyncClient(transport=httpx.MockTransport(serpapi_handler))
+    # Every level reuses the same questions; searches must not come from the search cache either
+    search_service.search_cache = None
+    VectorService.query_many = staticmethod(blocking_chroma_query)
+    # Measure the vector path only; there is no lexical index for the stand-in collection
+    vector_service.HYBRID_RETRIEVAL_ENABLED = False
+    node_handlers.generate_text = fake_generate_text
+    # Every level reuses the same questions; answers must not come from the response cache
+    node_handlers.response_cache = None
+
+async def run_level(graph: WorkflowGraph, total_requests: int, in_flight: int) -> float:
+    """Executes total_requests workflows with at most in_flight running at once; returns req/s."""
+    gate = asyncio.Semaphore(in_flight)
+
+    async def one_request(i):
+        async with gate:
+            runner = workflow_engine.WorkflowExecutor(graph)
+            await runner.execute(query_text=f"question {i}", chat_history=[])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request(i) for i in range(total_requests)))
+    return total_requests / (time.perf_counter() - started)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    install_stand_ins()
+    graph = build_fan_out_graph()
+    ideal_latency = max(SEARCH_LATENCY, CHROMA_LATENCY) + LLM_LATENCY
+
+    print(f"Ideal single-request latency: {ideal_latency * 1000:.0f} ms")
+    print(f"{'in-flight':>10} {'req/s':>10} {'speedup':>10}")
+    baseline = None
+    for level in args.levels:
+        throughput = await run_level(graph, args.requests, level)
+        baseline = baseline or throughput
+        print(f"{level:>10} {throughput:>10.1f} {throughput / baseline:>9.1f}x")
+
+    await search_service.close_http_client()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""
+Checks that several processes can write the same collection of the segment-based indexes
+(NumPy vector store and BM25 lexical index) without losing each other's chunks, as
+uvicorn workers running ingestion jobs side by side do.
+
+Each writer process adds its own chunks in small batches (so segments are merged while
+the others write), deletes a few of them, and the parent then verifies from a fresh
+reader that exactly the expected chunks are live and no temp directories are left over.
+Exits non-zero on a mismatch.
+
+Usage (from the backend directory):
+    python -m benchmarks.concurrent_writers_check --writers 4 --chunks 2000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import lexical_index, numpy_vector_store
+
+COLLECTION = "shared"
+BATCH = 32
+DIMENSION = 16
+
+def expected_ids(writer: int, chunks: int):
+    """(all ids the writer adds, ids it deletes again)."""
+    ids = [f"w{writer}-{i}" for i in range(chunks)]
+    return ids, ids[::10]
+
+def write(writer: int, chunks: int, vector_dir: str, lexical_dir: str):
+    numpy_vector_store.VECTOR_INDEX_DIR = vector_dir
+    lexical_index.LEXICAL_INDEX_DIR = lexical_dir
+    vectors = numpy_vector_store.NumpyCollection(COLLECTION)
+    lexical = lexical_index.LexicalIndex(COLLECTION)
+    rng = np.random.default_rng(writer)
+
+    ids, deleted = expected_ids(writer, chunks)
+    for start in range(0, len(ids), BATCH):
+        batch = ids[start:start + BATCH]
+        documents = [f"chunk {doc_id} pump valve" for doc_id in batch]
+        vectors.upsert(batch, rng.standard_normal((len(batch), DIMENSION)), documents)
+        lexical.add(batch, documents)
+    vectors.delete(deleted)
+    lexical.delete(deleted)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--chunks", type=int, default=2000, help="chunks per writer")
+    args = parser.parse_args()
+
+    vector_dir = tempfile.mkdtemp(prefix="vector_index_")
+    lexical_dir = tempfile.mkdtemp(prefix="lexical_index_")
+    # Small merge tiers, so merges happen while the other writers are adding segments
+    numpy_vector_store.VECTOR_MERGE_FLOOR = 64
+    lexical_index.LEXICAL_MERGE_FLOOR = 64
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=write, args=(writer, args.chunks, vector_dir, lexical_dir))
+        for writer in range(args.writers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    if any(process.exitcode != 0 for process in processes):
+        sys.exit("a writer process failed")
+
+    numpy_vector_store.VECTOR_INDEX_DIR = vector_dir
+    lexical_index.LEXICAL_INDEX_DIR = lexical_dir
+    expected = set()
+    for writer in range(args.writers):
+        ids, deleted = expected_ids(writer, args.chunks)
+        expected |= set(ids) - set(deleted)
+
+    vector_ids = numpy_vector_store.NumpyCollection(COLLECTION).get_all()["ids"]
+    lexical_ids = lexical_index.LexicalIndex(COLLECTION).live_ids()
+    leftovers = [
+        name for directory in (vector_dir, lexical_dir)
+        for name in os.listdir(os.path.join(directory, COLLECTION)) if name.endswith(".tmp")
+    ]
+    print(f"expected {len(expected)} live chunks")
+    print(f"vector store:  {len(vector_ids)} live, {len(vector_ids) - len(set(vector_ids))} duplicated")
+    print(f"lexical index: {len(lexical_ids)} live")
+    print(f"temp leftovers: {len(leftovers)}")
+    if set(vector_ids) != expected or len(vector_ids) != len(expected) or lexical_ids != expected or leftovers:
+        sys.exit("FAILED: writers lost or duplicated chunks")
+    print("ok")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Load test for the persistence layer under contention.
+
+Drives a running FlowMind API with a mixed workload that is dominated by database work:
+  - GET  /api/v1/workflows/list
+  - GET  /api/v1/workflows/{name}
+  - POST /api/v1/workflows/save          (updates, i.e. row writes + plan cache invalidation)
+  - POST /api/v1/chat/execute            (workflow_id lookup of a query -> output graph,
+                                          so no LLM or search call is involved)
+at increasing concurrency, and reports throughput and latency percentiles per level.
+
+Run it against Postgres to see the effect of the async engine and pool settings
+(DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING), e.g.:
+    docker compose up -d db backend
+    python -m benchmarks.db_load_test --base-url http://localhost:8000 --levels 1 8 32 64
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+import httpx
+
+def db_only_graph() -> dict:
+    def node(node_id, node_type):
+        return {"id": node_id, "type": node_type, "position": {"x": 0, "y": 0}, "data": {"label": node_id}}
+    return {
+        "nodes": [node("query", "queryNode"), node("output", "outputNode")],
+        "edges": [{"id": "e1", "source": "query", "target": "output"}],
+    }
+
+async def seed(client: httpx.AsyncClient, count: int, prefix: str) -> list:
+    workflows = []
+    for i in range(count):
+        name = f"{prefix}-{i}"
+        response = await client.post("/api/v1/workflows/save", params={"name": name}, json=db_only_graph())
+        response.raise_for_status()
+        workflows.append((name, response.json()["id"]))
+    return workflows
+
+async def one_operation(client: httpx.AsyncClient, workflows: list, rng: random.Random):
+    name, workflow_id = rng.choice(workflows)
+    roll = rng.random()
+    if roll < 0.2:
+        response = await client.get("/api/v1/workflows/list")
+    elif roll < 0.5:
+        response = await client.get(f"/api/v1/workflows/{name}")
+    elif roll < 0.6:
+        response = await client.post("/api/v1/workflows/save", params={"name": name}, json=db_only_graph())
+    else:
+        response = await client.post("/api/v1/chat/execute", json={"workflow_id": workflow_id, "message": "ping"})
+    response.raise_for_status()
+
+async def run_level(client: httpx.AsyncClient, workflows: list, concurrency: int, total: int) -> dict:
+    rng = random.Random(concurrency)
+    latencies = []
+    errors = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def timed_operation():
+        nonlocal errors
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await one_operation(client, workflows, rng)
+                latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_operation() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float("nan")
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "errors": errors,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--workflows", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500, help="requests per concurrency level")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=max(args.levels), max_keepalive_connections=max(args.levels))
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        workflows = await seed(client, args.workflows, f"loadtest-{uuid.uuid4().hex[:8]}")
+
+        print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for level in args.levels:
+            stats = await run_level(client, workflows, level, args.requests)
+            print(
+                f"{level:>11} {stats['rps']:>8.1f} {stats['p50']:>8.1f} "
+                f"{stats['p95']:>8.1f} {stats['p99']:>8.1f} {stats['errors']:>7}"
+            )
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Embedding throughput of the local CPU model, and what the embedding service adds on top.
+
+  1. model:      embeddings/sec for one forward pass per batch size
+  2. concurrent: many threads embedding one query each (like concurrent chats), through an
+                 EmbeddingService without coalescing (max batch 1) and with micro-batching
+                 at the given windows; reports embeddings/sec and per-call latency
+  3. cached:     the same queries again, answered from the embedding cache
+
+The model runs locally (EMBEDDING_MODEL, default: Chroma's ONNX all-MiniLM-L6-v2), so the
+first run needs the model files.
+
+Usage (from the backend directory):
+    python -m benchmarks.embedding_benchmark --batch-sizes 1 8 32 64 128 --clients 32
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.embedding_service import EMBEDDING_MODEL, EmbeddingService, load_encoder
+
+VOCABULARY = (
+    "pump valve sensor firmware reset error code pressure flow calibration manual "
+    "warranty install replace filter motor controller voltage display alarm service"
+).split()
+
+def synthetic_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words)) + f" E{rng.randint(1000, 9999)}"
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def concurrent_run(service: EmbeddingService, queries: list, clients: int):
+    """Returns (embeddings/sec, per-call latencies in seconds)."""
+    def one_call(query):
+        started = time.perf_counter()
+        service.embed([query])
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(one_call, queries))
+    return len(queries) / (time.perf_counter() - started), latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--texts", type=int, default=512, help="texts per measurement")
+    parser.add_argument("--words", type=int, default=40, help="words per chunk for the model runs")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64, 128])
+    parser.add_argument("--clients", type=int, default=32, help="concurrent callers")
+    parser.add_argument("--windows-ms", type=float, nargs="+", default=[0, 2])
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    encoder = load_encoder(args.model)
+    encoder(["warm up"])
+
+    # 1. Raw model throughput per batch size
+    chunks = [synthetic_text(rng, args.words) for _ in range(args.texts)]
+    print(f"model ({args.model}, {args.words}-word chunks)")
+    print(f"{'batch':>8} {'emb/s':>9} {'ms/batch':>9}")
+    for batch_size in args.batch_sizes:
+        started = time.perf_counter()
+        for start in range(0, len(chunks), batch_size):
+            encoder(chunks[start:start + batch_size])
+        elapsed = time.perf_counter() - started
+        batches = -(-len(chunks) // batch_size)
+        print(f"{batch_size:>8} {len(chunks) / elapsed:>9.1f} {elapsed / batches * 1000:>9.2f}")
+
+    # 2. Concurrent single-query callers through the service
+    queries = [synthetic_text(rng, 8) for _ in range(args.texts)]
+    print(f"\nconcurrent ({args.clients} callers, one 8-word query per call)")
+    print(f"{'mode':>18} {'emb/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'avg batch':>10}")
+    modes = [("no batching", 0.0, 1)] + [(f"window {window:g} ms", window, 64) for window in args.windows_ms]
+    for name, window_ms, max_batch in modes:
+        service = EmbeddingService(args.model, encoder, window_ms / 1000, max_batch, cache_size=0)
+        throughput, latencies = concurrent_run(service, queries, args.clients)
+        stats = service.stats()
+        print(
+            f"{name:>18} {throughput:>9.1f} {statistics.median(latencies) * 1000:>8.2f} "
+            f"{percentile(latencies, 0.95) * 1000:>8.2f} {stats['embedded'] / stats['batches']:>10.1f}"
+        )
+
+    # 3. Repeated queries answered from the cache
+    service = EmbeddingService(args.model, encoder)
+    concurrent_run(service, queries, args.clients)
+    throughput, latencies = concurrent_run(service, queries, args.clients)
+    print(f"{'cached':>18} {throughput:>9.1f} {statistics.median(latencies) * 1000:>8.2f} "
+          f"{percentile(latencies, 0.95) * 1000:>8.2f} {'-':>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Offline load-test suite: drives the real API (in-process, over ASGI) with Gemini, SerpAPI
+and the vector store replaced by the stand-ins in offline_fakes, so the numbers measure
+the engine's own overhead and how it behaves under the configured latencies and errors.
+
+Scenarios:
+  linear    POST /api/v1/chat/execute, query -> knowledge -> llm -> output
+  fan_out   POST /api/v1/chat/execute, query -> (2 x knowledge -> rerank, search) -> llm -> output
+  large_pdf POST /api/v1/upload/ with a generated PDF, timed until the ingestion job completes
+
+For each: throughput, p50/p99 latency, failed and degraded requests, event-loop lag
+(how late a 10 ms timer fires) and peak RSS of the API process (PDF extraction runs in
+worker processes, which are not included). Results are written as JSON; pass --baseline
+to compare against an earlier run and exit with status 1 on a regression.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_suite --requests 200 --concurrency 16
+    python -m benchmarks.load_suite --baseline benchmarks/results/load_suite.json --output /tmp/load_suite.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+# Everything the app writes goes to a scratch directory (read from the environment at import)
+SCRATCH_DIR = tempfile.mkdtemp(prefix="flowmind_load_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'load_suite.db')}"
+os.environ["LEXICAL_INDEX_DIR"] = os.path.join(SCRATCH_DIR, "lexical_index")
+os.environ["VECTOR_INDEX_DIR"] = os.path.join(SCRATCH_DIR, "vector_index")
+os.environ["COLLECTION_VERSION_DIR"] = os.path.join(SCRATCH_DIR, "collection_versions")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from app.main import flowmind_app
+from app.models.database import init_database
+from app.services.ingestion_jobs import ingestion_queue
+from app.services.vector_service import VectorService
+from benchmarks import offline_fakes
+from benchmarks.offline_fakes import LatencyModel
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "load_suite.json")
+COLLECTION = "load_suite"
+LAG_INTERVAL = 0.01
+# Metrics where a higher value is the regression, and those where a lower value is
+HIGHER_IS_WORSE = ("p50_ms", "p99_ms", "loop_lag_p99_ms", "rss_peak_mb")
+LOWER_IS_WORSE = ("throughput_per_s",)
+# Changes smaller than this are noise whatever the relative change (lag is a few ms at best)
+MIN_CHANGE = {"p50_ms": 5.0, "p99_ms": 10.0, "loop_lag_p99_ms": 5.0, "rss_peak_mb": 20.0, "throughput_per_s": 0.0}
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), or the peak so far elsewhere."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+class LoopMonitor:
+    """Samples event-loop lag and RSS while a scenario runs."""
+    def __init__(self, interval: float = LAG_INTERVAL):
+        self.interval = interval
+        self.lags = []
+        self.rss_peak = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(time.perf_counter() - started - self.interval)
+            self.rss_peak = max(self.rss_peak, rss_mb())
+
+    def __enter__(self):
+        self.rss_peak = rss_mb()
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def summary(self) -> dict:
+        lags = self.lags or [0.0]
+        return {
+            "loop_lag_p99_ms": round(percentile(lags, 0.99) * 1000, 2),
+            "loop_lag_max_ms": round(max(lags) * 1000, 2),
+            "rss_peak_mb": round(self.rss_peak, 1)
+        }
+
+def node(node_id: str, node_type: str, **settings) -> dict:
+    return {"id": node_id, "type": node_type, "position": {"x": 0, "y": 0}, "data": {"label": node_id, **settings}}
+
+def edges(*pairs) -> list:
+    return [{"id": f"e{i}", "source": source, "target": target} for i, (source, target) in enumerate(pairs)]
+
+def linear_graph() -> dict:
+    return {
+        "nodes": [
+            node("query", "queryNode"),
+            node("knowledge", "knowledgeNode", collection=COLLECTION),
+            node("llm", "llmNode"),
+            node("output", "outputNode"),
+        ],
+        "edges": edges(("query", "knowledge"), ("knowledge", "llm"), ("llm", "output"))
+    }
+
+def fan_out_graph() -> dict:
+    return {
+        "nodes": [
+            node("query", "queryNode"),
+            node("manuals", "knowledgeNode", collection=COLLECTION, top_k=5),
+            node("notes", "knowledgeNode", collection=COLLECTION, top_k=3),
+            node("rerank", "rerankNode", top_n=4),
+            node("search", "searchNode"),
+            node("llm", "llmNode"),
+            node("output", "outputNode"),
+        ],
+        "edges": edges(
+            ("query", "manuals"), ("query", "notes"), ("query", "search"),
+            ("manuals", "rerank"), ("notes", "rerank"), ("rerank", "llm"), ("search", "llm"),
+            ("llm", "output")
+        )
+    }
+
+def build_pdf(path: str, pages: int):
+    """A text-only PDF with about 350 words per page."""
+    import fitz  # PyMuPDF
+    words = ("pump valve sensor firmware reset error code pressure flow calibration manual "
+             "warranty install replace filter motor controller voltage display alarm service").split()
+    with fitz.open() as doc:
+        for number in range(pages):
+            text = " ".join(f"{words[(number * 7 + i) % len(words)]}{i % 13}" for i in range(350))
+            doc.new_page().insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=8)
+        doc.save(path)
+
+async def run_concurrently(total: int, concurrency: int, request) -> list:
+    """Runs request(i) for i in range(total), at most concurrency at a time; returns their results."""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with gate:
+            return await request(i)
+
+    return await asyncio.gather(*(one(i) for i in range(total)))
+
+async def chat_scenario(client: httpx.AsyncClient, name: str, graph: dict, total: int, concurrency: int) -> dict:
+    async def request(i):
+        started = time.perf_counter()
+        # Distinct questions, so the retrieval, search and response caches do not answer them
+        response = await client.post("/api/v1/chat/execute", json={"graph": graph, "message": f"{name} question {i}"})
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            return elapsed, "failed"
+        return elapsed, "degraded" if response.json().get("errors") else "ok"
+
+    return await measure(total, concurrency, request)
+
+async def upload_scenario(client: httpx.AsyncClient, pdf_path: str, total: int, concurrency: int) -> dict:
+    with open(pdf_path, "rb") as handle:
+        content = handle.read()
+
+    async def request(i):
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/v1/upload/",
+            files={"file": (f"manual_{i}.pdf", content, "application/pdf")},
+            data={"collection_name": f"{COLLECTION}_uploads"}
+        )
+        if response.status_code != 202:
+            return time.perf_counter() - started, "failed"
+        status_url = response.json()["status_url"]
+        while True:
+            await asyncio.sleep(0.05)
+            job = (await client.get(status_url)).json()
+            if job["status"] in ("completed", "failed"):
+                return time.perf_counter() - started, "ok" if job["status"] == "completed" else "failed"
+
+    return await measure(total, concurrency, request)
+
+async def measure(total: int, concurrency: int, request) -> dict:
+    with LoopMonitor() as monitor:
+        started = time.perf_counter()
+        outcomes = await run_concurrently(total, concurrency, request)
+        wall = time.perf_counter() - started
+    latencies = [elapsed for elapsed, _ in outcomes]
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "throughput_per_s": round(total / wall, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "failed": sum(outcome == "failed" for _, outcome in outcomes),
+        "degraded": sum(outcome == "degraded" for _, outcome in outcomes),
+        **monitor.summary()
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Human-readable regressions of results against baseline, beyond the relative tolerance."""
+    regressions = []
+    for scenario, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        for metric in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            if not previous.get(metric):
+                continue
+            change = current[metric] - previous[metric]
+            if metric in LOWER_IS_WORSE:
+                change = -change
+            if change > previous[metric] * tolerance and change > MIN_CHANGE[metric]:
+                regressions.append(f"{scenario}: {metric} {previous[metric]} -> {current[metric]}")
+    return regressions
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["linear", "fan_out", "large_pdf"])
+    parser.add_argument("--requests", type=int, default=200, help="chat requests per chat scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="chat requests in flight")
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--upload-concurrency", type=int, default=2)
+    parser.add_argument("--pdf-pages", type=int, default=200)
+    parser.add_argument("--llm-ms", type=float, default=400, help="median Gemini latency")
+    parser.add_argument("--search-ms", type=float, default=150, help="median SerpAPI latency")
+    parser.add_argument("--vector-ms", type=float, default=20, help="median vector store latency")
+    parser.add_argument("--sigma", type=float, default=0.3, help="log-normal spread of all latencies")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="failure probability per external call")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    # 1. App state: scratch database, ingestion workers, fakes and a seeded collection
+    fakes = {
+        "llm": LatencyModel(args.llm_ms, args.sigma, args.error_rate, seed=1),
+        "search": LatencyModel(args.search_ms, args.sigma, args.error_rate, seed=2),
+        "vector": LatencyModel(args.vector_ms, args.sigma, args.error_rate, seed=3),
+    }
+    offline_fakes.install(fakes["llm"], fakes["search"], fakes["vector"])
+    await asyncio.to_thread(init_database)
+    await ingestion_queue.start()
+    await VectorService.add_documents_async(
+        COLLECTION,
+        [f"Chunk {i}: error code E-{1000 + i} means the pump needs a seal kit replacement." for i in range(200)],
+        [{"source": "seed.pdf", "page": i // 10} for i in range(200)]
+    )
+
+    # 2. Scenarios
+    results = {
+        "created_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "fakes": {name: model.describe() for name, model in fakes.items()},
+        "scenarios": {}
+    }
+    transport = httpx.ASGITransport(app=flowmind_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-suite", timeout=300) as client:
+        for scenario in args.scenarios:
+            print(f"Running {scenario}...")
+            if scenario == "linear":
+                outcome = await chat_scenario(client, scenario, linear_graph(), args.requests, args.concurrency)
+            elif scenario == "fan_out":
+                outcome = await chat_scenario(client, scenario, fan_out_graph(), args.requests, args.concurrency)
+            elif scenario == "large_pdf":
+                pdf_path = os.path.join(SCRATCH_DIR, "large.pdf")
+                build_pdf(pdf_path, args.pdf_pages)
+                outcome = await upload_scenario(client, pdf_path, args.uploads, args.upload_concurrency)
+                outcome["pages"] = args.pdf_pages
+            else:
+                parser.error(f"unknown scenario {scenario}")
+            results["scenarios"][scenario] = outcome
+    await ingestion_queue.stop()
+
+    # 3. Report, store, compare
+    print(f"\n{'scenario':>10} {'req':>5} {'conc':>5} {'per s':>7} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'failed':>7} {'degr.':>6} {'lag p99':>8} {'lag max':>8} {'RSS MB':>7}")
+    for scenario, outcome in results["scenarios"].items():
+        print(
+            f"{scenario:>10} {outcome['requests']:>5} {outcome['concurrency']:>5} {outcome['throughput_per_s']:>7.2f} "
+            f"{outcome['p50_ms']:>8.1f} {outcome['p99_ms']:>8.1f} {outcome['failed']:>7} {outcome['degraded']:>6} "
+            f"{outcome['loop_lag_p99_ms']:>8.2f} {outcome['loop_lag_max_ms']:>8.2f} {outcome['rss_peak_mb']:>7.1f}"
+        )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
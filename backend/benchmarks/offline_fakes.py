@@ -0,0 +1,175 @@
+"""
+Local stand-ins for Gemini, SerpAPI and the vector store, for benchmarks that must run
+offline. Each one is injected at the boundary to the external service, so the engine's
+own code (concurrency limits, retries, timeouts, circuit breakers, caches, error
+reporting) runs exactly as in production:
+  - Gemini:  a fake GenerativeModel handed out by the provider registry
+  - SerpAPI: an httpx MockTransport behind the shared search client
+  - Chroma:  a vector backend that blocks the calling thread like the real sync client
+
+Latency is log-normal around a median (sigma controls the tail), and each call fails
+with the configured probability: a retryable 503 for Gemini and SerpAPI, a
+ConnectionError for the vector store.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.services import search_service, vector_service
+from app.services.llm_provider import provider_registry
+
+class LatencyModel:
+    """Service time and failure rate of one fake dependency."""
+    def __init__(self, median_ms: float, sigma: float = 0.3, error_rate: float = 0.0, seed: int = 0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """Seconds to wait for one call."""
+        with self._lock:
+            return self.median_ms / 1000 * self._rng.lognormvariate(0.0, self.sigma)
+
+    def fails(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def describe(self) -> Dict[str, float]:
+        return {"median_ms": self.median_ms, "sigma": self.sigma, "error_rate": self.error_rate}
+
+class FakeProviderError(Exception):
+    """Shaped like google.api_core errors: the status is in .code."""
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+class _FakeGeneration:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+class _FakeStream:
+    def __init__(self, words: List[str], latency: LatencyModel):
+        self._words = iter(words)
+        self._latency = latency
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        word = next(self._words, None)
+        if word is None:
+            raise StopAsyncIteration
+        # Time per streamed fragment: a tenth of a full response
+        await asyncio.sleep(self._latency.sample() / 10)
+        return _FakeGeneration(word + " ")
+
+class FakeGeminiModel:
+    """Answers with a fixed number of words after a sampled delay."""
+    def __init__(self, latency: LatencyModel, answer_words: int = 60):
+        self.latency = latency
+        self.answer_words = answer_words
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        if self.latency.fails():
+            await asyncio.sleep(self.latency.sample() / 10)
+            raise FakeProviderError(503, "503 The model is overloaded. Please try again later.")
+        words = [f"word{i}" for i in range(self.answer_words)]
+        if stream:
+            return _FakeStream(words, self.latency)
+        await asyncio.sleep(self.latency.sample())
+        return _FakeGeneration(" ".join(words))
+
+class FakeVectorBackend:
+    """
+    In-memory vector backend. Every call sleeps on the calling thread, like the synchronous
+    Chroma client does, so it only scales if the engine keeps it off the event loop.
+    Queries return the first chunks of the collection; relevance is not modelled.
+    """
+    name = "fake"
+
+    def __init__(self, latency: LatencyModel, upsert_ms_per_chunk: float = 0.2):
+        self.latency = latency
+        self.upsert_ms_per_chunk = upsert_ms_per_chunk
+        self._collections: Dict[str, Dict[str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def _call(self, extra_seconds: float = 0.0):
+        time.sleep(self.latency.sample() + extra_seconds)
+        if self.latency.fails():
+            raise ConnectionError("vector store connection reset")
+
+    def warm_up(self):
+        pass
+
+    def forget(self, collection_name: str):
+        pass
+
+    def upsert(self, collection_name: str, ids: List[str], documents: List[str], metadatas: Optional[List[dict]] = None):
+        self._call(len(ids) * self.upsert_ms_per_chunk / 1000)
+        with self._lock:
+            collection = self._collections.setdefault(collection_name, {})
+            for i, doc_id in enumerate(ids):
+                collection[doc_id] = {"content": documents[i], "metadata": (metadatas[i] if metadatas else None) or {}}
+
+    def query(self, collection_name: str, query_texts: List[str], n_results: int, where: Optional[dict] = None) -> List[List[dict]]:
+        self._call()
+        with self._lock:
+            stored = list(self._collections.get(collection_name, {}).items())[:n_results]
+        return [
+            [{"id": doc_id, **chunk, "distance": 0.5} for doc_id, chunk in stored]
+            for _ in query_texts
+        ]
+
+    def delete(self, collection_name: str, ids: List[str]):
+        self._call()
+        with self._lock:
+            collection = self._collections.get(collection_name, {})
+            for doc_id in ids:
+                collection.pop(doc_id, None)
+
+    def get_all(self, collection_name: str) -> Dict[str, list]:
+        with self._lock:
+            stored = list(self._collections.get(collection_name, {}).items())
+        return {
+            "ids": [doc_id for doc_id, _ in stored],
+            "documents": [chunk["content"] for _, chunk in stored],
+            "metadatas": [chunk["metadata"] for _, chunk in stored]
+        }
+
+    def list_collections(self) -> List[str]:
+        with self._lock:
+            return sorted(self._collections)
+
+def serpapi_transport(latency: LatencyModel) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency.sample())
+        if latency.fails():
+            return httpx.Response(503, json={"error": "Service temporarily unavailable"})
+        query = request.url.params.get("q")
+        return httpx.Response(200, json={"organic_results": [
+            {"title": f"Result {i} for {query}", "snippet": f"Snippet {i} about {query}", "link": f"https://example.com/{i}"}
+            for i in range(10)
+        ]})
+    return httpx.MockTransport(handler)
+
+def install(llm: LatencyModel, search: LatencyModel, vector: LatencyModel) -> FakeVectorBackend:
+    """Routes every external call of this process to the stand-ins. Returns the vector backend."""
+    gemini = FakeGeminiModel(llm)
+    provider_registry.api_key = "offline"
+    provider_registry.initialized = True
+    provider_registry.get_model = lambda provider, model: gemini
+
+    os.environ["SERPAPI_KEY"] = "offline"
+    search_service._http_client = httpx.AsyncClient(transport=serpapi_transport(search))
+
+    backend = FakeVectorBackend(vector)
+    vector_service.set_vector_backend(backend)
+    return backend
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: batched vs sequential retrieval in VectorService.
+
+Builds a synthetic collection in an in-memory Chroma client (default local embedding
+model, no network) and compares, for the same set of queries:
+  - sequential: one VectorService.query call (one embedding pass + one search) per query
+  - batched:    a single VectorService.query_many call for all queries
+
+Usage (from the backend directory):
+    python -m benchmarks.retrieval_batch_benchmark --docs 2000 --queries 1 4 16 64
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+from app.services import vector_service
+from app.services.embedding_service import EmbeddingService
+from app.services.vector_service import VectorService
+
+COLLECTION = "retrieval_benchmark"
+VOCABULARY = (
+    "pump valve sensor firmware reset error code pressure flow calibration manual "
+    "warranty install replace filter motor controller voltage display alarm service"
+).split()
+
+def synthetic_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words)) + f" E{rng.randint(1000, 9999)}"
+
+def build_collection(doc_count: int, rng: random.Random):
+    vector_service.client = chromadb.EphemeralClient()
+    vector_service.set_vector_backend(vector_service.ChromaBackend())
+    # Measures embedding and search; no retrieval or embedding cache in front
+    vector_service.retrieval_cache = None
+    vector_service.embedding_service = EmbeddingService(cache_size=0)
+    VectorService.forget_collection(COLLECTION)
+    batch = 256
+    for start in range(0, doc_count, batch):
+        texts = [synthetic_text(rng, 60) for _ in range(min(batch, doc_count - start))]
+        VectorService.add_documents(COLLECTION, texts, [{"source": "synthetic.pdf"} for _ in texts])
+
+def timed(func, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"Indexing {args.docs} synthetic chunks...")
+    build_collection(args.docs, rng)
+    # Warm up the embedding model so model loading is not measured
+    VectorService.query(COLLECTION, "warm up", args.n_results)
+
+    print(f"{'queries':>8} {'sequential ms':>14} {'batched ms':>11} {'speedup':>8}")
+    for query_count in args.queries:
+        queries = [synthetic_text(rng, 8) for _ in range(query_count)]
+
+        sequential = timed(lambda: [VectorService.query(COLLECTION, q, args.n_results) for q in queries], args.repeats)
+        batched = timed(lambda: VectorService.query_many(COLLECTION, queries, args.n_results), args.repeats)
+
+        print(f"{query_count:>8} {sequential * 1000:>14.1f} {batched * 1000:>11.1f} {sequential / batched:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
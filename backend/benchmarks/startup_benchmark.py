@@ -0,0 +1,84 @@
+"""
+Startup-time benchmark: how long does importing the application take, and where does it go?
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter (so nothing is
+already cached in sys.modules), parses the per-module timings Python prints on stderr and
+reports the total plus the slowest top-level packages by cumulative import time.
+Heavy dependencies (chromadb, fitz, google.generativeai) should not appear: they are
+imported lazily by the services and warmed up in the application lifespan.
+
+Usage (from the backend directory):
+    python -m benchmarks.startup_benchmark --runs 5 --top 15
+    python -m benchmarks.startup_benchmark --output benchmarks/results/startup_importtime.txt
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("chromadb", "fitz", "google.generativeai", "onnxruntime", "grpc")
+
+def import_profile(module: str) -> dict:
+    """Imports module in a fresh interpreter; returns {module name: (self us, cumulative us)}."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    timings = {}
+    for line in completed.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+    totals = [profile[args.module][1] / 1000 for profile in profiles]
+
+    # Self time summed per top-level package, median across runs
+    per_package = defaultdict(list)
+    for profile in profiles:
+        package_totals = defaultdict(int)
+        for name, (self_us, _) in profile.items():
+            package_totals[name.split(".")[0]] += self_us
+        for package, self_us in package_totals.items():
+            per_package[package].append(self_us / 1000)
+    slowest = sorted(((statistics.median(v), k) for k, v in per_package.items()), reverse=True)[:args.top]
+
+    heavy = sorted({name for profile in profiles for name in profile if name.startswith(HEAVY_MODULES)})
+
+    lines = [
+        f"import {args.module}: median {statistics.median(totals):.1f} ms over {args.runs} runs "
+        f"(min {min(totals):.1f} ms, max {max(totals):.1f} ms)",
+        f"modules imported: {len(profiles[0])}",
+        "",
+        f"{'package':<28} {'import ms':>10}",
+    ]
+    lines += [f"{package:<28} {ms:>10.1f}" for ms, package in slowest]
+    lines.append("")
+    lines.append("heavy modules imported eagerly: " + (", ".join(heavy) if heavy else "none"))
+    report = "\n".join(lines)
+
+    print(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as handle:
+            handle.write(report + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Vector search latency: Chroma (HNSW) vs the embedded NumPy memory-mapped backend.
+
+Both stores get the same synthetic, clustered 384-dimensional embeddings (the size of the
+default all-MiniLM-L6-v2 model) so that only indexing and search are measured, not the
+embedding model. For every collection size it reports build time, single-query and
+batched-query latency, and Chroma's recall@k against the exact NumPy results.
+
+Chroma runs in-process on a temporary PersistentClient, which is the cheapest Chroma setup;
+a remote Chroma server adds a network hop on top of these numbers.
+
+Usage (from the backend directory):
+    python -m benchmarks.vector_backend_benchmark --sizes 10000 100000 1000000 --queries 200
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import numpy_vector_store
+from app.services.numpy_vector_store import NumpyCollection, normalize
+
+DIMENSION = 384
+CLUSTERS = 256
+INSERT_BATCH = 5000 # below Chroma's maximum batch size
+
+def synthetic_embeddings(count: int, rng: np.random.Generator) -> np.ndarray:
+    """Points scattered around random cluster centres, like topic-grouped chunks."""
+    centres = normalize(rng.standard_normal((CLUSTERS, DIMENSION)))
+    assignment = rng.integers(0, CLUSTERS, count)
+    return normalize(centres[assignment] + 1.4 / np.sqrt(DIMENSION) * rng.standard_normal((count, DIMENSION)).astype(np.float32))
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+def time_queries(search, queries: np.ndarray, batch_size: int) -> dict:
+    samples = []
+    for start in range(0, len(queries), batch_size):
+        started = time.perf_counter()
+        search(queries[start:start + batch_size])
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"p50": statistics.median(samples), "p95": percentile(samples, 0.95)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32, help="queries per call in the batched run")
+    parser.add_argument("--skip-chroma", action="store_true", help="only measure the NumPy backend")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(5)
+    print(f"{'chunks':>9} {'backend':>8} {'build s':>8} {'1q p50':>8} {'1q p95':>8} {f'{args.batch}q p50':>8} {'recall':>7}")
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix="flowmind_vectors_")
+        embeddings = synthetic_embeddings(size, rng)
+        ids = [f"chunk-{i}" for i in range(size)]
+        documents = [f"chunk {i}" for i in range(size)]
+        metadatas = [{"source": "synthetic.pdf"} for _ in range(size)]
+        # Queries close to stored chunks, as real questions are close to their answers
+        queries = normalize(embeddings[rng.integers(0, size, args.queries)] + 0.05 * rng.standard_normal((args.queries, DIMENSION)).astype(np.float32))
+
+        # 1. NumPy backend (exact search)
+        numpy_vector_store.VECTOR_INDEX_DIR = os.path.join(workdir, "numpy")
+        started = time.perf_counter()
+        collection = NumpyCollection("benchmark")
+        for start in range(0, size, INSERT_BATCH * 20):
+            stop = start + INSERT_BATCH * 20
+            collection.upsert(ids[start:stop], embeddings[start:stop], documents[start:stop], metadatas[start:stop])
+        build = time.perf_counter() - started
+        exact = [[match["id"] for match in matches] for matches in collection.search(queries, args.k)]
+        single = time_queries(lambda batch: collection.search(batch, args.k), queries, 1)
+        batched = time_queries(lambda batch: collection.search(batch, args.k), queries, args.batch)
+        print(f"{size:>9} {'numpy':>8} {build:>8.1f} {single['p50']:>8.2f} {single['p95']:>8.2f} {batched['p50']:>8.2f} {1.0:>7.3f}")
+
+        # 2. Chroma (approximate HNSW search)
+        if not args.skip_chroma:
+            import chromadb
+            client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+            chroma = client.create_collection("benchmark", metadata={"hnsw:space": "cosine"})
+            started = time.perf_counter()
+            for start in range(0, size, INSERT_BATCH):
+                stop = start + INSERT_BATCH
+                chroma.add(ids=ids[start:stop], embeddings=embeddings[start:stop].tolist(),
+                           documents=documents[start:stop], metadatas=metadatas[start:stop])
+            build = time.perf_counter() - started
+
+            def chroma_search(batch):
+                return chroma.query(query_embeddings=batch.tolist(), n_results=args.k)
+
+            found = chroma_search(queries)["ids"]
+            recall = statistics.mean(len(set(a) & set(b)) / args.k for a, b in zip(found, exact))
+            single = time_queries(chroma_search, queries, 1)
+            batched = time_queries(chroma_search, queries, args.batch)
+            print(f"{size:>9} {'chroma':>8} {build:>8.1f} {single['p50']:>8.2f} {single['p95']:>8.2f} {batched['p50']:>8.2f} {recall:>7.3f}")
+            del chroma, client
+
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,11 @@ const NodeConfiguration = ({ node, updateNodeData }) => {
         updateNodeData(node.id, key, value);
     };
 
+    // A cleared number field is sent as null, so the backend falls back to its default
+    const handleNumberChange = (key, value) => {
+        handleChange(key, value === '' ? null : Number(value));
+    };
+
     const handleFileUpload = async (e) => {
         const file = e.target.files[0];
         if (!file) return;
@@ -110,6 +115,47 @@ const NodeConfiguration = ({ node, updateNodeData }) => {
                     </>
                 )}
 
+                {node.type === 'rerankNode' && (
+                    <>
+                        <div>
+                            <label className="block text-sm font-medium text-gray-400 mb-1">Scorer</label>
+                            <select
+                                value={node.data.scorer || 'lexical'}
+                                onChange={(e) => handleChange('scorer', e.target.value)}
+                                className="w-full bg-gray-700 border border-gray-600 rounded p-2 text-white focus:outline-none focus:border-blue-500"
+                            >
+                                <option value="lexical">Lexical overlap (fast)</option>
+                                <option value="model">Cross-encoder model</option>
+                            </select>
+                        </div>
+                        <div>
+                            <label className="block text-sm font-medium text-gray-400 mb-1">Candidates to retrieve</label>
+                            <input
+                                type="number"
+                                min="1"
+                                max="200"
+                                placeholder="20"
+                                value={node.data.candidates ?? ''}
+                                onChange={(e) => handleNumberChange('candidates', e.target.value)}
+                                className="w-full bg-gray-700 border border-gray-600 rounded p-2 text-white focus:outline-none focus:border-blue-500"
+                            />
+                        </div>
+                        <div>
+                            <label className="block text-sm font-medium text-gray-400 mb-1">Chunks passed to the LLM</label>
+                            <input
+                                type="number"
+                                min="1"
+                                max="50"
+                                placeholder="3"
+                                value={node.data.top_n ?? ''}
+                                onChange={(e) => handleNumberChange('top_n', e.target.value)}
+                                className="w-full bg-gray-700 border border-gray-600 rounded p-2 text-white focus:outline-none focus:border-blue-500"
+                            />
+                            <p className="text-[10px] text-gray-500 mt-1 italic">Connect Knowledge Base nodes into this node, and this node into the LLM.</p>
+                        </div>
+                    </>
+                )}
+
                 {node.type === 'searchNode' && (
                     <div>
                         <label className="block text-sm font-medium text-gray-400 mb-1">Search Engine</label>
@@ -1,5 +1,5 @@
 import React from 'react';
-import { MessageSquare, Database, Bot, Terminal, Search } from 'lucide-react';
+import { MessageSquare, Database, Bot, Terminal, Search, Filter } from 'lucide-react';
 
 const Sidebar = () => {
     const onDragStart = (event, nodeType) => {
@@ -33,6 +33,15 @@ const Sidebar = () => {
                     <span className="text-sm font-medium">Knowledge Base</span>
                 </div>
 
+                <div
+                    className="p-3 bg-gray-700 rounded-lg cursor-grab hover:bg-gray-600 transition flex items-center gap-3 border border-gray-600"
+                    onDragStart={(event) => onDragStart(event, 'rerankNode')}
+                    draggable
+                >
+                    <Filter size={18} className="text-yellow-400" />
+                    <span className="text-sm font-medium">Rerank</span>
+                </div>
+
                 <div
                     className="p-3 bg-gray-700 rounded-lg cursor-grab hover:bg-gray-600 transition flex items-center gap-3 border border-gray-600"
                     onDragStart={(event) => onDragStart(event, 'llmNode')}
@@ -12,6 +12,7 @@ import KnowledgeNode from '../nodes/KnowledgeNode';
 import LLMNode from '../nodes/LLMNode';
 import OutputNode from '../nodes/OutputNode';
 import SearchNode from '../nodes/SearchNode';
+import RerankNode from '../nodes/RerankNode';
 
 const nodeTypes = {
     queryNode: QueryNode,
@@ -19,6 +20,7 @@ const nodeTypes = {
     llmNode: LLMNode,
     outputNode: OutputNode,
     searchNode: SearchNode,
+    rerankNode: RerankNode,
 };
 
 let id = 0;
@@ -60,6 +62,7 @@ const WorkflowArea = ({
                 llmNode: 'Gemini 2.0 (Free)',
                 knowledgeNode: 'Knowledge Base',
                 searchNode: 'Web Search',
+                rerankNode: 'Rerank',
                 outputNode: 'Output'
             };
 
@@ -105,6 +108,7 @@ const WorkflowArea = ({
                         if (n.type === 'llmNode') return '#a855f7';
                         if (n.type === 'outputNode') return '#f97316';
                         if (n.type === 'searchNode') return '#06b6d4';
+                        if (n.type === 'rerankNode') return '#eab308';
                         return '#eee';
                     }}
                     className="bg-gray-800 border-gray-700"
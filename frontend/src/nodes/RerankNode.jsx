@@ -0,0 +1,24 @@
+import React, { memo } from 'react';
+import { Handle, Position } from 'reactflow';
+import { Filter } from 'lucide-react';
+
+export default memo(({ data, selected }) => {
+    return (
+        <div className={`shadow-lg rounded-xl bg-gray-800 border-2 w-64 ${selected ? 'border-yellow-500 shadow-yellow-500/20' : 'border-gray-700'}`}>
+            <Handle type="target" position={Position.Left} className="w-3 h-3 bg-green-500 border-2 border-gray-800" />
+            <div className="flex items-center gap-2 px-4 py-2 border-b border-gray-700 bg-gray-900/50 rounded-t-xl">
+                <Filter size={16} className="text-yellow-400" />
+                <span className="text-sm font-bold text-gray-200">Rerank</span>
+            </div>
+            <div className="p-4 flex flex-col gap-2">
+                <div className="text-xs text-gray-400">
+                    <span className="font-semibold text-gray-300">Keeps:</span> top {data.top_n || 3} of {data.candidates || 20} chunks
+                </div>
+                <div className="text-xs text-gray-400">
+                    Re-scores retrieved chunks so only the best reach the LLM.
+                </div>
+            </div>
+            <Handle type="source" position={Position.Right} className="w-3 h-3 bg-yellow-500 border-2 border-gray-800" />
+        </div>
+    );
+});